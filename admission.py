@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+# ----------------------------------------------------
+# Admission control for validation jobs: each job gets a cost estimate from its
+# inputs (row count sniffed from the xlsx <dimension> header, bytes otherwise)
+# and is started only while the running jobs fit the CPU and memory budgets.
+# Large DMWs get more validator --workers, and budget a core for each.
+# Pending jobs wait in per-user queues served round-robin; small DMWs go to a
+# fast lane with reserved slots, so they never wait behind a large run.
+# ----------------------------------------------------
+import csv, re, threading, zipfile
+from collections import OrderedDict, deque
+from pathlib import Path
+from typing import Deque, Dict, Hashable, List, NamedTuple, Sequence
+
+# measured on the validator: ~50 MB imported, ~1.2 KB per DMW row (peak RSS)
+BASE_MB = 64.0
+ROW_KB = 1.5
+ROWS_PER_WORKER = 50000   # DMW rows worth another --workers process
+CSV_ROW_BYTES = 150        # rows in a CSV DMW when it cannot be counted cheaply
+DIMENSION = re.compile(rb'<(?:[\w.-]+:)?dimension\b[^>]*?\bref="[A-Z]+\d+:?[A-Z]*(\d*)"')
+ROW = re.compile(rb'<(?:[\w.-]+:)?row[ >]')
+SNIFF_BYTES = 64 << 10
+DMW_SUFFIXES = (".xlsx", ".xlsm", ".csv")
+
+class Cost(NamedTuple):
+    rows: int          # DMW rows over every workbook input
+    bytes: int         # total input size
+    cpu: float         # cores: the command's --workers (1 without it)
+    mem_mb: float      # expected peak RSS
+
+def sniff_rows(path: Path) -> int:
+    """Data rows of a DMW without loading it: the largest worksheet <dimension>, or a size estimate."""
+    path = Path(path)
+    if path.suffix.lower() == ".csv":
+        if path.stat().st_size > 8 << 20:
+            return path.stat().st_size // CSV_ROW_BYTES
+        with open(path, newline="", encoding="utf-8", errors="replace") as f:
+            return max(0, sum(1 for _ in csv.reader(f)) - 1)
+    rows = 0
+    try:
+        with zipfile.ZipFile(path) as z:
+            for info in z.infolist():
+                if not info.filename.startswith("xl/worksheets/sheet"):
+                    continue
+                with z.open(info) as f:
+                    head = f.read(SNIFF_BYTES)
+                m = DIMENSION.search(head, 0, 4096)   # written before <sheetData>
+                if m:
+                    rows = max(rows, int(m.group(1) or 1) - 1)
+                else:   # streamed writers omit it: extrapolate the row density of the head
+                    n = len(ROW.findall(head))
+                    rows = max(rows, n * info.file_size // max(len(head), 1) - 1 if n else 0)
+    except (zipfile.BadZipFile, OSError):
+        return 0
+    return rows
+
+def estimate(cmd: Sequence[str]) -> Cost:
+    """Cost of a validator command from the input files it names."""
+    rows = size = 0
+    cpu = float(cmd[cmd.index("--workers") + 1]) if "--workers" in cmd[:-1] else 1.0
+    for tok in cmd[2:]:
+        p = Path(tok)
+        if not p.is_absolute() or not p.is_file():
+            continue
+        size += p.stat().st_size
+        if p.suffix.lower() in DMW_SUFFIXES:
+            rows += sniff_rows(p)
+    return Cost(rows, size, cpu, BASE_MB + rows * ROW_KB / 1024)
+
+class Scheduler:
+    """
+    Pending jobs are kept per user and served round-robin (fair share between
+    users, FIFO within a user). admit() returns the keys that may start now:
+
+    - fast lane: jobs of at most `small_rows` rows, started on one of
+      `fast_slots` reserved slots outside the budgets (or within them when
+      the slots are busy);
+    - main lane: a user's next job starts when it fits the remaining CPU and
+      memory budget; a job larger than the whole budget starts alone. The
+      lane does not skip ahead past a job that does not fit yet, so large
+      runs are not starved by a stream of medium ones.
+
+    workers() sizes a job's --workers (its CPU cost) from its rows. Call
+    release() when an admitted job ends; all methods are thread-safe.
+    """
+
+    def __init__(self, cpu: float = 2, mem_mb: float = 4096, small_rows: int = 5000, fast_slots: int = 1,
+                 max_workers: int = 1):
+        self.cpu = cpu
+        self.mem_mb = mem_mb
+        self.small_rows = small_rows
+        self.fast_slots = fast_slots
+        self.max_workers = max_workers
+        self._lanes: Dict[str, "OrderedDict[str, Deque]"] = {"fast": OrderedDict(), "main": OrderedDict()}
+        self._running: Dict[Hashable, tuple] = {}    # key -> (cost, counted in the budget)
+        self._cpu_used = self._mem_used = 0.0
+        self._fast_used = 0
+        self._lock = threading.Lock()
+
+    def lane(self, cost: Cost) -> str:
+        return "fast" if cost.rows <= self.small_rows else "main"
+
+    def workers(self, rows: int) -> int:
+        """--workers for a run over `rows` DMW rows: one per ROWS_PER_WORKER, up to max_workers."""
+        return max(1, min(self.max_workers, -(-rows // ROWS_PER_WORKER)))
+
+    def add(self, key: Hashable, cost: Cost, user: str = "") -> str:
+        lane = self.lane(cost)
+        with self._lock:
+            self._lanes[lane].setdefault(user, deque()).append((key, cost))
+        return lane
+
+    def _pop(self, lane: str) -> None:
+        users = self._lanes[lane]
+        user, queue = next(iter(users.items()))
+        queue.popleft()
+        users.pop(user)
+        if queue:
+            users[user] = queue   # to the back of the round-robin
+
+    def _fits(self, cost: Cost) -> bool:
+        if not any(budgeted for _, budgeted in self._running.values()):
+            return True
+        return self._cpu_used + cost.cpu <= self.cpu and self._mem_used + cost.mem_mb <= self.mem_mb
+
+    def _start(self, key: Hashable, cost: Cost, budgeted: bool) -> None:
+        self._running[key] = (cost, budgeted)
+        if budgeted:
+            self._cpu_used += cost.cpu
+            self._mem_used += cost.mem_mb
+        else:
+            self._fast_used += 1
+
+    def can_admit(self, cost: Cost) -> bool:
+        """Whether a job of this cost would start right away (for claiming from a shared queue)."""
+        with self._lock:
+            if self.lane(cost) == "fast" and self._fast_used < self.fast_slots:
+                return True
+            return self._fits(cost)
+
+    def admit(self) -> List[Hashable]:
+        started = []
+        with self._lock:
+            fast, main = self._lanes["fast"], self._lanes["main"]
+            while fast:
+                key, cost = next(iter(fast.values()))[0]
+                if self._fast_used < self.fast_slots:
+                    self._start(key, cost, budgeted=False)
+                elif self._fits(cost):
+                    self._start(key, cost, budgeted=True)
+                else:
+                    break
+                self._pop("fast")
+                started.append(key)
+            while main:
+                key, cost = next(iter(main.values()))[0]
+                if not self._fits(cost):
+                    break
+                self._start(key, cost, budgeted=True)
+                self._pop("main")
+                started.append(key)
+        return started
+
+    def release(self, key: Hashable) -> None:
+        with self._lock:
+            cost, budgeted = self._running.pop(key, (None, None))
+            if cost is None:
+                return
+            if budgeted:
+                self._cpu_used -= cost.cpu
+                self._mem_used -= cost.mem_mb
+            else:
+                self._fast_used -= 1
+
+    def position(self, key: Hashable) -> int:
+        """Jobs ahead of `key` in its lane, in round-robin order (0 once admitted)."""
+        with self._lock:
+            for users in self._lanes.values():
+                queues = [list(q) for q in users.values()]
+                order = [q[i][0] for i in range(max(map(len, queues), default=0)) for q in queues if i < len(q)]
+                if key in order:
+                    return order.index(key)
+        return 0
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {
+                "cpu_used": self._cpu_used, "cpu_budget": self.cpu,
+                "mem_used_mb": round(self._mem_used, 1), "mem_budget_mb": self.mem_mb,
+                "fast_used": self._fast_used, "fast_slots": self.fast_slots,
+                "running": len(self._running),
+                "pending": {lane: {u: len(q) for u, q in users.items()} for lane, users in self._lanes.items()},
+            }
@@ -1,11 +1,13 @@
 #!/usr/bin/env python3
 import argparse, re, ast, operator as op
 from fastapi import FastAPI, Body, Form
-from fastapi.responses import HTMLResponse, StreamingResponse
+from fastapi.responses import HTMLResponse, PlainTextResponse, StreamingResponse
 import uvicorn
 from llama_cpp import Llama
+import metrics
 
 app = FastAPI(title="DMW Validator AI Microservice with ChatUI")
+metrics.instrument(app)
 
 MODEL_PATH = "/app/models/Phi-4-mini-instruct-Q3_K_S.gguf"
 llm = Llama(model_path=MODEL_PATH, n_threads=8, n_ctx=2048)
@@ -78,7 +80,8 @@ def index(): return HTML_PAGE
 def ask(prompt:str=Form(...)):
     ans = try_math(prompt)
     if ans is not None: return ans
-    return llm_complete(prompt)
+    with metrics.AI_SECONDS.labels("/ask").time():
+        return llm_complete(prompt)
 # -------------------------------------------------
 
 @app.post("/v1/completions")
@@ -87,7 +90,12 @@ def complete(data:dict=Body(...)):
     if not prompt: return {"error":"Missing prompt"}
     ans=try_math(prompt)
     if ans is not None: return {"text":ans}
-    return {"text":llm_complete(prompt)}
+    with metrics.AI_SECONDS.labels("/v1/completions").time():
+        return {"text":llm_complete(prompt)}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    return PlainTextResponse(metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
 
 if __name__=="__main__":
     parser=argparse.ArgumentParser(); parser.add_argument("--port",type=int,default=8081)
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# ----------------------------------------------------
+# Content-addressed upload store: uploads are streamed to disk in chunks while
+# being hashed (sha256), kept once under <root>/<aa>/<digest>, and hard-linked
+# into job directories (copied where the volume does not support links)
+# ----------------------------------------------------
+import hashlib, logging, os, shutil, tempfile, threading, time
+from pathlib import Path
+from typing import BinaryIO, Dict, Iterator, Optional, Tuple
+
+CHUNK = 1 << 20
+
+class BlobStore:
+    """
+    put() stores a stream and returns its digest; link() materialises a blob at
+    a job path. Blobs are made read-only, so a job cannot modify the copy other
+    jobs share. A blob whose link count is 1 is referenced by no job (see
+    orphans()); discard() deletes one under the lock save() holds from put to
+    link, so the janitor cannot remove a blob an upload is about to link.
+    """
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+        self._tmp = self.root / "tmp"
+        self._tmp.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.RLock()
+        self.stats: Dict[str, int] = {"puts": 0, "dedup_hits": 0, "bytes_in": 0, "bytes_deduped": 0}
+
+    def path(self, digest: str) -> Path:
+        return self.root / digest[:2] / digest
+
+    def put(self, fileobj: BinaryIO, chunk: int = CHUNK, dest: Optional[Path] = None) -> Tuple[str, int]:
+        """(sha256, size) of the stream; the bytes are written only if the blob is new. With dest, also link() it."""
+        h = hashlib.sha256()
+        size = 0
+        fd, tmp = tempfile.mkstemp(dir=self._tmp)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                while True:
+                    buf = fileobj.read(chunk)
+                    if not buf:
+                        break
+                    h.update(buf)
+                    f.write(buf)
+                    size += len(buf)
+            digest = h.hexdigest()
+            blob = self.path(digest)
+            with self._lock:
+                self.stats["puts"] += 1
+                self.stats["bytes_in"] += size
+                if blob.exists():
+                    self.stats["dedup_hits"] += 1
+                    self.stats["bytes_deduped"] += size
+                    os.utime(blob)   # recently used: see discard(min_age)
+                else:
+                    blob.parent.mkdir(exist_ok=True)
+                    os.chmod(tmp, 0o444)
+                    os.replace(tmp, blob)   # atomic: readers never see a partial blob
+                if dest is not None:
+                    self.link(digest, dest)
+            return digest, size
+        finally:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+
+    def link(self, digest: str, dest: Path) -> Path:
+        dest = Path(dest)
+        with self._lock:
+            if dest.exists():
+                dest.unlink()
+            try:
+                os.link(self.path(digest), dest)
+            except OSError as e:   # another filesystem, or links not permitted
+                logging.warning(f"Blob {digest[:12]}: hard link to {dest} failed ({e}); copying")
+                shutil.copyfile(self.path(digest), dest)
+        return dest
+
+    def save(self, fileobj: BinaryIO, dest: Path) -> Tuple[Path, str]:
+        """put() + link() under one lock: the upload at dest, and its digest."""
+        digest, _ = self.put(fileobj, dest=dest)
+        return Path(dest), digest
+
+    def blobs(self) -> Iterator[Path]:
+        for d in self.root.iterdir():
+            if d.is_dir() and len(d.name) == 2:
+                yield from d.iterdir()
+
+    def orphans(self) -> Iterator[Path]:
+        """Blobs no job directory links to any more."""
+        for p in self.blobs():
+            try:
+                if p.stat().st_nlink == 1:
+                    yield p
+            except OSError:   # removed meanwhile
+                continue
+
+    def discard(self, path: Path, min_age: float = 0) -> Optional[int]:
+        """
+        Deletes a blob if it is still unlinked and was not stored or reused in the
+        last min_age seconds (uploads in other processes sharing the store are not
+        covered by the lock). Returns the bytes freed, None if it was kept.
+        """
+        with self._lock:
+            try:
+                st = Path(path).stat()
+                if st.st_nlink != 1 or time.time() - st.st_mtime < min_age:
+                    return None
+                Path(path).unlink()
+            except OSError:   # already gone
+                return None
+            return st.st_size
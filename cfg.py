@@ -47,6 +47,43 @@ WEB_CFG = {
     "port": int(os.environ.get("WEB_PORT", "8085")),
 }
 
+# ------------------------------------------------------------
+# Validation jobs (web portals)
+# ------------------------------------------------------------
+JOB_CFG = {
+    "workers": int(os.environ.get("DMW_JOB_WORKERS", "2")),        # validations run concurrently
+    "timeout": int(os.environ.get("DMW_JOB_TIMEOUT", "3600")),     # seconds per validation
+    "pool": os.environ.get("DMW_JOB_POOL", "1") == "1",            # warm validator processes (0: subprocess per job)
+    "pool_max_jobs": int(os.environ.get("DMW_POOL_MAX_JOBS", "20")),        # recycle a worker after N jobs
+    "pool_max_rss_mb": int(os.environ.get("DMW_POOL_MAX_RSS_MB", "1536")),  # ... or above this RSS
+    "cache": os.environ.get("DMW_RESULT_CACHE", "1") == "1",       # reuse outputs of identical jobs
+    "cache_ttl": int(os.environ.get("DMW_CACHE_TTL", str(7 * 86400))),     # seconds an entry stays valid
+    "cache_max_mb": int(os.environ.get("DMW_CACHE_MAX_MB", "2048")),       # LRU-evict above this size
+    "progress_interval": float(os.environ.get("DMW_PROGRESS_INTERVAL", "1.0")),  # seconds between SSE updates
+    # admission control (admission.py): jobs start while their estimated cost fits the budgets
+    "cpu_budget": int(os.environ.get("DMW_CPU_BUDGET", os.environ.get("DMW_JOB_WORKERS", "2"))),  # validators at once
+    "mem_budget_mb": int(os.environ.get("DMW_MEM_BUDGET_MB", "4096")),     # summed estimated peak RSS
+    "fast_rows": int(os.environ.get("DMW_FAST_LANE_ROWS", "5000")),        # DMWs up to this many rows ...
+    "fast_slots": int(os.environ.get("DMW_FAST_LANE_SLOTS", "1")),         # ... get reserved slots
+    "max_workers": int(os.environ.get("DMW_JOB_MAX_WORKERS", "2")),        # --workers (cores) for one large DMW
+    # shared job store (job_store.py): "" keeps jobs in-process; sqlite:///path.db or redis://host:6379/0
+    "store": os.environ.get("DMW_JOB_STORE", ""),
+    "lease": int(os.environ.get("DMW_JOB_LEASE", "60")),                   # seconds; renewed every lease/3
+    "max_attempts": int(os.environ.get("DMW_JOB_MAX_ATTEMPTS", "3")),      # retries after a lost worker
+    "embedded_worker": os.environ.get("DMW_EMBEDDED_WORKER", "1") == "1",  # 0: web only, run job_worker.py
+}
+
+# ------------------------------------------------------------
+# Disk retention for uploads and outputs (janitor.py)
+# ------------------------------------------------------------
+JANITOR_CFG = {
+    "enabled": os.environ.get("DMW_JANITOR", "1") == "1",
+    "interval": int(os.environ.get("DMW_JANITOR_INTERVAL", "900")),           # seconds between passes
+    "retention_days": float(os.environ.get("DMW_RETENTION_DAYS", "14")),      # remove unused jobs after this
+    "quota_mb": int(os.environ.get("DMW_DISK_QUOTA_MB", "10240")),            # then LRU-evict above this size
+    "grace": int(os.environ.get("DMW_JANITOR_GRACE", "300")),                 # never touch newer entries
+}
+
 # ------------------------------------------------------------
 # General config (optional)
 # ------------------------------------------------------------
@@ -55,6 +92,8 @@ CFG = {
     "paths": {k: str(v) for k, v in PATHS.items()},
     "ai": AI_CFG,
     "web": WEB_CFG,
+    "jobs": JOB_CFG,
+    "janitor": JANITOR_CFG,
 }
 
 if __name__ == "__main__":
@@ -1,12 +1,24 @@
+import json
+from pathlib import Path
 from openpyxl import load_workbook
-wb = load_workbook("/app/outputs/Withholding_Validation_AI.xlsx", read_only=True, data_only=True)
+
+OUT = Path("/app/outputs/Withholding_Validation_AI.xlsx")
+
+# validate_dmw_final.py writes <stem>.summary.json next to the workbook
+summary = OUT.with_name(f"{OUT.stem}.summary.json")
+if summary.exists():
+    print("Validation Status counts:", json.loads(summary.read_text(encoding="utf-8"))["status"])
+    raise SystemExit(0)
+
+wb = load_workbook(OUT, read_only=True, data_only=True)
 ws = wb["Baseline Data Model_output"]
-headers = [c.value for c in next(ws.iter_rows(min_row=2, max_row=2))]
+rows = ws.iter_rows(values_only=True)
+headers = next(rows)  # validator output header is on row 1
 col_status = [i for i,h in enumerate(headers) if "Status" in str(h)]
 print("Columns:", headers[col_status[0]] if col_status else "No Status column found")
 
 counts = {}
-for row in ws.iter_rows(min_row=3, values_only=True):
+for row in rows:
     if not row or not any(row): continue
     status = str(row[col_status[0]]) if col_status else ""
     counts[status] = counts.get(status, 0) + 1
@@ -1 +1,224 @@
-console.log("DMW Viewer Loaded");
+// DMW report viewer: virtualised tables over report/<dataset>/shard-NNNNN.json.
+// Only the shards under the viewport are fetched (LRU-cached); sorting uses the
+// precomputed sort-<col>.json permutations and column filters the facet-<col>.json
+// row-id lists, so neither needs the data. Text search scans shards progressively.
+"use strict";
+
+const BASE = "report/";
+const ROW_H = 24;
+const OVERSCAN = 20;
+const CACHE_SHARDS = 64;
+const COL_W = "minmax(140px, 1fr)";
+
+const cache = new Map();   // url -> Promise<json>, most recently used last
+
+function load(url) {
+  let p = cache.get(url);
+  if (p) {
+    cache.delete(url);
+  } else {
+    p = fetch(BASE + url).then(r => {
+      if (!r.ok) throw new Error(url + ": HTTP " + r.status);
+      return r.json();
+    });
+    p.catch(() => cache.delete(url));
+  }
+  cache.set(url, p);
+  while (cache.size > CACHE_SHARDS) cache.delete(cache.keys().next().value);
+  return p;
+}
+
+function el(tag, cls, text) {
+  const e = document.createElement(tag);
+  if (cls) e.className = cls;
+  if (text !== undefined) e.textContent = text;
+  return e;
+}
+
+class Table {
+  constructor(ds, root) {
+    this.ds = ds;
+    this.view = null;         // null = every row in file order, else Int32Array of row ids
+    this.sort = null;         // {col, desc}
+    this.facets = {};         // col -> selected value
+    this.text = "";
+    this.gen = 0;             // bumps on every view change; stale async work checks it
+    this.loaded = new Map();  // shard number -> rows, for painting without awaiting
+    this.build(root);
+    this.refresh();
+  }
+
+  shardUrl(n) {
+    return this.ds.id + "/shard-" + String(n).padStart(5, "0") + ".json";
+  }
+
+  get length() {
+    return this.view ? this.view.length : this.ds.total;
+  }
+
+  build(root) {
+    const ds = this.ds;
+    const sec = el("div", "section" + (ds.text ? " text" : ""));
+    sec.appendChild(el("h2", null, ds.title));
+    const bar = el("div", "toolbar");
+    this.search = el("input");
+    this.search.type = "search";
+    this.search.placeholder = "Filter rows containing…";
+    let timer = null;
+    this.search.addEventListener("input", () => {
+      clearTimeout(timer);
+      timer = setTimeout(() => { this.text = this.search.value.trim().toLowerCase(); this.refresh(); }, 250);
+    });
+    bar.appendChild(this.search);
+    for (const [col, counts] of Object.entries(ds.facets)) {
+      const sel = el("select");
+      sel.appendChild(new Option(ds.columns[col] + ": all", ""));
+      for (const [v, n] of Object.entries(counts)) sel.appendChild(new Option(`${v || "(empty)"} (${n})`, v));
+      sel.addEventListener("change", () => {
+        if (sel.selectedIndex === 0) delete this.facets[col]; else this.facets[col] = sel.value;
+        this.refresh();
+      });
+      bar.appendChild(sel);
+    }
+    this.status = el("span", "status");
+    bar.appendChild(this.status);
+    sec.appendChild(bar);
+
+    const grid = el("div", "grid");
+    const cols = `repeat(${ds.columns.length}, ${COL_W})`;
+    this.head = el("div", "head");
+    this.head.style.gridTemplateColumns = cols;
+    ds.columns.forEach((name, i) => {
+      const h = el("div", null, name);
+      h.title = name;
+      if (ds.sorts.includes(i)) h.addEventListener("click", () => this.toggleSort(i));
+      this.head.appendChild(h);
+    });
+    this.viewport = el("div", "viewport");
+    this.spacer = el("div", "spacer");
+    this.viewport.appendChild(this.spacer);
+    this.viewport.addEventListener("scroll", () => {
+      this.head.scrollLeft = this.viewport.scrollLeft;
+      if (!this.frame) this.frame = requestAnimationFrame(() => { this.frame = null; this.render(); });
+    });
+    this.cols = cols;
+    grid.appendChild(this.head);
+    grid.appendChild(this.viewport);
+    sec.appendChild(grid);
+    root.appendChild(sec);
+  }
+
+  toggleSort(col) {
+    if (!this.sort || this.sort.col !== col) this.sort = {col, desc: false};
+    else if (!this.sort.desc) this.sort.desc = true;
+    else this.sort = null;
+    [...this.head.children].forEach((h, i) => {
+      h.className = this.sort && this.sort.col === i ? (this.sort.desc ? "desc" : "asc") : "";
+    });
+    this.refresh();
+  }
+
+  // Recompute the visible row-id list from sort + facet filters + text filter.
+  async refresh() {
+    const gen = ++this.gen;
+    const ds = this.ds;
+    const stale = () => gen !== this.gen;
+    let mask = null;   // Uint8Array(total): 1 = row passes, null = all pass
+    for (const [col, value] of Object.entries(this.facets)) {
+      const ids = (await load(`${ds.id}/facet-${col}.json`))[value] || [];
+      if (stale()) return;
+      const m = new Uint8Array(ds.total);
+      for (const id of ids) if (!mask || mask[id]) m[id] = 1;
+      mask = m;
+    }
+    const order = this.sort ? await load(`${ds.id}/sort-${this.sort.col}.json`) : null;
+    if (stale()) return;
+
+    const apply = (m) => {
+      const ids = [];
+      const n = ds.total;
+      for (let k = 0; k < n; k++) {
+        const id = order ? order[this.sort.desc ? n - 1 - k : k] : k;
+        if (!m || m[id]) ids.push(id);
+      }
+      this.view = (m || order) ? Int32Array.from(ids) : null;
+      this.layout();
+    };
+
+    if (!this.text) {
+      apply(mask);
+      this.status.textContent = `${this.length.toLocaleString()} of ${ds.total.toLocaleString()} rows`;
+      return;
+    }
+    // text: scan shard by shard, publishing matches as they accumulate
+    const hits = new Uint8Array(ds.total);
+    for (let s = 0; s < ds.shards; s++) {
+      const rows = (await load(this.shardUrl(s))).rows;
+      if (stale()) return;
+      const base = s * ds.shard_rows;
+      rows.forEach((r, j) => {
+        const id = base + j;
+        if ((!mask || mask[id]) && r.some(v => String(v).toLowerCase().includes(this.text))) hits[id] = 1;
+      });
+      if (s % 20 === 19 || s === ds.shards - 1) {
+        apply(hits);
+        this.status.textContent = `${this.length.toLocaleString()} matches` +
+          (s < ds.shards - 1 ? ` (searching ${Math.round(100 * (s + 1) / ds.shards)}%)` : ` of ${ds.total.toLocaleString()} rows`);
+      }
+    }
+    if (!ds.shards) apply(hits);
+  }
+
+  layout() {
+    this.spacer.style.height = (this.length * ROW_H) + "px";
+    this.render();
+  }
+
+  async render() {
+    const gen = this.gen;
+    const top = this.viewport.scrollTop;
+    const first = Math.max(0, Math.floor(top / ROW_H) - OVERSCAN);
+    const last = Math.min(this.length, Math.ceil((top + this.viewport.clientHeight) / ROW_H) + OVERSCAN);
+    const ids = [];
+    for (let k = first; k < last; k++) ids.push(this.view ? this.view[k] : k);
+
+    const need = [...new Set(ids.map(id => Math.floor(id / this.ds.shard_rows)))];
+    const missing = need.filter(n => !this.loaded.has(n));
+    this.paint(first, ids);   // missing shards show placeholders until they arrive
+    if (!missing.length) return;
+    await Promise.all(missing.map(n => load(this.shardUrl(n)).then(j => this.loaded.set(n, j.rows))));
+    while (this.loaded.size > CACHE_SHARDS) this.loaded.delete(this.loaded.keys().next().value);
+    if (gen !== this.gen || top !== this.viewport.scrollTop) return;
+    this.paint(first, ids);
+  }
+
+  paint(first, ids) {
+    const sr = this.ds.shard_rows;
+    const frag = document.createDocumentFragment();
+    ids.forEach((id, k) => {
+      const rows = this.loaded.get(Math.floor(id / sr));
+      const r = rows ? rows[id % sr] : null;
+      const row = el("div", r ? "row" : "row pending");
+      row.style.top = ((first + k) * ROW_H) + "px";
+      row.style.gridTemplateColumns = this.cols;
+      for (let c = 0; c < this.ds.columns.length; c++) {
+        const v = r ? (c < r.length ? String(r[c]) : "") : "…";
+        const cell = el("div", null, v);
+        cell.title = v;
+        row.appendChild(cell);
+      }
+      frag.appendChild(row);
+    });
+    this.spacer.replaceChildren(frag);
+  }
+}
+
+load("index.json").then(index => {
+  const root = document.getElementById("content");
+  root.textContent = "";
+  document.getElementById("meta").textContent = "Generated " + index.generated;
+  if (!index.datasets.length) root.textContent = "No results in this run.";
+  for (const ds of index.datasets) new Table(ds, root);
+}).catch(e => {
+  document.getElementById("content").textContent = "Could not load the report index: " + e.message;
+});
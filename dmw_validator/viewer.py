@@ -1,35 +1,176 @@
-import os
-
-def build_viewer(out_dir):
-    html = f"""<!DOCTYPE html>
-<html lang="en">
-<head>
-  <meta charset="UTF-8">
-  <title>DMW Validation Report</title>
-  <style>
-    body {{ font-family: sans-serif; margin: 2em; background: #f8f8f8; }}
-    h1 {{ color: #333; }}
-    pre {{ background: #fff; border: 1px solid #ccc; padding: 1em; overflow-x: auto; }}
-    .section {{ margin-bottom: 3em; }}
-  </style>
-</head>
-<body>
-<h1>📋 DMW Validation Report</h1>
-
-<div class="section"><h2>🚨 Detected Issues</h2><pre id="mismatches">Loading...</pre></div>
-<div class="section"><h2>🤖 AI Logic Review</h2><pre id="ai-logic">Loading...</pre></div>
-<div class="section"><h2>🧾 AI DQ Checks</h2><pre id="ai-dq-sql">Loading...</pre></div>
-<div class="section"><h2>🔄 AI Recon Checks</h2><pre id="ai-recon-sql">Loading...</pre></div>
-
-<script>
-fetch("mismatched_fields.json").then(r => r.text()).then(d => document.getElementById("mismatches").innerText = d);
-fetch("ai/logic_quality.json").then(r => r.text()).then(d => document.getElementById("ai-logic").innerText = d);
-fetch("ai/dq_checks_ai.sql").then(r => r.text()).then(d => document.getElementById("ai-dq-sql").innerText = d);
-fetch("ai/recon_ai.sql").then(r => r.text()).then(d => document.getElementById("ai-recon-sql").innerText = d);
-</script>
-</body></html>
-"""
-    out_file = os.path.join(out_dir, "viewer.html")
-    with open(out_file, "w") as f:
-        f.write(html)
+import argparse, csv, json, os, shutil, time
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+# Static report: every result file is cut into fixed-size JSON shards plus a small
+# report/index.json; the page (templates/) renders a virtualised table that fetches
+# only the shards under the viewport, so it opens instantly for any run size.
+SHARD_ROWS = 500
+FACET_MAX = 50          # columns with at most this many distinct values get filter lists
+CELL_MAX = 2000         # nested values are shown as JSON, cut to this many characters
+REPORT_DIR = "report"
+TEMPLATES = os.path.join(os.path.dirname(__file__), "templates")
+
+# (id, title, candidate paths relative to the output dir; first existing wins)
+SECTIONS = [
+    ("mismatches", "🚨 Detected Issues", ["mismatched_fields.json", "mismatched_fields_ai.json"]),
+    ("ai-logic", "🤖 AI Logic Review", ["ai/logic_quality.json"]),
+    ("ai-dq-sql", "🧾 AI DQ Checks", ["ai/dq_checks_ai.sql"]),
+    ("ai-recon-sql", "🔄 AI Recon Checks", ["ai/recon_ai.sql"]),
+]
+
+def _cell(v):
+    if v is None:
+        return ""
+    if isinstance(v, (dict, list)):
+        v = json.dumps(v, ensure_ascii=False)
+        return v if len(v) <= CELL_MAX else v[:CELL_MAX] + "…"
+    return v
+
+def iter_records(path: str) -> Iterator[Dict]:
+    """JSON array / object, JSON Lines, CSV, or any other text file (one record per line)."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".jsonl":
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    elif ext == ".csv":
+        with open(path, encoding="utf-8", newline="") as f:
+            yield from csv.DictReader(f)
+    elif ext == ".json":
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        for rec in (data if isinstance(data, list) else [data]):
+            yield rec if isinstance(rec, dict) else {"value": rec}
+    else:
+        with open(path, encoding="utf-8", errors="replace") as f:
+            for n, line in enumerate(f, 1):
+                yield {"#": n, "line": line.rstrip("\n")}
+
+def _sort_key(values: List) -> List:
+    """Numeric order when every non-empty value is a number, else case-insensitive text."""
+    try:
+        return [float(v) if v != "" else float("-inf") for v in values]
+    except (TypeError, ValueError):
+        return [str(v).casefold() for v in values]
+
+def write_dataset(records: Iterable[Dict], out_dir: str, ds_id: str, title: str,
+                  shard_rows: int = SHARD_ROWS, text: bool = False) -> Dict:
+    """
+    Writes <out_dir>/<ds_id>/shard-NNNNN.json ({"rows": [[cell, ...], ...]}) while
+    streaming the records, then sort-<col>.json (row ids in ascending order) and
+    facet-<col>.json ({value: [row ids]}) for low-cardinality columns.
+    Returns the dataset's index entry.
+    """
+    ds_dir = os.path.join(out_dir, ds_id)
+    os.makedirs(ds_dir, exist_ok=True)
+    columns: List[str] = []
+    pos: Dict[str, int] = {}
+    values: List[List] = []   # per column, every row's value (for sort / facets)
+    shard: List[List] = []
+    shards = total = 0
+
+    def flush():
+        nonlocal shard, shards
+        with open(os.path.join(ds_dir, f"shard-{shards:05d}.json"), "w", encoding="utf-8") as f:
+            json.dump({"rows": shard}, f, ensure_ascii=False, separators=(",", ":"))
+        shards += 1
+        shard = []
+
+    for rec in records:
+        row = [""] * len(columns)
+        for k, v in rec.items():
+            k = str(k)
+            if k not in pos:
+                pos[k] = len(columns)
+                columns.append(k)
+                values.append([""] * total)
+                row.append("")
+            row[pos[k]] = _cell(v)
+        for i, v in enumerate(row):
+            values[i].append(v)
+        shard.append(row)
+        total += 1
+        if len(shard) >= shard_rows:
+            flush()
+    if shard:
+        flush()
+
+    sorts: List[int] = []
+    facets: Dict[str, Dict[str, int]] = {}
+    for i, vals in enumerate(values):
+        if text or not any(v != "" for v in vals):
+            continue
+        key = _sort_key(vals)
+        with open(os.path.join(ds_dir, f"sort-{i}.json"), "w", encoding="utf-8") as f:
+            json.dump(sorted(range(total), key=key.__getitem__), f, separators=(",", ":"))
+        sorts.append(i)
+
+        groups: Dict[str, List[int]] = {}
+        for n, v in enumerate(vals):
+            groups.setdefault(str(v), []).append(n)
+            if len(groups) > FACET_MAX:
+                break
+        if 1 < len(groups) <= FACET_MAX and len(groups) < total:  # all-distinct columns are not filters
+            with open(os.path.join(ds_dir, f"facet-{i}.json"), "w", encoding="utf-8") as f:
+                json.dump(groups, f, ensure_ascii=False, separators=(",", ":"))
+            facets[str(i)] = {v: len(ids) for v, ids in sorted(groups.items())}
+
+    return {"id": ds_id, "title": title, "columns": columns, "total": total,
+            "shard_rows": shard_rows, "shards": shards, "sorts": sorts, "facets": facets, "text": text}
+
+def build_report(out_dir: str, sources: List[Tuple[str, str, str]], shard_rows: int = SHARD_ROWS,
+                 page: str = "viewer.html") -> str:
+    """sources: (id, title, path). Writes <out_dir>/<page> and <out_dir>/report/."""
+    report = os.path.join(out_dir, REPORT_DIR)
+    if os.path.isdir(report):
+        shutil.rmtree(report)
+    os.makedirs(report)
+
+    datasets = []
+    for ds_id, title, path in sources:
+        if not os.path.exists(path):
+            continue
+        text = os.path.splitext(path)[1].lower() not in (".json", ".jsonl", ".csv")
+        datasets.append(write_dataset(iter_records(path), report, ds_id, title, shard_rows, text))
+        datasets[-1]["source"] = os.path.relpath(path, out_dir)
+
+    with open(os.path.join(report, "index.json"), "w", encoding="utf-8") as f:
+        json.dump({"generated": time.strftime("%Y-%m-%d %H:%M:%S"), "datasets": datasets},
+                  f, indent=2, ensure_ascii=False)
+    for asset in ("script.js", "style.css"):
+        shutil.copy(os.path.join(TEMPLATES, asset), os.path.join(report, asset))
+    out_file = os.path.join(out_dir, page)
+    shutil.copy(os.path.join(TEMPLATES, "base_viewer.html"), out_file)
+    return out_file
+
+def build_viewer(out_dir, shard_rows: int = SHARD_ROWS):
+    sources = []
+    for ds_id, title, candidates in SECTIONS:
+        found = [p for p in (os.path.join(out_dir, c) for c in candidates) if os.path.exists(p)]
+        if found:
+            sources.append((ds_id, title, found[0]))
+    out_file = build_report(out_dir, sources, shard_rows)
     print(f"✅ Viewer built → {out_file}")
+    return out_file
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="python -m dmw_validator.viewer",
+                                 description="Build the paginated static HTML report")
+    ap.add_argument("out_dir", help="Run output directory (viewer.html and report/ are written here)")
+    ap.add_argument("--source", nargs="+", default=None, metavar="TITLE=PATH",
+                    help="Report these files (.json/.jsonl/.csv/text) instead of the standard sections")
+    ap.add_argument("--shard-rows", type=int, default=SHARD_ROWS)
+    args = ap.parse_args(argv)
+
+    if not args.source:
+        return build_viewer(args.out_dir, args.shard_rows)
+    sources = []
+    for n, spec in enumerate(args.source):
+        title, _, path = spec.partition("=") if "=" in spec else (os.path.basename(spec), "", spec)
+        sources.append((f"ds{n}", title, path))
+    out_file = build_report(args.out_dir, sources, args.shard_rows)
+    print(f"✅ Viewer built → {out_file}")
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,61 @@
 #!/usr/bin/env python3
-from fastapi import FastAPI, File, UploadFile, Form, BackgroundTasks
-from fastapi.responses import HTMLResponse, FileResponse
+from fastapi import FastAPI, File, UploadFile, Form, Request
+from fastapi import HTTPException
+from fastapi.responses import HTMLResponse, FileResponse, PlainTextResponse, StreamingResponse
+from contextlib import asynccontextmanager
 from pathlib import Path
-import shutil, subprocess, uuid, time, json, logging, openpyxl, os
-from cfg import CFG, AI_CFG, PATHS, WEB_CFG
+import uuid, json, logging, openpyxl, os
+import metrics
+from cfg import CFG, AI_CFG, PATHS, WEB_CFG, JOB_CFG, JANITOR_CFG
+from admission import Scheduler, estimate
+from blob_store import BlobStore
+from janitor import Janitor
+from job_queue import FAILED, FINISHED, Job, JobQueue, event_stream
+from job_store import open_store
+from validator_pool import ValidatorPool
+
+# warm validator processes for the runs this process executes (None: subprocess per run)
+POOL = ValidatorPool(JOB_CFG["cpu_budget"] + JOB_CFG["fast_slots"], JOB_CFG["pool_max_jobs"],
+                     JOB_CFG["pool_max_rss_mb"]) if JOB_CFG["pool"] else None
+# runs are admitted by estimated cost (fair per user, fast lane for small DMWs); with DMW_JOB_STORE
+# they are shared with other web / job_worker.py processes
+STORE = open_store(JOB_CFG["store"], JOB_CFG["max_attempts"]) if JOB_CFG["store"] else None
+JOBS = JobQueue(
+    workers=JOB_CFG["workers"], timeout=JOB_CFG["timeout"], pool=POOL,
+    scheduler=Scheduler(JOB_CFG["cpu_budget"], JOB_CFG["mem_budget_mb"], JOB_CFG["fast_rows"], JOB_CFG["fast_slots"],
+                        JOB_CFG["max_workers"]),
+    store=STORE, worker=JOB_CFG["embedded_worker"], lease=JOB_CFG["lease"],
+)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if POOL is not None and (STORE is None or JOB_CFG["embedded_worker"]):
+        POOL.start()
+    JOBS.start()
+    if JANITOR_CFG["enabled"]:
+        JANITOR.start()
+    yield
+    JANITOR.stop()
+    JOBS.shutdown(wait=False)
 
-app = FastAPI(title="DMW Validator Web")
+app = FastAPI(title="DMW Validator Web", lifespan=lifespan)
+metrics.instrument(app)
 
 UPLOAD_DIR = Path(PATHS.get("uploads", "./uploads")); UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
 OUTPUT_DIR = Path(PATHS.get("outputs", "./outputs")); OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
 LOG_PATH   = Path(PATHS.get("logs", "./logs")) / "dmw_web.log"; LOG_PATH.parent.mkdir(parents=True, exist_ok=True)
+BLOBS      = BlobStore(UPLOAD_DIR / "blobs")   # each distinct upload stored once, hard-linked per run
+
+def run_busy(p:Path)->bool:
+    # janitor hook: the job dir, uploads and outputs (all prefixed by an upload uuid) of unfinished runs stay
+    return any(p == j.job_dir or p.name[:36] in " ".join(j.cmd) for j in JOBS.unfinished())
+
+JANITOR    = Janitor(
+    job_roots=[OUTPUT_DIR], file_roots=[UPLOAD_DIR, OUTPUT_DIR, OUTPUT_DIR / "generated"], blobs=BLOBS,
+    max_age=JANITOR_CFG["retention_days"] * 86400, quota_bytes=JANITOR_CFG["quota_mb"] << 20,
+    interval=JANITOR_CFG["interval"], grace=JANITOR_CFG["grace"], busy=run_busy,
+)
+metrics.watch(jobs=JOBS, pool=POOL, blobs=BLOBS, janitor=JANITOR)
 
 logging.basicConfig(
     filename=str(LOG_PATH),
@@ -19,43 +65,45 @@ logging.basicConfig(
 
 def save_upload(fileobj:UploadFile)->Path:
     if not fileobj: return None
-    path = UPLOAD_DIR / f"{uuid.uuid4()}_{fileobj.filename}"
-    with path.open("wb") as f:
-        shutil.copyfileobj(fileobj.file, f)
+    path, digest = BLOBS.save(fileobj.file, UPLOAD_DIR / f"{uuid.uuid4()}_{Path(fileobj.filename).name}")
+    logging.info("Upload %s -> %s", fileobj.filename, digest[:12])
     return path
 
 def summarize_excel(out_path:Path):
+    # Prefer the validator's <stem>.summary.json; fall back to scanning the workbook
+    counts={"PASS":0,"FAIL":0,"INFO":0}
     try:
+        summary_path=out_path.with_name(f"{out_path.stem}.summary.json")
+        if summary_path.exists():
+            status=json.loads(summary_path.read_text(encoding="utf-8")).get("status",{})
+            return {k:int(status.get(k,0)) for k in counts}
         wb=openpyxl.load_workbook(out_path, read_only=True, data_only=True)
-        ws=wb.active
-        headers=[c.value for c in next(ws.iter_rows(min_row=2,max_row=2))]
-        idx=headers.index("Validation_Status") if "Validation_Status" in headers else None
-        counts={"PASS":0,"FAIL":0,"INFO":0}
+        ws=wb["Baseline Data Model_output"] if "Baseline Data Model_output" in wb.sheetnames else wb.active
+        rows=ws.iter_rows(values_only=True)
+        idx=None
+        for header in rows:  # validator output has its header on row 1; skip any title rows
+            if "Validation_Status" in header:
+                idx=header.index("Validation_Status"); break
         if idx is not None:
-            for row in ws.iter_rows(min_row=3,values_only=True):
-                val=str(row[idx]).upper() if row[idx] else ""
+            for row in rows:
+                val=str(row[idx]).upper() if idx<len(row) and row[idx] else ""
                 if val in counts: counts[val]+=1
         wb.close()
         return counts
     except:
         return {}
 
-def run_validator(cmd, out_path, generate_flag):
-    start=time.time()
+def progress_path(run_id:str)->Path:
+    return OUTPUT_DIR / f"{run_id}.progress.json"
+
+def read_progress(run_id:str)->dict:
     try:
-        logging.info("Running validator: %s", " ".join(cmd))
-        subprocess.run(cmd, check=True)
-        if generate_flag:
-            gen_cmd = [
-                "python3",
-                "/app/generate_migration_artifacts.py",
-                "--validated-xlsx", str(out_path),
-                "--out-dir", str(OUTPUT_DIR / "generated")
-            ]
-            subprocess.run(gen_cmd, check=True)
-    except Exception as e:
-        logging.error("Validator failed: %s", e)
-    logging.info("Run finished in %.1fs", time.time()-start)
+        return json.loads(progress_path(run_id).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {"phase": "queued"}
+
+def job_dir(run_id:str)->Path:
+    return OUTPUT_DIR / f"job_{run_id}"
 
 # ---------------- UI ----------------
 
@@ -67,7 +115,7 @@ def index():
 
 @app.post("/validate", response_class=HTMLResponse)
 async def validate_files(
-    background_tasks: BackgroundTasks,
+    request: Request,
     dmw: UploadFile = File(...),
     ddl: UploadFile = File(...),
     prev_dmw: UploadFile = File(None),
@@ -92,13 +140,68 @@ async def validate_files(
     if prev_dmw_path: cmd += ["--prev-dmw", str(prev_dmw_path)]
     if prev_ddl_path: cmd += ["--prev-ddl", str(prev_ddl_path)]
     if enable_ai=="1": cmd += ["--enable-ai"]
-
-    background_tasks.add_task(run_validator, cmd, out_path, generate_artifacts=="1")
-    return "Validation started..."
+    cmd += ["--progress-file", str(progress_path(dmw_path.stem))]
+    cmd += ["--workers", str(JOBS.scheduler.workers(estimate(cmd).rows))]   # admitted for that many cores
+
+    then = []
+    if generate_artifacts=="1":
+        then.append([
+            "python3",
+            "/app/generate_migration_artifacts.py",
+            "--validated-xlsx", str(out_path),
+            "--out-dir", str(OUTPUT_DIR / "generated")
+        ])
+
+    run_id = dmw_path.stem
+    job_dir(run_id).mkdir(parents=True, exist_ok=True)
+    user = request.headers.get("x-forwarded-user") or (request.client.host if request.client else "")
+    JOBS.submit(Job(run_id, job_dir(run_id), cmd, output=str(out_path), user=user, then=then))
+    return f'Validation started... follow it at <a href="/progress/{dmw_path.stem}">/progress/{dmw_path.stem}</a>'
+
+@app.get("/progress/{run_id}")
+async def progress(run_id:str):
+    """Server-Sent Events with the validator's progress (phase, rows, rows/s, rule, ETA) until it ends."""
+    if Path(run_id).name != run_id or run_id.startswith(".") or JOBS.get(run_id, job_dir(run_id)) is None:
+        raise HTTPException(status_code=404, detail="Run not found")
+
+    def snapshot():
+        job = JOBS.get(run_id, job_dir(run_id))
+        if job is None:   # removed meanwhile (janitor): a final error event ends the stream
+            return {"status": "removed", "error": "Run not found"}
+        event = {**read_progress(run_id), "status": job.status}
+        if job.status == FAILED:
+            event["error"] = job.stderr.strip()[-2000:]
+        return event
+
+    return StreamingResponse(
+        event_stream(snapshot, lambda e: e["status"] in FINISHED or "error" in e, JOB_CFG["progress_interval"]),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.get("/queue")
+def queue():
+    """Admission state: budgets in use, fast-lane slots, pending runs per lane and user."""
+    snap = JOBS.scheduler.snapshot()
+    if STORE is not None:   # this process' budgets; the queue itself is shared
+        snap["shared"] = {"queued": len(STORE.candidates(1000)), "running_by_user": STORE.running_by_user()}
+    return snap
+
+@app.get("/storage")
+def storage():
+    """Janitor counters: bytes in use and reclaimed, entries and blobs removed."""
+    return {**JANITOR.stats, "quota_bytes": JANITOR.quota_bytes, "max_age": JANITOR.max_age}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    """Prometheus scrape endpoint (text format 0.0.4)."""
+    return PlainTextResponse(metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
 
 @app.get("/download")
 def download(file:str):
     path = OUTPUT_DIR / file
+    if path.exists():
+        os.utime(path)   # LRU clock for the janitor
     return FileResponse(path=path, filename=path.name)
 
 def main():
@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+# ----------------------------------------------------
+# Disk janitor for the portals: removes job directories and loose artifacts
+# past the retention age, then least recently used ones while the managed
+# roots are over quota. Pinned jobs (a .pinned marker) and running jobs are
+# never removed. Sizes are counted per inode, so hard-linked uploads, blobs and
+# cached results are neither double-counted nor reported as freed while
+# something still links to them. Blobs go through BlobStore.discard(), which
+# keeps those an upload is linking or stored / reused within the grace window.
+# ----------------------------------------------------
+import logging, os, shutil, threading, time
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from blob_store import BlobStore
+
+PIN_FILE = ".pinned"
+JOB_PREFIX = "job_"
+
+def touch(path: Path) -> None:
+    """Mark an entry as used now (the LRU clock is the entry's mtime)."""
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+def pin(job_dir: Path, pinned: bool = True) -> None:
+    marker = Path(job_dir) / PIN_FILE
+    if pinned:
+        marker.touch()
+    elif marker.exists():
+        marker.unlink()
+
+def is_pinned(path: Path) -> bool:
+    return (Path(path) / PIN_FILE).exists()
+
+def _walk(path: Path) -> Iterable[os.stat_result]:
+    if path.is_file() or path.is_symlink():
+        yield path.lstat()
+        return
+    for root, _, files in os.walk(path):
+        for f in files:
+            try:
+                yield os.lstat(os.path.join(root, f))
+            except OSError:
+                continue
+
+class Janitor:
+    """
+    job_roots:  directories whose job_* subdirectories are entries (pinnable).
+    file_roots: directories whose every child is an entry (uploads, generated
+                artifacts); dot-names and the blob store are skipped.
+    busy(path): True for entries that must be kept (queued / running jobs).
+    Entries modified within `grace` seconds are kept too (a job directory
+    exists before its job is submitted).
+    One pass is run_once(); start() repeats it every `interval` seconds.
+    """
+
+    def __init__(self, job_roots: Iterable[Path] = (), file_roots: Iterable[Path] = (),
+                 blobs: Optional[BlobStore] = None, max_age: float = 14 * 86400,
+                 quota_bytes: int = 10 << 30, interval: float = 900, grace: float = 300,
+                 busy: Optional[Callable[[Path], bool]] = None):
+        self.job_roots = [Path(p) for p in job_roots]
+        self.file_roots = [Path(p) for p in file_roots]
+        self.blobs = blobs
+        self.max_age = max_age
+        self.quota_bytes = quota_bytes
+        self.interval = interval
+        self.grace = grace
+        self.busy = busy or (lambda path: False)
+        self.stats: Dict[str, float] = {"runs": 0, "entries_removed": 0, "blobs_removed": 0,
+                                        "bytes_reclaimed": 0, "usage_bytes": 0, "pinned": 0, "last_run": 0}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    # -----------------------------
+    # Inventory
+    # -----------------------------
+    def entries(self) -> List[Path]:
+        out = []
+        for root in self.job_roots:
+            if root.is_dir():
+                out += [p for p in root.iterdir() if p.is_dir() and p.name.startswith(JOB_PREFIX)]
+        skip = {self.blobs.root.resolve()} if self.blobs is not None else set()
+        skip |= {r.resolve() for r in self.job_roots + self.file_roots}
+        for root in self.file_roots:
+            if root.is_dir():
+                out += [p for p in root.iterdir()
+                        if not p.name.startswith(".") and p.resolve() not in skip
+                        and not (p.is_dir() and p.name.startswith(JOB_PREFIX) and root in self.job_roots)]
+        return out
+
+    def usage(self) -> int:
+        """Bytes under every managed root (blob store included), each inode once."""
+        seen: Set[Tuple[int, int]] = set()
+        total = 0
+        roots = self.job_roots + self.file_roots + ([self.blobs.root] if self.blobs is not None else [])
+        for root in roots:
+            if not root.exists():
+                continue
+            for st in _walk(root):
+                key = (st.st_dev, st.st_ino)
+                if key not in seen:
+                    seen.add(key)
+                    total += st.st_size
+        return total
+
+    # -----------------------------
+    # Removal
+    # -----------------------------
+    def _blob_index(self) -> Dict[Tuple[int, int], Path]:
+        if self.blobs is None or not self.blobs.root.exists():
+            return {}
+        index = {}
+        for p in self.blobs.blobs():
+            try:
+                st = p.stat()
+            except OSError:
+                continue
+            index[(st.st_dev, st.st_ino)] = p
+        return index
+
+    def _remove(self, entry: Path, blob_index: Dict[Tuple[int, int], Path]) -> int:
+        """Deletes the entry; returns the bytes actually freed (last links only)."""
+        freed = 0
+        last_users = []
+        for st in _walk(entry):
+            key = (st.st_dev, st.st_ino)
+            if st.st_nlink == 1:
+                freed += st.st_size
+            elif st.st_nlink == 2 and key in blob_index:   # this job was the blob's last user
+                last_users.append(blob_index.pop(key))
+        if entry.is_dir() and not entry.is_symlink():
+            shutil.rmtree(entry, ignore_errors=True)
+        else:
+            entry.unlink(missing_ok=True)
+        self.stats["entries_removed"] += 1
+        for blob in last_users:
+            freed += self._discard(blob)
+        return freed
+
+    def _discard(self, blob: Path) -> int:
+        n = self.blobs.discard(blob, self.grace)
+        if n is None:   # linked again meanwhile, or recently used
+            return 0
+        self.stats["blobs_removed"] += 1
+        return n
+
+    def run_once(self, now: Optional[float] = None) -> Dict[str, int]:
+        """One retention + quota pass; returns what it did."""
+        with self._lock:
+            now = time.time() if now is None else now
+            blob_index = self._blob_index()
+            candidates = []
+            pinned = 0
+            for e in self.entries():
+                if e.is_dir() and is_pinned(e):
+                    pinned += 1
+                elif not self.busy(e):
+                    try:
+                        mtime = e.stat().st_mtime
+                    except OSError:
+                        continue
+                    if now - mtime > self.grace:
+                        candidates.append((mtime, e))
+            candidates.sort(key=lambda c: c[0])   # least recently used first
+
+            removed = freed = 0
+            kept = []
+            for mtime, e in candidates:
+                if now - mtime > self.max_age:
+                    freed += self._remove(e, blob_index)
+                    removed += 1
+                else:
+                    kept.append(e)
+
+            usage = self.usage()
+            for e in kept:
+                if usage <= self.quota_bytes:
+                    break
+                n = self._remove(e, blob_index)
+                usage -= n
+                freed += n
+                removed += 1
+
+            if self.blobs is not None:   # uploads whose jobs are gone (e.g. deleted by hand)
+                for p in list(self.blobs.orphans()):
+                    freed += self._discard(p)
+
+            usage = self.usage()
+            self.stats.update(runs=self.stats["runs"] + 1, usage_bytes=usage, pinned=pinned, last_run=now)
+            self.stats["bytes_reclaimed"] += freed
+            if usage > self.quota_bytes:
+                logging.warning(f"Janitor: {usage} bytes in use after cleanup, quota {self.quota_bytes} "
+                                f"({pinned} pinned jobs)")
+            if removed:
+                logging.info(f"Janitor: removed {removed} entries, reclaimed {freed} bytes, {usage} bytes in use")
+            return {"removed": removed, "reclaimed": freed, "usage": usage, "pinned": pinned}
+
+    # -----------------------------
+    # Background thread
+    # -----------------------------
+    def start(self) -> "Janitor":
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name="dmw-janitor", daemon=True)
+            self._thread.start()
+        return self
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception:
+                logging.exception("Janitor pass failed")
+            self._stop.wait(self.interval)
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+            self._thread = None
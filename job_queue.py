@@ -0,0 +1,415 @@
+#!/usr/bin/env python3
+# ----------------------------------------------------
+# Background validation jobs for the web portals: /upload enqueues and returns
+# a job id, a pool of worker threads runs each validation (on a pre-warmed
+# ValidatorPool process when one is given, else as a subprocess), and the state
+# is mirrored to <job_dir>/job.json for the /jobs/{id} endpoints; with a
+# ResultCache, a job identical to an earlier one finishes at submit time.
+# Jobs start when the Scheduler (admission.py) admits them: per-user fair
+# queues, a fast lane for small DMWs, CPU and memory budgets.
+# Running validators keep their latest progress event in <job_dir>/progress.json
+# (--progress-file), which event_stream() relays as Server-Sent Events.
+# With a JobStore (job_store.py) the queue and job states are shared between
+# processes: any of them may submit, and those running workers claim jobs
+# under a renewed lease; job directories must be on a volume they all mount.
+# Wait and run times are recorded in metrics.py; depth() and running() are
+# read when /metrics is scraped.
+# ----------------------------------------------------
+import asyncio, json, logging, math, os, socket, subprocess, threading, time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+import metrics
+from admission import Cost, Scheduler, estimate
+from job_store import JobStore
+from result_cache import ResultCache
+from validator_pool import ValidatorPool, validator_argv
+
+JOB_FILE = "job.json"
+PROGRESS_FILE = "progress.json"
+QUEUED, RUNNING, DONE, FAILED, INTERRUPTED = "queued", "running", "done", "failed", "interrupted"
+FINISHED = (DONE, FAILED, INTERRUPTED)
+CANCEL_POLL = 0.5   # seconds between checks of a running job's cancel event
+
+def run_command(cmd: List[str], timeout: Optional[float] = None,
+                cancel: Optional[threading.Event] = None) -> subprocess.CompletedProcess:
+    """subprocess.run(cmd, capture_output=True, text=True, timeout=timeout), killed once `cancel` is set."""
+    with subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True) as proc:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            wait = CANCEL_POLL if deadline is None else max(0.0, min(CANCEL_POLL, deadline - time.monotonic()))
+            try:
+                out, err = proc.communicate(timeout=wait)
+                return subprocess.CompletedProcess(cmd, proc.returncode, out, err)
+            except subprocess.TimeoutExpired:
+                if deadline is not None and time.monotonic() >= deadline:
+                    proc.kill()
+                    out, _ = proc.communicate()
+                    raise subprocess.TimeoutExpired(cmd, timeout, output=out)
+                if cancel is not None and cancel.is_set():
+                    proc.kill()
+                    out, err = proc.communicate()
+                    return subprocess.CompletedProcess(cmd, proc.returncode, out, err)
+
+class Job:
+    """One validation: the command to run, where it writes, and how it went."""
+
+    def __init__(self, job_id: str, job_dir: Path, cmd: List[str], output: Optional[str] = None,
+                 inputs: Optional[Dict[str, str]] = None, user: str = "", then: Optional[List[List[str]]] = None):
+        self.job_id = job_id
+        self.job_dir = Path(job_dir)
+        self.cmd = cmd
+        self.output = output          # file the job must produce to count as DONE
+        self.then = then or []        # commands run after a successful cmd (subprocesses)
+        self.inputs = inputs or {}    # upload field -> sha256 (BlobStore digest)
+        self.user = user              # fair-queueing key
+        self.cost: Optional[Cost] = None
+        self.lane: Optional[str] = None
+        self.status = QUEUED
+        self.created = time.time()
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+        self.returncode: Optional[int] = None
+        self.stdout = ""
+        self.stderr = ""
+        self.cached = False           # outputs came from the ResultCache
+        self.cache_key: Optional[str] = None
+        self.attempts = 0
+
+    @property
+    def done(self) -> bool:
+        return self.status in FINISHED
+
+    def files(self) -> List[str]:
+        return sorted(f.name for f in self.job_dir.iterdir()
+                      if f.is_file() and not f.name.startswith(".")
+                      and f.name not in (JOB_FILE, PROGRESS_FILE, PROGRESS_FILE + ".tmp"))
+
+    def progress(self) -> Optional[Dict]:
+        """The validator's latest progress event, if it has written one."""
+        try:
+            return json.loads((self.job_dir / PROGRESS_FILE).read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+
+    def to_dict(self) -> Dict:
+        return {"job_id": self.job_id, "status": self.status, "output": self.output,
+                "created": self.created, "started": self.started, "finished": self.finished,
+                "returncode": self.returncode, "stdout": self.stdout, "stderr": self.stderr, "cmd": self.cmd,
+                "inputs": self.inputs, "cached": self.cached, "user": self.user, "lane": self.lane,
+                "estimate": self.cost._asdict() if self.cost else None, "then": self.then,
+                "job_dir": str(self.job_dir), "cache_key": self.cache_key, "attempts": self.attempts}
+
+    def save(self) -> None:
+        path = self.job_dir / JOB_FILE
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(self.to_dict(), indent=2), encoding="utf-8")
+        os.replace(tmp, path)   # readers never see a half-written file
+
+    @classmethod
+    def load(cls, job_dir: Path) -> Optional["Job"]:
+        try:
+            d = json.loads((Path(job_dir) / JOB_FILE).read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+        return cls.from_dict(d, job_dir)
+
+    @classmethod
+    def from_dict(cls, d: Dict, job_dir: Optional[Path] = None) -> "Job":
+        job = cls(d["job_id"], job_dir or d["job_dir"], d.get("cmd", []), d.get("output"), d.get("inputs"),
+                  d.get("user") or "", d.get("then"))
+        for k in ("status", "created", "started", "finished", "returncode", "stdout", "stderr", "cached", "lane",
+                  "cache_key", "attempts"):
+            if k in d:
+                setattr(job, k, d[k])
+        job.cost = Cost(**d["estimate"]) if d.get("estimate") else None
+        return job
+
+class JobQueue:
+    """
+    Validation jobs started as the `scheduler` admits them (default: FIFO,
+    `workers` at a time), each on a thread that just waits on its validator
+    process, so the event loop is never blocked. With a `pool`,
+    validate_dmw_final.py commands run on its warm workers; anything else (or
+    no pool) is spawned as a subprocess. With a `cache`, validator jobs whose
+    inputs are all known by digest are looked up before queueing and stored
+    after a successful run.
+
+    Without a `store`, jobs live in this process: they are looked up in
+    memory first, then from job.json (e.g. after a restart); unfinished jobs
+    found only on disk are reported as interrupted. With a `store`, submit()
+    only records the job; if `worker` is set, a claim loop takes the jobs this
+    process' scheduler can admit now, renews their leases every lease/3
+    seconds and reports the outcome; a job whose lease could not be renewed
+    has its run killed and its result dropped, as its next owner may already
+    be writing the same job directory. A worker that dies loses its lease and
+    the job is retried elsewhere; so are jobs whose validator process died or
+    could not be started (return code -1 other than a timeout), up to the
+    store's max_attempts.
+    """
+
+    def __init__(self, workers: int = 2, timeout: Optional[int] = None, pool: Optional[ValidatorPool] = None,
+                 cache: Optional[ResultCache] = None, scheduler: Optional[Scheduler] = None,
+                 store: Optional[JobStore] = None, worker: bool = True, lease: float = 60, poll: float = 1.0):
+        self.workers = max(1, workers)
+        self.timeout = timeout
+        self.pool = pool
+        self.cache = cache
+        self.scheduler = scheduler or Scheduler(cpu=self.workers, mem_mb=math.inf, small_rows=-1, fast_slots=0)
+        self.store = store
+        self.worker = worker
+        self.lease = lease
+        self.poll = poll
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{id(self):x}"
+        # the scheduler bounds concurrency; one thread per job it can admit at once
+        threads = max(1, math.ceil(self.scheduler.cpu)) + self.scheduler.fast_slots
+        self._pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="dmw-job")
+        self._jobs: Dict[str, Job] = {}   # with a store: only the jobs this process is running
+        self._cancel: Dict[str, threading.Event] = {}   # with a store: set when a job's lease is lost
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._draining = threading.Event()   # shutting down: no new claims, leases still renewed
+        self._claimer: Optional[threading.Thread] = None
+
+    def start(self) -> "JobQueue":
+        """Starts the claim loop (store + worker); a no-op otherwise. submit() calls it too."""
+        if self.store is not None and self.worker and self._claimer is None:
+            self._claimer = threading.Thread(target=self._claim_loop, name="dmw-job-claim", daemon=True)
+            self._claimer.start()
+        return self
+
+    def submit(self, job: Job) -> Job:
+        argv = validator_argv(job.cmd)
+        if self.cache is not None and argv is not None:
+            job.cache_key = self.cache.key(job.inputs, argv, job.job_dir)
+        meta = self.cache.get(job.cache_key, job.job_dir) if job.cache_key else None
+        if meta is not None:
+            job.status, job.returncode, job.stdout, job.cached = DONE, 0, meta["stdout"], True
+            job.started = job.finished = time.time()
+            job.save()
+            if self.store is not None:
+                self.store.add(job.job_id, job.to_dict(), job.user)
+            else:
+                with self._lock:
+                    self._jobs[job.job_id] = job
+            logging.info(f"Job {job.job_id} served from the result cache ({job.cache_key[:12]})")
+            return job
+        job.cost = estimate(job.cmd)
+        job.lane = self.scheduler.lane(job.cost)
+        job.save()
+        logging.info(f"Job {job.job_id} queued ({job.lane} lane, ~{job.cost.rows} rows, ~{job.cost.mem_mb:.0f} MB, "
+                     f"user {job.user or '-'}): {' '.join(job.cmd)}")
+        if self.store is not None:
+            self.store.add(job.job_id, job.to_dict(), job.user, job.lane, job.cost.rows, job.cost.mem_mb)
+            self.start()
+            self._wake.set()
+            return job
+        with self._lock:
+            self._jobs[job.job_id] = job
+        self.scheduler.add(job.job_id, job.cost, job.user)
+        self._dispatch()
+        return job
+
+    def _dispatch(self) -> None:
+        for job_id in self.scheduler.admit():
+            with self._lock:
+                job = self._jobs[job_id]
+            try:
+                self._pool.submit(self._run, job)
+            except RuntimeError:   # shutting down
+                self.scheduler.release(job_id)
+                return
+
+    def get(self, job_id: str, job_dir: Path) -> Optional[Job]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is not None:
+            return job
+        if self.store is not None:
+            record = self.store.get(job_id)
+            if record is not None:
+                return Job.from_dict(record, job_dir)
+        job = Job.load(job_dir)
+        if job is not None and not job.done:
+            job.status = INTERRUPTED
+        return job
+
+    def position(self, job: Job) -> int:
+        """Jobs ahead of this one in its lane (0 once it is admitted)."""
+        if self.store is not None:
+            return self.store.position(job.job_id)
+        return self.scheduler.position(job.job_id)
+
+    def unfinished(self) -> List[Job]:
+        if self.store is not None:
+            return [Job.from_dict(r) for r in self.store.unfinished()]
+        with self._lock:
+            return [j for j in self._jobs.values() if not j.done]
+
+    def depth(self) -> Dict[Tuple[str], int]:
+        """Jobs waiting to start, per lane (the shared queue with a store)."""
+        if self.store is not None:
+            lanes = [c["lane"] or "main" for c in self.store.candidates(100000)]
+        else:
+            pending = self.scheduler.snapshot()["pending"]
+            lanes = [lane for lane, users in pending.items() for n in users.values() for _ in range(n)]
+        return {(lane,): lanes.count(lane) for lane in ("fast", "main")}
+
+    def running(self) -> int:
+        """Jobs this process is running."""
+        with self._lock:
+            return sum(j.status == RUNNING for j in self._jobs.values())
+
+    def active(self, job_dir: Path) -> bool:
+        """True while a job in this directory is queued or running (the janitor keeps it)."""
+        job_dir = Path(job_dir)
+        return any(j.job_dir == job_dir for j in self.unfinished())
+
+    # -----------------------------
+    # Shared store: claim loop + leases
+    # -----------------------------
+    def _claim_loop(self) -> None:
+        renewed = time.time()
+        while not self._stop.is_set():
+            try:
+                self.store.reap()
+                while not self._draining.is_set():
+                    record = self.store.claim(self.owner, self.lease, self._can_take)
+                    if record is None:
+                        break
+                    job = Job.from_dict(record)
+                    job.cost = job.cost or estimate(job.cmd)
+                    with self._lock:
+                        self._jobs[job.job_id] = job
+                        self._cancel[job.job_id] = threading.Event()
+                    self.scheduler.add(job.job_id, job.cost, job.user)
+                    self._dispatch()
+                if time.time() - renewed > self.lease / 3:
+                    renewed = time.time()
+                    with self._lock:
+                        running = list(self._jobs.values())
+                    for job in running:
+                        if not self.store.renew(job.job_id, self.owner, self.lease):
+                            logging.warning(f"Job {job.job_id}: lease lost; cancelling its run")
+                            with self._lock:
+                                cancel = self._cancel.get(job.job_id)
+                            if cancel is not None:
+                                cancel.set()
+            except Exception:
+                logging.exception("Job claim loop failed")
+            self._wake.wait(self.poll)
+            self._wake.clear()
+
+    def _can_take(self, c: Dict) -> bool:
+        # the store keeps rows, not the command: size --workers as the portals do
+        return self.scheduler.can_admit(Cost(c["rows"], 0, self.scheduler.workers(c["rows"]), c["mem_mb"]))
+
+    def _run(self, job: Job) -> None:
+        try:
+            self._execute(job)
+        finally:
+            self.scheduler.release(job.job_id)
+            if self.store is not None:
+                with self._lock:
+                    self._jobs.pop(job.job_id, None)
+                    self._cancel.pop(job.job_id, None)
+                self._wake.set()
+            else:
+                self._dispatch()
+
+    def _execute(self, job: Job) -> None:
+        with self._lock:
+            cancel = self._cancel.get(job.job_id)
+        if cancel is not None and cancel.is_set():
+            logging.warning(f"Job {job.job_id}: lease lost before it started; not run")
+            return
+        job.status = RUNNING
+        job.started = time.time()
+        job.save()
+        metrics.JOB_WAIT_SECONDS.labels(job.lane or "main").observe(job.started - job.created)
+        if self.store is not None:
+            self.store.update(job.job_id, self.owner, job.to_dict())
+        before = set(job.files())
+        argv = validator_argv(job.cmd) if self.pool is not None else None
+        try:
+            if argv is not None:
+                job.returncode, job.stdout, job.stderr = self.pool.run(argv, timeout=self.timeout, cancel=cancel)
+            else:
+                result = run_command(job.cmd, timeout=self.timeout, cancel=cancel)
+                job.returncode = result.returncode
+                job.stdout, job.stderr = result.stdout, result.stderr
+            for cmd in job.then if job.returncode == 0 else []:
+                result = run_command(cmd, timeout=self.timeout, cancel=cancel)
+                job.stdout += result.stdout
+                job.stderr += result.stderr
+                if result.returncode != 0:
+                    job.returncode = result.returncode
+                    break
+        except subprocess.TimeoutExpired as e:
+            job.returncode = -1
+            job.stdout = e.stdout if isinstance(e.stdout, str) else ""
+            job.stderr = f"Validation timed out after {self.timeout}s"
+        except Exception as e:
+            logging.exception(f"Job {job.job_id} failed to start")
+            job.returncode = -1
+            job.stderr = str(e)
+        if cancel is not None and cancel.is_set():   # its next owner has the job directory now
+            logging.warning(f"Job {job.job_id}: lease lost; run cancelled, result discarded")
+            return
+        ok = job.returncode == 0 and (not job.output or (job.job_dir / job.output).exists())
+        job.status = DONE if ok else FAILED
+        job.finished = time.time()
+        job.save()
+        if ok and job.cache_key and self.cache is not None:   # a worker may run without the cache
+            try:
+                self.cache.put(job.cache_key, job.job_dir, [f for f in job.files() if f not in before], job.stdout)
+            except OSError:
+                logging.exception(f"Job {job.job_id}: result cache store failed")
+        metrics.JOB_SECONDS.labels(job.status).observe(job.finished - job.started)
+        logging.info(f"Job {job.job_id} {job.status} in {job.finished - job.started:.1f}s")
+        if self.store is not None:
+            retry = job.returncode == -1 and not job.stderr.startswith("Validation timed out")
+            status = self.store.finish(job.job_id, self.owner, job.to_dict(), retry=retry)
+            if status == QUEUED:
+                job.status = QUEUED
+                job.save()
+                logging.info(f"Job {job.job_id} requeued for another attempt")
+            elif status is None:
+                logging.warning(f"Job {job.job_id}: lease lost before it finished; result discarded")
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._draining.set()
+        self._pool.shutdown(wait=wait)
+        self._stop.set()
+        self._wake.set()
+        if self._claimer is not None:
+            self._claimer.join(timeout=10)
+        if self.pool is not None:
+            self.pool.shutdown()
+        if self.store is not None:
+            self.store.close()
+
+async def event_stream(snapshot: Callable[[], Dict], finished: Callable[[Dict], bool],
+                       interval: float = 1.0, heartbeat: float = 15.0) -> AsyncIterator[str]:
+    """
+    Server-Sent Events: polls snapshot() every `interval` seconds and sends it
+    only when it changed (so clients get at most one update per interval),
+    a comment line every `heartbeat` seconds to keep proxies from closing the
+    stream, and stops after the first snapshot for which finished() is true.
+    snapshot() runs on a worker thread: it reads job.json and progress.json
+    (or the shared store), which must not block the event loop.
+    """
+    last, sent = None, time.time()
+    while True:
+        event = await asyncio.to_thread(snapshot)
+        if event != last:
+            yield f"data: {json.dumps(event)}\n\n"
+            last, sent = event, time.time()
+        elif time.time() - sent >= heartbeat:
+            yield ": keep-alive\n\n"
+            sent = time.time()
+        if finished(event):
+            return
+        await asyncio.sleep(interval)
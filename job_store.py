@@ -0,0 +1,394 @@
+#!/usr/bin/env python3
+# ----------------------------------------------------
+# Shared job store, so any number of web and worker processes (or containers)
+# can share one queue: web processes add jobs, workers claim them under a
+# lease they keep renewing, and a job whose lease runs out (its worker died)
+# is put back in the queue until max_attempts. Backends: SQLite (one file on
+# a shared volume; SQLite's file locks serialise the claims) and Redis (or
+# anything speaking its protocol, e.g. Valkey / KeyDB).
+#
+#   open_store("sqlite:///app/outputs/jobs.db")   or a plain path
+#   open_store("redis://redis:6379/0")
+# ----------------------------------------------------
+import json, sqlite3, threading, time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+QUEUED, RUNNING = "queued", "running"
+TERMINAL = ("done", "failed", "interrupted")
+
+class JobStore:
+    """
+    Records are the Job.to_dict() of each job plus status, attempts, lease
+    owner and expiry kept by the store. Backends implement the primitives;
+    claim() (fair ordering + first job the caller can take) is shared.
+    """
+
+    max_attempts = 3
+
+    def add(self, job_id: str, data: Dict, user: str = "", lane: str = "", rows: int = 0,
+            mem_mb: float = 0.0) -> None:
+        """Queues the job (or just records it when data["status"] is already final)."""
+        raise NotImplementedError
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        raise NotImplementedError
+
+    def candidates(self, limit: int = 200) -> List[Dict]:
+        """Queued jobs, oldest first: job_id, user, lane, rows, mem_mb, created."""
+        raise NotImplementedError
+
+    def running_by_user(self) -> Dict[str, int]:
+        raise NotImplementedError
+
+    def try_claim(self, job_id: str, owner: str, lease: float) -> Optional[Dict]:
+        """Atomically takes a queued job; None if another worker was faster."""
+        raise NotImplementedError
+
+    def renew(self, job_id: str, owner: str, lease: float) -> bool:
+        """False once the lease is lost (expired and reclaimed)."""
+        raise NotImplementedError
+
+    def update(self, job_id: str, owner: str, data: Dict) -> bool:
+        """Saves the running job's record (e.g. started); False without the lease."""
+        raise NotImplementedError
+
+    def finish(self, job_id: str, owner: str, data: Dict, retry: bool = False) -> Optional[str]:
+        """
+        Ends the lease: a retryable failure with attempts left goes back to the
+        queue, anything else stores data as final. Returns the new status, or
+        None if the lease was lost meanwhile (the result is discarded).
+        """
+        raise NotImplementedError
+
+    def reap(self) -> int:
+        """Requeues (or fails, after max_attempts) jobs whose lease expired."""
+        raise NotImplementedError
+
+    def unfinished(self) -> List[Dict]:
+        raise NotImplementedError
+
+    def _order(self) -> List[Dict]:
+        """
+        Queued jobs in claim order: fast lane first, then round-robin over
+        users, counting the jobs each already has running on any worker
+        (fair share), then oldest.
+        """
+        running = self.running_by_user()
+        seen: Dict[tuple, int] = {}
+        keyed = []
+        for c in self.candidates():   # oldest first
+            turn = seen[c["lane"], c["user"]] = seen.get((c["lane"], c["user"]), -1) + 1
+            keyed.append(((c["lane"] != "fast", running.get(c["user"], 0) + turn, c["created"]), c))
+        return [c for _, c in sorted(keyed, key=lambda k: k[0])]
+
+    def position(self, job_id: str) -> int:
+        """Jobs that would be claimed before this one (0 once claimed)."""
+        ids = [c["job_id"] for c in self._order()]
+        return ids.index(job_id) if job_id in ids else 0
+
+    def claim(self, owner: str, lease: float, fits: Callable[[Dict], bool] = lambda c: True) -> Optional[Dict]:
+        """The first job in claim order that fits this worker, taken under a lease."""
+        for c in self._order():
+            if not fits(c):
+                continue
+            data = self.try_claim(c["job_id"], owner, lease)
+            if data is not None:
+                return data
+        return None
+
+    def close(self) -> None:
+        pass
+
+# ------------------------------------------------------------
+# SQLite
+# ------------------------------------------------------------
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    user TEXT NOT NULL DEFAULT '',
+    lane TEXT NOT NULL DEFAULT '',
+    rows INTEGER NOT NULL DEFAULT 0,
+    mem_mb REAL NOT NULL DEFAULT 0,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    owner TEXT,
+    lease_expires REAL,
+    created REAL NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_status_created ON jobs (status, created);
+"""
+
+class SQLiteJobStore(JobStore):
+    """
+    One connection per thread. Every state change is a single conditional
+    UPDATE (status / owner checked in its WHERE clause), so SQLite's write
+    lock on the file is what makes claims and lease changes atomic across
+    processes; busy_timeout waits for the lock instead of failing.
+    """
+
+    def __init__(self, path: str, max_attempts: int = 3, busy_timeout: float = 30.0):
+        self.path = str(path)
+        self.max_attempts = max_attempts
+        self.busy_timeout = busy_timeout
+        self._local = threading.local()
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    def _record(self, row: sqlite3.Row) -> Dict:
+        data = json.loads(row["data"])
+        data.update(status=row["status"], attempts=row["attempts"], owner=row["owner"],
+                    lease_expires=row["lease_expires"])
+        return data
+
+    def add(self, job_id, data, user="", lane="", rows=0, mem_mb=0.0):
+        self._conn().execute(
+            "INSERT OR REPLACE INTO jobs (job_id, status, user, lane, rows, mem_mb, created, data) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (job_id, data["status"] if data.get("status") in TERMINAL else QUEUED, user, lane, rows, mem_mb,
+             data.get("created") or time.time(), json.dumps(data)))
+
+    def get(self, job_id):
+        row = self._conn().execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return self._record(row) if row else None
+
+    def candidates(self, limit=200):
+        rows = self._conn().execute(
+            "SELECT job_id, user, lane, rows, mem_mb, created FROM jobs WHERE status = ? ORDER BY created LIMIT ?",
+            (QUEUED, limit)).fetchall()
+        return [dict(r) for r in rows]
+
+    def running_by_user(self):
+        rows = self._conn().execute("SELECT user, COUNT(*) FROM jobs WHERE status = ? GROUP BY user", (RUNNING,))
+        return {u: n for u, n in rows}
+
+    def try_claim(self, job_id, owner, lease):
+        conn = self._conn()
+        cur = conn.execute(
+            "UPDATE jobs SET status = ?, owner = ?, lease_expires = ?, attempts = attempts + 1 "
+            "WHERE job_id = ? AND status = ?", (RUNNING, owner, time.time() + lease, job_id, QUEUED))
+        return self.get(job_id) if cur.rowcount == 1 else None
+
+    def renew(self, job_id, owner, lease):
+        cur = self._conn().execute(
+            "UPDATE jobs SET lease_expires = ? WHERE job_id = ? AND status = ? AND owner = ?",
+            (time.time() + lease, job_id, RUNNING, owner))
+        return cur.rowcount == 1
+
+    def update(self, job_id, owner, data):
+        cur = self._conn().execute("UPDATE jobs SET data = ? WHERE job_id = ? AND status = ? AND owner = ?",
+                                   (json.dumps(data), job_id, RUNNING, owner))
+        return cur.rowcount == 1
+
+    def finish(self, job_id, owner, data, retry=False):
+        conn = self._conn()
+        if retry:
+            cur = conn.execute(
+                "UPDATE jobs SET status = ?, owner = NULL, lease_expires = NULL "
+                "WHERE job_id = ? AND status = ? AND owner = ? AND attempts < ?",
+                (QUEUED, job_id, RUNNING, owner, self.max_attempts))
+            if cur.rowcount == 1:
+                return QUEUED
+        cur = conn.execute(
+            "UPDATE jobs SET status = ?, owner = NULL, lease_expires = NULL, data = ? "
+            "WHERE job_id = ? AND status = ? AND owner = ?",
+            (data["status"], json.dumps(data), job_id, RUNNING, owner))
+        return data["status"] if cur.rowcount == 1 else None
+
+    def reap(self):
+        conn = self._conn()
+        now = time.time()
+        n = conn.execute(
+            "UPDATE jobs SET status = ?, owner = NULL, lease_expires = NULL "
+            "WHERE status = ? AND lease_expires < ? AND attempts < ?",
+            (QUEUED, RUNNING, now, self.max_attempts)).rowcount
+        for row in conn.execute("SELECT * FROM jobs WHERE status = ? AND lease_expires < ?",
+                                (RUNNING, now)).fetchall():
+            data = self._record(row)
+            data.update(status="failed", finished=now,
+                        stderr=f"Worker lost (lease expired) on all {row['attempts']} attempts")
+            conn.execute("UPDATE jobs SET status = ?, owner = NULL, lease_expires = NULL, data = ? "
+                         "WHERE job_id = ? AND status = ? AND lease_expires < ?",
+                         ("failed", json.dumps(data), row["job_id"], RUNNING, now))
+            n += 1
+        return n
+
+    def unfinished(self):
+        rows = self._conn().execute("SELECT * FROM jobs WHERE status IN (?, ?)", (QUEUED, RUNNING)).fetchall()
+        return [self._record(r) for r in rows]
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+# ------------------------------------------------------------
+# Redis
+# ------------------------------------------------------------
+# Each state change is one Lua script, so it is atomic on the server.
+# KEYS[1] job hash, KEYS[2] queued zset (score created), KEYS[3] leases zset (score expiry)
+_CLAIM = """
+if redis.call('ZREM', KEYS[2], ARGV[1]) == 0 then return false end
+redis.call('HSET', KEYS[1], 'status', 'running', 'owner', ARGV[2], 'lease_expires', ARGV[3])
+redis.call('HINCRBY', KEYS[1], 'attempts', 1)
+redis.call('ZADD', KEYS[3], ARGV[3], ARGV[1])
+return 1
+"""
+_RENEW = """
+if redis.call('HGET', KEYS[1], 'owner') ~= ARGV[2] or redis.call('HGET', KEYS[1], 'status') ~= 'running' then
+  return 0 end
+redis.call('HSET', KEYS[1], 'lease_expires', ARGV[3])
+redis.call('ZADD', KEYS[3], ARGV[3], ARGV[1])
+return 1
+"""
+_UPDATE = """
+if redis.call('HGET', KEYS[1], 'owner') ~= ARGV[2] or redis.call('HGET', KEYS[1], 'status') ~= 'running' then
+  return 0 end
+redis.call('HSET', KEYS[1], 'data', ARGV[3])
+return 1
+"""
+# ARGV: job_id, owner ('' = any owner whose lease expired before ARGV[6]), retry, status, data, now, max_attempts
+_FINISH = """
+local owner = redis.call('HGET', KEYS[1], 'owner')
+if redis.call('HGET', KEYS[1], 'status') ~= 'running' then return false end
+if ARGV[2] ~= '' and owner ~= ARGV[2] then return false end
+if ARGV[2] == '' and tonumber(redis.call('HGET', KEYS[1], 'lease_expires')) >= tonumber(ARGV[6]) then
+  return false end
+redis.call('ZREM', KEYS[3], ARGV[1])
+redis.call('HDEL', KEYS[1], 'owner', 'lease_expires')
+if ARGV[3] == '1' and tonumber(redis.call('HGET', KEYS[1], 'attempts')) < tonumber(ARGV[7]) then
+  redis.call('HSET', KEYS[1], 'status', 'queued')
+  redis.call('ZADD', KEYS[2], redis.call('HGET', KEYS[1], 'created'), ARGV[1])
+  return 'queued'
+end
+redis.call('HSET', KEYS[1], 'status', ARGV[4], 'data', ARGV[5])
+return ARGV[4]
+"""
+
+class RedisJobStore(JobStore):
+    """
+    <prefix>job:<id> hashes hold the records; <prefix>queued (by creation
+    time) and <prefix>leases (by expiry) index them. Needs the redis package
+    (or pass a client speaking its API, decode_responses=True).
+    """
+
+    def __init__(self, url: str = "", max_attempts: int = 3, prefix: str = "dmw:", client=None):
+        if client is None:
+            try:
+                import redis
+            except ImportError as e:
+                raise RuntimeError("redis:// job stores need the redis package (pip install redis)") from e
+            client = redis.Redis.from_url(url, decode_responses=True)
+        self.max_attempts = max_attempts
+        self.prefix = prefix
+        self.r = client
+        self._queued, self._leases = prefix + "queued", prefix + "leases"
+        self._claim, self._renew = self.r.register_script(_CLAIM), self.r.register_script(_RENEW)
+        self._update, self._finish = self.r.register_script(_UPDATE), self.r.register_script(_FINISH)
+
+    def _key(self, job_id: str) -> str:
+        return f"{self.prefix}job:{job_id}"
+
+    def _keys(self, job_id: str) -> List[str]:
+        return [self._key(job_id), self._queued, self._leases]
+
+    def _record(self, h: Dict) -> Dict:
+        data = json.loads(h["data"])
+        data.update(status=h["status"], attempts=int(h.get("attempts", 0)), owner=h.get("owner"),
+                    lease_expires=float(h["lease_expires"]) if h.get("lease_expires") else None)
+        return data
+
+    def add(self, job_id, data, user="", lane="", rows=0, mem_mb=0.0):
+        created = data.get("created") or time.time()
+        status = data["status"] if data.get("status") in TERMINAL else QUEUED
+        p = self.r.pipeline()
+        p.delete(self._key(job_id))
+        p.hset(self._key(job_id), mapping={"status": status, "user": user, "lane": lane, "rows": rows,
+                                           "mem_mb": mem_mb, "attempts": 0, "created": created,
+                                           "data": json.dumps(data)})
+        if status == QUEUED:
+            p.zadd(self._queued, {job_id: created})
+        p.execute()
+
+    def get(self, job_id):
+        h = self.r.hgetall(self._key(job_id))
+        return self._record(h) if h else None
+
+    def candidates(self, limit=200):
+        ids = self.r.zrange(self._queued, 0, limit - 1)
+        p = self.r.pipeline()
+        for job_id in ids:
+            p.hmget(self._key(job_id), "user", "lane", "rows", "mem_mb", "created")
+        out = []
+        for job_id, (user, lane, rows, mem_mb, created) in zip(ids, p.execute()):
+            if created is not None:
+                out.append({"job_id": job_id, "user": user or "", "lane": lane or "", "rows": int(rows or 0),
+                            "mem_mb": float(mem_mb or 0), "created": float(created)})
+        return out
+
+    def running_by_user(self):
+        p = self.r.pipeline()
+        for job_id in self.r.zrange(self._leases, 0, -1):
+            p.hget(self._key(job_id), "user")
+        counts: Dict[str, int] = {}
+        for user in p.execute():
+            counts[user or ""] = counts.get(user or "", 0) + 1
+        return counts
+
+    def try_claim(self, job_id, owner, lease):
+        if not self._claim(keys=self._keys(job_id), args=[job_id, owner, time.time() + lease]):
+            return None
+        return self.get(job_id)
+
+    def renew(self, job_id, owner, lease):
+        return bool(self._renew(keys=self._keys(job_id), args=[job_id, owner, time.time() + lease]))
+
+    def update(self, job_id, owner, data):
+        return bool(self._update(keys=self._keys(job_id), args=[job_id, owner, json.dumps(data)]))
+
+    def finish(self, job_id, owner, data, retry=False):
+        return self._finish(keys=self._keys(job_id), args=[job_id, owner, "1" if retry else "0", data["status"],
+                                                           json.dumps(data), time.time(), self.max_attempts]) or None
+
+    def reap(self):
+        now = time.time()
+        n = 0
+        for job_id in self.r.zrangebyscore(self._leases, "-inf", now):
+            record = self.get(job_id)
+            if record is None:
+                self.r.zrem(self._leases, job_id)
+                continue
+            record.update(status="failed", finished=now,
+                          stderr=f"Worker lost (lease expired) on all {record['attempts']} attempts")
+            if self._finish(keys=self._keys(job_id), args=[job_id, "", "1", "failed", json.dumps(record), now,
+                                                           self.max_attempts]):
+                n += 1
+        return n
+
+    def unfinished(self):
+        ids = self.r.zrange(self._queued, 0, -1) + self.r.zrange(self._leases, 0, -1)
+        return [r for r in (self.get(i) for i in ids) if r is not None]
+
+    def close(self):
+        self.r.close()
+
+def open_store(url: str, max_attempts: int = 3) -> JobStore:
+    """sqlite:///abs/path.db, sqlite:rel/path.db or a plain path -> SQLite; redis:// rediss:// -> Redis."""
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisJobStore(url, max_attempts)
+    if url.startswith("sqlite:"):
+        url = url[len("sqlite:"):]
+        url = url[2:] if url.startswith("//") else url
+    return SQLiteJobStore(url, max_attempts)
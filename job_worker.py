@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+# ----------------------------------------------------
+# Stand-alone job worker: claims validation jobs from the shared job store
+# (DMW_JOB_STORE / --store) and runs them on warm validator processes, within
+# this host's CPU / memory budgets. Run any number of these next to portals
+# started with DMW_EMBEDDED_WORKER=0; uploads and outputs must be on a volume
+# every process mounts at the same path.
+#
+#   DMW_JOB_STORE=sqlite:////app/outputs/jobs.db python3 job_worker.py --metrics-port 9101
+# ----------------------------------------------------
+import argparse, logging, signal, threading
+from pathlib import Path
+from typing import List, Optional
+
+import metrics
+from admission import Scheduler
+from cfg import JOB_CFG
+from job_queue import JobQueue
+from job_store import open_store
+from result_cache import ResultCache
+from validator_pool import ValidatorPool
+
+def main(argv: Optional[List[str]] = None):
+    ap = argparse.ArgumentParser(prog="job_worker.py", description="Run DMW validation jobs from the shared job store")
+    ap.add_argument("--store", default=JOB_CFG["store"], help="sqlite:///path.db or redis://host:6379/0")
+    ap.add_argument("--cpu", type=float, default=JOB_CFG["cpu_budget"], help="validators at once")
+    ap.add_argument("--mem-mb", type=float, default=JOB_CFG["mem_budget_mb"], help="summed estimated peak RSS")
+    ap.add_argument("--cache-dir", default=None, help="the portal's result cache (outputs/.cache) to store results in")
+    ap.add_argument("--no-pool", action="store_true", help="a subprocess per job instead of warm workers")
+    ap.add_argument("--metrics-port", type=int, default=0, help="serve Prometheus GET /metrics on this port")
+    args = ap.parse_args(argv)
+    if not args.store:
+        ap.error("no job store: set DMW_JOB_STORE or pass --store")
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+
+    scheduler = Scheduler(args.cpu, args.mem_mb, JOB_CFG["fast_rows"], JOB_CFG["fast_slots"], JOB_CFG["max_workers"])
+    pool = None if args.no_pool else ValidatorPool(int(args.cpu) + JOB_CFG["fast_slots"], JOB_CFG["pool_max_jobs"],
+                                                   JOB_CFG["pool_max_rss_mb"]).start()
+    cache = ResultCache(Path(args.cache_dir), JOB_CFG["cache_ttl"], JOB_CFG["cache_max_mb"] << 20) \
+        if args.cache_dir and JOB_CFG["cache"] else None
+    jobs = JobQueue(timeout=JOB_CFG["timeout"], pool=pool, cache=cache, scheduler=scheduler,
+                    store=open_store(args.store, JOB_CFG["max_attempts"]), lease=JOB_CFG["lease"]).start()
+    metrics.watch(jobs=jobs, pool=pool)
+    if args.metrics_port:
+        metrics.serve(args.metrics_port)
+    logging.info(f"Job worker {jobs.owner} on {args.store} (cpu {args.cpu}, {args.mem_mb:.0f} MB)")
+
+    stop = threading.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, lambda *_: stop.set())
+    stop.wait()
+    logging.info("Stopping: waiting for running jobs")
+    jobs.shutdown(wait=True)
+
+if __name__ == "__main__":
+    main()
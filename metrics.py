@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+# ----------------------------------------------------
+# In-process instrumentation in the Prometheus text format, without a client
+# library: counters, gauges and histograms (optionally labelled) registered in
+# a Registry that the portals' GET /metrics renders. A metric can also be read
+# at scrape time from existing state (set_function), e.g. queue depth or the
+# result cache's hit counters. Code running in another process (the validator
+# pool workers) records into its own REGISTRY and hands the increments over
+# with drain(); the portal merge()s them into its registry.
+# ----------------------------------------------------
+import bisect, math, os, threading, time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+DURATION_BUCKETS = (0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1200, 1800, 3600)
+RATE_BUCKETS = (100, 250, 500, 1000, 2500, 5000, 10000, 25000, 50000, 100000)
+
+Labels = Tuple[str, ...]
+
+def _fmt(v: float) -> str:
+    if v == math.inf:
+        return "+Inf"
+    if v == -math.inf:
+        return "-Inf"
+    if math.isnan(v):
+        return "NaN"
+    return str(int(v)) if float(v).is_integer() and abs(v) < 1e15 else repr(float(v))
+
+def _escape(v: str) -> str:
+    return v.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labelstr(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)] + ([extra] if extra else [])
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+class _Child:
+    """One label combination of a metric (what labels() returns)."""
+
+    def __init__(self, metric: "Metric", key: Labels):
+        self._metric, self._key = metric, key
+
+    def inc(self, n: float = 1) -> None:
+        self._metric._inc(self._key, n)
+
+    def dec(self, n: float = 1) -> None:
+        self._metric._inc(self._key, -n)
+
+    def set(self, v: float) -> None:
+        self._metric._set(self._key, v)
+
+    def observe(self, v: float) -> None:
+        self._metric._observe(self._key, v)
+
+    @contextmanager
+    def time(self) -> Iterator[None]:
+        """Observes (or, for a counter, adds) the seconds spent in the block."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            spent = time.perf_counter() - started
+            (self.observe if self._metric.kind == "histogram" else self.inc)(spent)
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, doc: str, labels: Sequence[str] = (), registry: Optional["Registry"] = None):
+        self.name, self.doc, self.labelnames = name, doc, tuple(labels)
+        self._values: Dict[Labels, object] = {}
+        self._fn: Optional[Callable[[], object]] = None
+        self._lock = threading.Lock()
+        (REGISTRY if registry is None else registry).register(self)
+
+    def labels(self, *values, **kw) -> _Child:
+        key = tuple(str(v) for v in values) if values else tuple(str(kw[n]) for n in self.labelnames)
+        if len(key) != len(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {self.labelnames}, got {key}")
+        return _Child(self, key)
+
+    # the unlabelled forms
+    def inc(self, n: float = 1) -> None:
+        self.labels().inc(n)
+
+    def set(self, v: float) -> None:
+        self.labels().set(v)
+
+    def observe(self, v: float) -> None:
+        self.labels().observe(v)
+
+    def time(self):
+        return self.labels().time()
+
+    def set_function(self, fn: Callable[[], object]) -> None:
+        """Read the value at scrape time: fn() returns a number, or {label values: number}."""
+        self._fn = fn
+
+    def _inc(self, key: Labels, n: float) -> None:
+        raise TypeError(f"{self.kind} {self.name} cannot be incremented")
+
+    def _set(self, key: Labels, v: float) -> None:
+        raise TypeError(f"{self.kind} {self.name} cannot be set")
+
+    def _observe(self, key: Labels, v: float) -> None:
+        raise TypeError(f"{self.kind} {self.name} cannot observe")
+
+    def values(self) -> Dict[Labels, object]:
+        if self._fn is None:
+            with self._lock:
+                return {k: (list(v) if isinstance(v, list) else v) for k, v in self._values.items()}
+        try:
+            v = self._fn()
+        except Exception:
+            return {}
+        if isinstance(v, dict):
+            return {(k if isinstance(k, tuple) else (k,)): float(x) for k, x in v.items() if x is not None}
+        return {} if v is None else {(): float(v)}
+
+    def samples(self) -> List[str]:
+        return [f"{self.name}{_labelstr(self.labelnames, k)} {_fmt(v)}" for k, v in sorted(self.values().items())]
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {_escape(self.doc)}", f"# TYPE {self.name} {self.kind}"] + self.samples()
+        return "\n".join(lines) + "\n"
+
+class Counter(Metric):
+    kind = "counter"
+
+    def _inc(self, key: Labels, n: float) -> None:
+        if n < 0:
+            raise ValueError(f"counter {self.name} can only go up")
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + n
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def _inc(self, key: Labels, n: float) -> None:
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + n
+
+    def _set(self, key: Labels, v: float) -> None:
+        with self._lock:
+            self._values[key] = float(v)
+
+class Histogram(Metric):
+    """Values per label set: [count per bucket (not cumulative) ..., +Inf bucket, sum]."""
+    kind = "histogram"
+
+    def __init__(self, name: str, doc: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS,
+                 registry: Optional["Registry"] = None):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, doc, labels, registry)
+
+    def _observe(self, key: Labels, v: float) -> None:
+        i = bisect.bisect_left(self.buckets, v)
+        with self._lock:
+            counts = self._values.setdefault(key, [0.0] * (len(self.buckets) + 2))
+            counts[i] += 1
+            counts[-1] += v
+
+    def samples(self) -> List[str]:
+        out = []
+        for key, counts in sorted(self.values().items()):
+            total = 0.0
+            for le, n in zip(self.buckets + (math.inf,), counts):
+                total += n
+                le = 'le="%s"' % _fmt(le)
+                out.append(f"{self.name}_bucket{_labelstr(self.labelnames, key, le)} {_fmt(total)}")
+            out.append(f"{self.name}_sum{_labelstr(self.labelnames, key)} {_fmt(counts[-1])}")
+            out.append(f"{self.name}_count{_labelstr(self.labelnames, key)} {_fmt(total)}")
+        return out
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: Metric) -> None:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+
+    def get(self, name: str) -> Optional[Metric]:
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "".join(m.render() for m in metrics)
+
+    def drain(self) -> Dict[str, List]:
+        """Counter and histogram increments recorded since the last drain (then reset), for merge()."""
+        out = {}
+        with self._lock:
+            metrics = [m for m in self._metrics.values() if m._fn is None and m.kind in ("counter", "histogram")]
+        for m in metrics:
+            with m._lock:
+                values, m._values = m._values, {}
+            if values:
+                out[m.name] = [[list(k), v] for k, v in values.items()]
+        return out
+
+    def merge(self, snapshot: Dict[str, List]) -> None:
+        """Adds another process' drain() to this registry (unknown or mismatched metrics are skipped)."""
+        for name, values in (snapshot or {}).items():
+            m = self._metrics.get(name)
+            if m is None or m._fn is not None:
+                continue
+            with m._lock:
+                for key, v in values:
+                    key = tuple(key)
+                    if len(key) != len(m.labelnames):
+                        continue
+                    if isinstance(m, Histogram):
+                        counts = m._values.setdefault(key, [0.0] * (len(m.buckets) + 2))
+                        if len(v) == len(counts):
+                            m._values[key] = [a + b for a, b in zip(counts, v)]
+                    elif isinstance(m, Counter):
+                        m._values[key] = m._values.get(key, 0.0) + v
+
+REGISTRY = Registry()
+
+def rss_bytes() -> Optional[float]:
+    """Resident set size of this process (None where /proc is unavailable)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+# ----------------------------------------------------
+# The metrics the portals, workers and validator report
+# ----------------------------------------------------
+HTTP_SECONDS = Histogram("dmw_http_request_duration_seconds", "HTTP request latency by route",
+                         ["method", "route", "status"])
+JOB_SECONDS = Histogram("dmw_job_duration_seconds", "Validation job run time (start to finish)",
+                        ["status"], DURATION_BUCKETS)
+JOB_WAIT_SECONDS = Histogram("dmw_job_wait_seconds", "Time validation jobs waited to be admitted",
+                             ["lane"], DURATION_BUCKETS)
+QUEUE_DEPTH = Gauge("dmw_job_queue_depth", "Validation jobs waiting to start", ["lane"])
+JOBS_RUNNING = Gauge("dmw_jobs_running", "Validation jobs running in this process")
+PHASE_SECONDS = Histogram("dmw_validator_phase_seconds", "Validator time per phase", ["phase"], DURATION_BUCKETS)
+ROWS_TOTAL = Counter("dmw_validator_rows_total", "DMW rows validated")
+ROWS_PER_SECOND = Histogram("dmw_validator_rows_per_second", "Validator throughput per run (rows / run time)",
+                            buckets=RATE_BUCKETS)
+UPLOAD_BYTES = Counter("dmw_upload_bytes_total", "Bytes uploaded", ["stored"])
+CACHE_REQUESTS = Counter("dmw_result_cache_requests_total", "Result cache lookups", ["result"])
+WORKER_RSS = Gauge("dmw_validator_worker_rss_bytes", "Resident memory of each warm validator worker after its last job",
+                   ["pid"])
+JANITOR_RECLAIMED = Counter("dmw_janitor_reclaimed_bytes_total", "Bytes freed by the disk janitor")
+DISK_USAGE = Gauge("dmw_disk_usage_bytes", "Bytes under the janitor's managed roots (last pass)")
+AI_SECONDS = Histogram("dmw_ai_call_seconds", "LLM completion latency", ["endpoint"], LATENCY_BUCKETS + (60, 120))
+PROCESS_RSS = Gauge("process_resident_memory_bytes", "Resident memory of this process")
+PROCESS_RSS.set_function(rss_bytes)
+
+def instrument(app) -> None:
+    """Records each request of a FastAPI app in HTTP_SECONDS, labelled by route template (not the raw path)."""
+    @app.middleware("http")
+    async def record_latency(request, call_next):
+        started = time.perf_counter()
+        response = await call_next(request)
+        route = getattr(request.scope.get("route"), "path", "unmatched")
+        HTTP_SECONDS.labels(request.method, route, response.status_code).observe(time.perf_counter() - started)
+        return response
+
+def watch(jobs=None, pool=None, blobs=None, janitor=None) -> None:
+    """Reads the state of a portal's (or worker's) objects at scrape time: JobQueue, ValidatorPool, BlobStore, Janitor."""
+    if jobs is not None:
+        QUEUE_DEPTH.set_function(jobs.depth)
+        JOBS_RUNNING.set_function(jobs.running)
+        CACHE_REQUESTS.set_function(lambda: {"hit": jobs.cache.stats["hits"], "miss": jobs.cache.stats["misses"]}
+                                    if jobs.cache is not None else None)
+    if pool is not None:
+        WORKER_RSS.set_function(pool.rss)
+    if blobs is not None:
+        UPLOAD_BYTES.set_function(lambda: {"new": blobs.stats["bytes_in"] - blobs.stats["bytes_deduped"],
+                                           "deduplicated": blobs.stats["bytes_deduped"]})
+    if janitor is not None:
+        JANITOR_RECLAIMED.set_function(lambda: janitor.stats["bytes_reclaimed"])
+        DISK_USAGE.set_function(lambda: janitor.stats["usage_bytes"] if janitor.stats["runs"] else None)
+
+def serve(port: int, host: str = "0.0.0.0"):
+    """GET /metrics from a background HTTP server, for processes without a web app (job_worker.py)."""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = REGISTRY.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name="dmw-metrics", daemon=True).start()
+    return server
@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+# ----------------------------------------------------
+# Per-destination-table partitioned outputs (--partition-output by-table):
+# rows are spooled per table while the run streams, then one compact
+# workbook / CSV per table (or table group) is written by a process pool
+# ----------------------------------------------------
+import csv, json, logging, os, pickle, re, shutil, tempfile
+from typing import Dict, Iterator, List, Optional, Tuple
+
+PARTITION_MODES = ("by-table",)
+PARTITION_FORMATS = ("xlsx", "csv")
+PARTITION_CHUNK = 512        # rows per pickled chunk in a table's spool file
+PARTITION_BUFFER = 16384     # rows buffered across all tables before spilling to disk
+BASELINE_SHEET = "Baseline Data Model_output"
+NO_TABLE = "_NO_TABLE"
+INDEX_NAME = "index.json"
+TABLE_COLS = ("TABLE", "DEST_TABLE", "REFERENCE_TABLE")  # issue sheets are routed by the first of these
+
+_UNSAFE = re.compile(r"[^A-Za-z0-9_.-]+")
+
+def safe_name(table: str) -> str:
+    return _UNSAFE.sub("_", table).strip("._") or NO_TABLE
+
+def plan_groups(table_rows: Dict[str, int], group_rows: int = 0) -> List[List[str]]:
+    """
+    Tables in name order; with group_rows > 0 consecutive tables are packed into
+    one file until it holds group_rows baseline rows (a bigger table gets its own).
+    """
+    tables = sorted(table_rows)
+    if group_rows <= 0:
+        return [[t] for t in tables]
+    groups: List[List[str]] = []
+    load = 0
+    for t in tables:
+        if not groups or load + table_rows[t] > group_rows:
+            groups.append([])
+            load = 0
+        groups[-1].append(t)
+        load += table_rows[t]
+    return groups
+
+def _read_spool(path: str) -> Iterator[Tuple[Optional[str], List]]:
+    with open(path, "rb") as f:
+        while True:
+            try:
+                chunk = pickle.load(f)
+            except EOFError:
+                return
+            yield from chunk
+
+def write_partition(task: Dict) -> Dict:
+    """
+    Process-pool task: replay the spools of one table group into one file.
+    Spool records are (None, baseline row) or (issue sheet title, issue row).
+    xlsx: baseline sheet + the issue sheets that have rows for these tables.
+    csv: baseline rows only (issues stay in the main workbook / results sidecars).
+    """
+    status_i = task["status_i"]
+    status: Dict[str, int] = {}
+    rows = issues = 0
+
+    def records() -> Iterator[Tuple[Optional[str], List]]:
+        for spool in task["spools"]:
+            yield from _read_spool(spool)
+
+    if task["format"] == "csv":
+        with open(task["path"], "w", encoding="utf-8", newline="") as f:
+            w = csv.writer(f)
+            w.writerow(task["header"])
+            for sheet, row in records():
+                if sheet is None:
+                    w.writerow(row)
+                    rows += 1
+                    st = row[status_i] if status_i < len(row) else ""
+                    status[st] = status.get(st, 0) + 1
+    else:
+        from openpyxl import Workbook
+        wb = Workbook(write_only=True)
+        base = wb.create_sheet(BASELINE_SHEET)
+        base.append(task["header"])
+        sheets = {}
+        for sheet, row in records():
+            if sheet is None:
+                base.append(row)
+                rows += 1
+                st = row[status_i] if status_i < len(row) else ""
+                status[st] = status.get(st, 0) + 1
+                continue
+            if sheet not in sheets:
+                sheets[sheet] = wb.create_sheet(sheet)
+                sheets[sheet].append(task["issue_headers"][sheet])
+            sheets[sheet].append(row)
+            issues += 1
+        wb.save(task["path"])
+
+    return {"file": os.path.basename(task["path"]), "tables": task["tables"], "rows": rows,
+            "fail_rows": status.get("FAIL", 0), "status": status, "issues": issues}
+
+class PartitionOutput:
+    """
+    Collects baseline rows (row) and issue rows (tee'd rule sheets) per
+    destination table, spilling them to one spool file per table so memory
+    stays bounded by PARTITION_BUFFER rows whatever the table count.
+    close() writes <out_dir>/<table>.<fmt> (or <first>--<last>.<fmt> per table
+    group) on `workers` processes, plus <out_dir>/index.json mapping every
+    table to its file with row / FAIL counts.
+    """
+
+    def __init__(self, out_dir: str, header: List[str], status_i: int, *,
+                 fmt: str = "xlsx", workers: int = 1, group_rows: int = 0):
+        if fmt not in PARTITION_FORMATS:
+            raise ValueError(f"Unknown partition format: {fmt}")
+        self.out_dir = out_dir
+        self.header = header
+        self.status_i = status_i
+        self.fmt = fmt
+        self.workers = max(1, workers)
+        self.group_rows = group_rows
+        self.index_path = os.path.join(out_dir, INDEX_NAME)
+        self._tmp = tempfile.mkdtemp(prefix="dmw-parts-")
+        self._spools: Dict[str, str] = {}
+        self._buf: Dict[str, List] = {}
+        self._buffered = 0
+        self._rows: Dict[str, int] = {}
+        self._issue_headers: Dict[str, List] = {}
+
+    def _add(self, table: str, rec: Tuple[Optional[str], List]) -> None:
+        t = (table or "").strip().upper() or NO_TABLE
+        self._buf.setdefault(t, []).append(rec)
+        self._buffered += 1
+        if len(self._buf[t]) >= PARTITION_CHUNK:
+            self._spill(t)
+        elif self._buffered >= PARTITION_BUFFER:
+            for k in list(self._buf):
+                self._spill(k)
+
+    def _spill(self, t: str) -> None:
+        chunk = self._buf.pop(t, None)
+        if not chunk:
+            return
+        if t not in self._spools:
+            self._spools[t] = os.path.join(self._tmp, f"{len(self._spools)}.pkl")
+        with open(self._spools[t], "ab") as f:
+            pickle.dump(chunk, f, protocol=pickle.HIGHEST_PROTOCOL)
+        self._buffered -= len(chunk)
+
+    def row(self, table: str, row: List) -> None:
+        t = (table or "").strip().upper() or NO_TABLE
+        self._rows[t] = self._rows.get(t, 0) + 1
+        self._add(t, (None, row))
+
+    def tee(self, ws, title: str) -> "PartitionTee":
+        """Wrap a rule worksheet so each issue row also lands in its table's partition."""
+        return PartitionTee(ws, self, title)
+
+    def close(self) -> str:
+        for t in list(self._buf):
+            self._spill(t)
+        try:
+            entries = self._write_all()
+        finally:
+            shutil.rmtree(self._tmp, ignore_errors=True)
+        os.makedirs(self.out_dir, exist_ok=True)
+        with open(self.index_path, "w", encoding="utf-8") as f:
+            json.dump({"format": self.fmt, "header": self.header, "partitions": entries,
+                       "tables": {t: e["file"] for e in entries for t in e["tables"]}},
+                      f, indent=2, ensure_ascii=False)
+        return self.index_path
+
+    def _write_all(self) -> List[Dict]:
+        tables = {t: self._rows.get(t, 0) for t in self._spools}
+        used: Dict[str, int] = {}
+        tasks = []
+        for group in plan_groups(tables, self.group_rows):
+            name = safe_name(group[0]) if len(group) == 1 else f"{safe_name(group[0])}--{safe_name(group[-1])}"
+            n = used[name.upper()] = used.get(name.upper(), 0) + 1  # case-insensitive filesystems
+            if n > 1:
+                name = f"{name}~{n}"
+            tasks.append({"path": os.path.join(self.out_dir, f"{name}.{self.fmt}"),
+                          "format": self.fmt, "tables": group, "header": self.header,
+                          "status_i": self.status_i, "issue_headers": self._issue_headers,
+                          "spools": [self._spools[t] for t in group]})
+        if not tasks:
+            return []
+        os.makedirs(self.out_dir, exist_ok=True)
+
+        workers = min(self.workers, len(tasks))
+        logging.info("Partitioned output: %d tables into %d %s files on %d workers",
+                     len(tables), len(tasks), self.fmt, workers)
+        if workers <= 1:
+            return [write_partition(t) for t in tasks]
+
+        from concurrent.futures import ProcessPoolExecutor
+
+        # biggest groups first so a large table does not start last; index keeps name order
+        order = sorted(range(len(tasks)), key=lambda i: -sum(tables[t] for t in tasks[i]["tables"]))
+        out: List[Optional[Dict]] = [None] * len(tasks)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for i, res in zip(order, pool.map(write_partition, [tasks[i] for i in order])):
+                out[i] = res
+        return out
+
+class PartitionTee:
+    """Worksheet proxy: the first append is the header (locates the table column), the rest are issues."""
+
+    def __init__(self, ws, parts: PartitionOutput, title: str):
+        self.ws = ws
+        self.parts = parts
+        self.title = title
+        self._col: Optional[int] = None
+        self._header = True
+
+    def append(self, row: List) -> None:
+        self.ws.append(row)
+        if self._header:
+            self._header = False
+            names = [str(v or "").strip().upper() for v in row]
+            self._col = next((names.index(c) for c in TABLE_COLS if c in names), None)
+            if self._col is not None:
+                self.parts._issue_headers[self.title] = list(row)
+            return
+        if self._col is not None and self._col < len(row):
+            self.parts._add(str(row[self._col] or ""), (self.title, list(row)))
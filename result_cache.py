@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+# ----------------------------------------------------
+# Whole-job result cache for the portals: a job whose uploads (by BlobStore
+# digest), validator options and validator code all match an earlier run gets
+# that run's output files hard-linked into its directory instead of re-running
+# ----------------------------------------------------
+import hashlib, json, logging, os, shutil, threading, time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+ROOT = Path(__file__).resolve().parent
+META_FILE = "meta.json"
+# the validator and the modules it imports; any change invalidates every entry
+ENGINE_FILES = ("validate_dmw_final.py", "parse_ddl_v2.py", "xlsx_patch.py", "partition_output.py",
+                "results_store.py", "results_diff.py", "cfg.py")
+
+def engine_version(root: Path = ROOT) -> str:
+    h = hashlib.sha256()
+    for name in ENGINE_FILES:
+        p = root / name
+        if p.exists():
+            h.update(name.encode() + b"\0" + p.read_bytes())
+    return h.hexdigest()[:16]
+
+def _link_or_copy(src: Path, dest: Path) -> None:
+    if dest.exists():
+        dest.unlink()
+    try:
+        os.link(src, dest)
+    except OSError:
+        shutil.copyfile(src, dest)
+
+class ResultCache:
+    """
+    <root>/<key>/ holds the output files of one run plus meta.json (stdout,
+    created, size). Entries older than `ttl` seconds are dropped on lookup;
+    when the cache grows past `max_bytes`, least recently used entries (meta
+    mtime, touched on every hit) are evicted.
+    """
+
+    def __init__(self, root: Path, ttl: float = 7 * 86400, max_bytes: int = 2 << 30,
+                 version: Optional[str] = None):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.version = version or engine_version()
+        self._lock = threading.Lock()
+        self.stats: Dict[str, int] = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+    def key(self, inputs: Dict[str, str], argv: List[str], job_dir: Path) -> Optional[str]:
+        """
+        None when the job cannot be cached: no known inputs, or an argument
+        naming a file outside the job directory (its content is not hashed).
+        Paths inside the job directory are keyed by their relative name.
+        """
+        if not inputs:
+            return None
+        job_dir = Path(job_dir).resolve()
+        options = []
+        for tok in argv:
+            p = Path(tok)
+            if p.is_absolute():
+                try:
+                    tok = "<job>/" + p.resolve().relative_to(job_dir).as_posix()
+                except ValueError:
+                    if p.exists():
+                        return None
+            options.append(tok)
+        blob = json.dumps({"version": self.version, "inputs": inputs, "options": options}, sort_keys=True)
+        return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+    def get(self, key: str, job_dir: Path) -> Optional[Dict]:
+        """Links the cached files into job_dir and returns the entry's meta, or None."""
+        entry = self.root / key
+        meta_path = entry / META_FILE
+        with self._lock:
+            try:
+                meta = json.loads(meta_path.read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                self.stats["misses"] += 1
+                return None
+            if time.time() - meta["created"] > self.ttl:
+                shutil.rmtree(entry, ignore_errors=True)
+                self.stats["misses"] += 1
+                return None
+            for name in meta["files"]:
+                _link_or_copy(entry / name, Path(job_dir) / name)
+            os.utime(meta_path)   # LRU clock
+            self.stats["hits"] += 1
+        return meta
+
+    def put(self, key: str, job_dir: Path, files: List[str], stdout: str = "") -> None:
+        entry = self.root / key
+        tmp = self.root / f".{key}.{os.getpid()}.{threading.get_ident()}"
+        shutil.rmtree(tmp, ignore_errors=True)
+        tmp.mkdir()
+        size = 0
+        for name in files:
+            _link_or_copy(Path(job_dir) / name, tmp / name)
+            size += (tmp / name).stat().st_size
+        meta = {"created": time.time(), "files": files, "size": size, "stdout": stdout, "version": self.version}
+        (tmp / META_FILE).write_text(json.dumps(meta, indent=2), encoding="utf-8")
+        with self._lock:
+            shutil.rmtree(entry, ignore_errors=True)
+            os.replace(tmp, entry)
+            self.stats["stores"] += 1
+            self._evict()
+
+    def _evict(self) -> None:
+        entries = []
+        for d in self.root.iterdir():
+            meta_path = d / META_FILE
+            if d.name.startswith(".") or not meta_path.exists():
+                continue
+            try:
+                meta = json.loads(meta_path.read_text(encoding="utf-8"))
+            except ValueError:
+                continue
+            entries.append((meta_path.stat().st_mtime, meta.get("size", 0), d))
+        total = sum(size for _, size, _ in entries)
+        for _, size, d in sorted(entries, key=lambda e: e[0]):
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(d, ignore_errors=True)
+            total -= size
+            self.stats["evictions"] += 1
+            logging.info(f"Result cache: evicted {d.name[:12]} ({size} bytes)")
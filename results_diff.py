@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+# ----------------------------------------------------
+# Run-to-run result delta: hash join on (dest table, dest column, occurrence),
+# emitting only status / rule transitions
+# ----------------------------------------------------
+import argparse, csv, json, os, sqlite3, sys
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+RULES = ["Rule1", "Rule2", "Rule3", "Rule4", "Rule5", "Rule6", "Rule7"]
+FIELDS = ["Validation_Status"] + RULES
+DELTA_SHEET = "Results_Delta"
+DELTA_HEADER = ["Dest_Table", "Dest_Column", "Occurrence", "Old_Row", "New_Row", "Change", "Field", "Old", "New"]
+
+# (row number or None, DEST_TABLE, DEST_COLUMN, {field: value})
+Result = Tuple[Optional[int], str, str, Dict[str, str]]
+
+def _str(v) -> str:
+    return "" if v is None else str(v).strip()
+
+def _result(row_num, table, column, values: Dict[str, str]) -> Result:
+    rn = int(row_num) if row_num not in (None, "") else None
+    return rn, _str(table).upper(), _str(column).upper(), {f: _str(values.get(f)) for f in FIELDS}
+
+# ----------------------------------------------------
+# Readers (all streaming, in sheet / file order)
+# ----------------------------------------------------
+def iter_jsonl(path: str) -> Iterator[Result]:
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                d = json.loads(line)
+                yield _result(d.get("Row"), d.get("Dest_Table"), d.get("Dest_Column"), d)
+
+def iter_csv(path: str) -> Iterator[Result]:
+    with open(path, encoding="utf-8", newline="") as f:
+        for d in csv.DictReader(f):
+            yield _result(d.get("Row"), d.get("Dest_Table"), d.get("Dest_Column"), d)
+
+def iter_xlsx(path: str) -> Iterator[Result]:
+    """Any validator output (full, results-only or annotated DMW): located by its header names."""
+    from openpyxl import load_workbook
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        ws = wb["Baseline Data Model_output"] if "Baseline Data Model_output" in wb.sheetnames else wb.active
+        rows = ws.iter_rows(values_only=True)
+        header = None
+        for n, r in enumerate(rows):
+            if "Validation_Status" in r:
+                header = [_str(v) for v in r]
+                break
+            if n >= 30:
+                break
+        if header is None:
+            raise ValueError(f"{path}: no Validation_Status column")
+        upper = [h.upper() for h in header]
+
+        def first(*names: str, after: int = -1) -> Optional[int]:
+            for i, h in enumerate(upper):
+                if i > after and h in names:
+                    return i
+            return None
+
+        t_i = first("DESTINATION TABLE", "DEST_TABLE", "DESTINATION TABLE NAME")
+        c_i = first("DESTINATION COLUMN NAME", "DEST_COLUMN", "DESTINATION COLUMN", after=t_i if t_i is not None else -1)
+        row_i = first("ROW")
+        f_i = {f: len(header) - 1 - header[::-1].index(f) for f in FIELDS if f in header}
+        for r in rows:
+            if not r or all(v is None for v in r):
+                continue
+            get = lambda i: r[i] if i is not None and i < len(r) else None
+            yield _result(get(row_i), get(t_i), get(c_i), {f: get(i) for f, i in f_i.items()})
+    finally:
+        wb.close()
+
+def iter_run(db: str, run_id: int) -> Iterator[Result]:
+    conn = sqlite3.connect(db, timeout=30)
+    try:
+        cur = conn.execute(
+            "SELECT row_num, dest_table, dest_column, status, rule1, rule2, rule3, rule4, rule5, rule6, rule7 "
+            "FROM row_results WHERE run_id = ? ORDER BY rowid", (run_id,))
+        for r in cur:
+            yield _result(r[0], r[1], r[2], dict(zip(FIELDS, r[3:])))
+    finally:
+        conn.close()
+
+def open_results(source: str, db: Optional[str] = None) -> Iterator[Result]:
+    """source: rows sidecar (.jsonl / .csv), output workbook (.xlsx / .xlsm) or run:N (with db)."""
+    if source.startswith("run:"):
+        if not db:
+            raise ValueError("run:N needs a results database (--db)")
+        return iter_run(db, int(source[4:]))
+    ext = os.path.splitext(source)[1].lower()
+    if ext == ".jsonl":
+        return iter_jsonl(source)
+    if ext == ".csv":
+        return iter_csv(source)
+    if ext in (".xlsx", ".xlsm"):
+        return iter_xlsx(source)
+    raise ValueError(f"Unsupported results source: {source}")
+
+# ----------------------------------------------------
+# Hash join
+# ----------------------------------------------------
+def _change(field: str, old: str, new: str) -> str:
+    if new == "FAIL":
+        return "NEW_FAIL"
+    if old == "FAIL":
+        return "FIXED"
+    return "CHANGED"
+
+class ResultsDiff:
+    """
+    Old results are indexed once by (table, column, occurrence); new results are
+    then fed one at a time (feed) and matched by dict lookup, so the new side
+    can stream straight out of a running validation. finish() reports the old
+    rows nobody claimed. `counts` tallies emitted rows by Change.
+    """
+
+    def __init__(self, old: Iterable[Result]):
+        self._old: Dict[Tuple[str, str, int], Result] = {}
+        seen: Dict[Tuple[str, str], int] = {}
+        for res in old:
+            k = (res[1], res[2])
+            seen[k] = seen.get(k, 0) + 1
+            self._old[(res[1], res[2], seen[k])] = res
+        self._seen: Dict[Tuple[str, str], int] = {}
+        self.counts: Dict[str, int] = {}
+
+    def _emit(self, out: List[List], key, old_row, new_row, change, field, old, new) -> None:
+        out.append([key[0], key[1], key[2], old_row, new_row, change, field, old, new])
+        self.counts[change] = self.counts.get(change, 0) + 1
+
+    def feed(self, row_num: Optional[int], table: str, column: str, values: Dict[str, str]) -> List[List]:
+        _, t, c, vals = _result(row_num, table, column, values)
+        k = (t, c)
+        self._seen[k] = self._seen.get(k, 0) + 1
+        key = (t, c, self._seen[k])
+        out: List[List] = []
+        old = self._old.pop(key, None)
+        if old is None:
+            self._emit(out, key, None, row_num, "ADDED", "Validation_Status", "", vals["Validation_Status"])
+            return out
+        for f in FIELDS:
+            if old[3][f] != vals[f]:
+                self._emit(out, key, old[0], row_num, _change(f, old[3][f], vals[f]), f, old[3][f], vals[f])
+        return out
+
+    def finish(self) -> List[List]:
+        out: List[List] = []
+        for key, old in self._old.items():
+            self._emit(out, key, old[0], None, "REMOVED", "Validation_Status", old[3]["Validation_Status"], "")
+        self._old = {}
+        return out
+
+def diff_results(old: Iterable[Result], new: Iterable[Result]) -> Iterator[List]:
+    d = ResultsDiff(old)
+    for row_num, t, c, vals in new:
+        yield from d.feed(row_num, t, c, vals)
+    yield from d.finish()
+
+# ----------------------------------------------------
+# CLI: validate_dmw_final.py diff-results OLD NEW
+# ----------------------------------------------------
+def _writer(path: Optional[str]):
+    if not path:
+        w = csv.writer(sys.stdout, delimiter="\t", lineterminator="\n")
+        return w.writerow, lambda: None
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".xlsx":
+        from openpyxl import Workbook
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet(DELTA_SHEET)
+        return ws.append, lambda: wb.save(path)
+    f = open(path, "w", encoding="utf-8", newline="")
+    if ext == ".jsonl":
+        header: List[str] = []
+
+        def write(row):
+            if not header:
+                header.extend(row)
+                return
+            f.write(json.dumps(dict(zip(header, row)), ensure_ascii=False) + "\n")
+        return write, f.close
+    return csv.writer(f).writerow, f.close
+
+def main(argv: Optional[List[str]] = None):
+    ap = argparse.ArgumentParser(prog="validate_dmw_final.py diff-results",
+                                 description="Status / rule transitions between two validation runs")
+    ap.add_argument("old", help="Previous results: rows sidecar (.jsonl/.csv), output .xlsx, or run:N")
+    ap.add_argument("new", help="Current results (same forms)")
+    ap.add_argument("--db", default=None, help="Results database for run:N sources")
+    ap.add_argument("--out", default=None, help="Write the delta to .csv / .jsonl / .xlsx (default: TSV on stdout)")
+    args = ap.parse_args(argv)
+
+    d = ResultsDiff(open_results(args.old, args.db))
+    write, close = _writer(args.out)
+    write(DELTA_HEADER)
+    for row_num, t, c, vals in open_results(args.new, args.db):
+        for row in d.feed(row_num, t, c, vals):
+            write(row)
+    for row in d.finish():
+        write(row)
+    close()
+    print(json.dumps(d.counts, sort_keys=True), file=sys.stderr)
+
+if __name__ == "__main__":
+    sys.exit(main())
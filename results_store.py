@@ -0,0 +1,398 @@
+#!/usr/bin/env python3
+# ----------------------------------------------------
+# SQLite (WAL) results warehouse: run history + indexed cross-run queries
+# ----------------------------------------------------
+import argparse, hashlib, json, os, pickle, sqlite3, sys, tempfile
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+SCHEMA_VERSION = 2
+RULES = ["Rule1", "Rule2", "Rule3", "Rule4", "Rule5", "Rule6", "Rule7"]
+INSERT_BATCH = 5000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id       INTEGER PRIMARY KEY,
+    started_at   TEXT NOT NULL,
+    dmw_name     TEXT NOT NULL,
+    ddl_name     TEXT,
+    output       TEXT,
+    output_mode  TEXT,
+    rows         INTEGER,
+    fail_rows    INTEGER,
+    seconds      REAL,
+    summary      TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_runs_dmw ON runs (dmw_name, run_id);
+
+CREATE TABLE IF NOT EXISTS inputs (
+    sha256      TEXT PRIMARY KEY,
+    bytes       INTEGER NOT NULL,
+    first_seen  TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS run_inputs (
+    run_id  INTEGER NOT NULL REFERENCES runs (run_id) ON DELETE CASCADE,
+    role    TEXT NOT NULL,
+    name    TEXT NOT NULL,
+    sha256  TEXT NOT NULL REFERENCES inputs (sha256),
+    PRIMARY KEY (run_id, role, name)
+);
+CREATE INDEX IF NOT EXISTS idx_run_inputs_sha ON run_inputs (sha256);
+
+CREATE TABLE IF NOT EXISTS row_results (
+    run_id       INTEGER NOT NULL REFERENCES runs (run_id) ON DELETE CASCADE,
+    row_num      INTEGER,
+    dest_table   TEXT NOT NULL,
+    dest_column  TEXT NOT NULL,
+    rule1 TEXT, rule2 TEXT, rule3 TEXT, rule4 TEXT, rule5 TEXT, rule6 TEXT, rule7 TEXT,
+    status       TEXT,
+    remarks      TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_row_results_key ON row_results (dest_table, dest_column, run_id);
+CREATE INDEX IF NOT EXISTS idx_row_results_run ON row_results (run_id, status);
+-- v2: filtered / paginated browsing of one run (query_rows)
+CREATE INDEX IF NOT EXISTS idx_row_results_run_rowid ON row_results (run_id);
+CREATE INDEX IF NOT EXISTS idx_row_results_run_table ON row_results (run_id, dest_table);
+CREATE INDEX IF NOT EXISTS idx_row_results_rule1 ON row_results (run_id, rule1);
+CREATE INDEX IF NOT EXISTS idx_row_results_rule2 ON row_results (run_id, rule2);
+CREATE INDEX IF NOT EXISTS idx_row_results_rule3 ON row_results (run_id, rule3);
+CREATE INDEX IF NOT EXISTS idx_row_results_rule4 ON row_results (run_id, rule4);
+CREATE INDEX IF NOT EXISTS idx_row_results_rule5 ON row_results (run_id, rule5);
+CREATE INDEX IF NOT EXISTS idx_row_results_rule6 ON row_results (run_id, rule6);
+CREATE INDEX IF NOT EXISTS idx_row_results_rule7 ON row_results (run_id, rule7);
+
+-- one row per rule outcome that is not PASS / N/A (FAIL, INFO, ...)
+CREATE TABLE IF NOT EXISTS rule_results (
+    run_id       INTEGER NOT NULL REFERENCES runs (run_id) ON DELETE CASCADE,
+    dest_table   TEXT NOT NULL,
+    dest_column  TEXT NOT NULL,
+    rule         TEXT NOT NULL,
+    result       TEXT NOT NULL,
+    row_num      INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_rule_results_key ON rule_results (dest_table, dest_column, rule, run_id);
+CREATE INDEX IF NOT EXISTS idx_rule_results_rule ON rule_results (rule, result, run_id);
+
+CREATE TABLE IF NOT EXISTS rule_issues (
+    run_id       INTEGER NOT NULL REFERENCES runs (run_id) ON DELETE CASCADE,
+    rule         TEXT NOT NULL,
+    sheet        TEXT NOT NULL,
+    dest_table   TEXT,
+    dest_column  TEXT,
+    issue        TEXT,
+    details      TEXT,
+    row_json     TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_rule_issues_key ON rule_issues (dest_table, dest_column, rule, run_id);
+CREATE INDEX IF NOT EXISTS idx_rule_issues_run ON rule_issues (run_id, rule, issue);
+"""
+
+def connect(path: str) -> sqlite3.Connection:
+    """Open (and create / migrate) the warehouse; WAL so readers never block the writer."""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA foreign_keys=ON")
+    if conn.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+        conn.executescript(SCHEMA)
+        conn.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+    return conn
+
+def file_sha256(path: str, chunk: int = 1 << 20) -> Tuple[str, int]:
+    h = hashlib.sha256()
+    n = 0
+    with open(path, "rb") as f:
+        for b in iter(lambda: f.read(chunk), b""):
+            h.update(b)
+            n += len(b)
+    return h.hexdigest(), n
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+def _str(v) -> str:
+    return "" if v is None else str(v).strip()
+
+def issue_fields(header: List[str], row: List) -> Tuple[str, str, str, str]:
+    """(dest table, dest column, issue, details) from any rule sheet row, keyed by its header."""
+    d = {h: _str(v) for h, v in zip(header, row)}
+    table = d.get("Table") or d.get("Dest_Table") or d.get("Master_Table") or d.get("Reference_Table") or ""
+    column = d.get("Column") or d.get("Dest_Column") or ""
+    if not table and "Name" in d:   # Rule7: "T" / "T.C" / "T.old -> T.new" (keep the current side)
+        name = d["Name"].split(" -> ")[-1]
+        if d.get("Object") == "COLUMN" and "." in name:
+            table, column = name.split(".", 1)
+        else:
+            table = name
+    return table.upper(), column.upper(), d.get("Issue", ""), d.get("Details", "")
+
+# ----------------------------------------------------
+# Writing one run
+# ----------------------------------------------------
+class _Spool:
+    """Pickled chunks in an anonymous temp file, so a run's rows are not held in memory."""
+
+    def __init__(self, chunk: int = INSERT_BATCH):
+        self._f = tempfile.TemporaryFile(prefix="dmw-store-")
+        self._buf: List[Tuple] = []
+        self.chunk = chunk
+
+    def append(self, rec: Tuple) -> None:
+        self._buf.append(rec)
+        if len(self._buf) >= self.chunk:
+            pickle.dump(self._buf, self._f, protocol=pickle.HIGHEST_PROTOCOL)
+            self._buf = []
+
+    def __iter__(self) -> Iterator[Tuple]:
+        if self._buf:
+            pickle.dump(self._buf, self._f, protocol=pickle.HIGHEST_PROTOCOL)
+            self._buf = []
+        self._f.seek(0)
+        while True:
+            try:
+                chunk = pickle.load(self._f)
+            except EOFError:
+                return
+            yield from chunk
+
+    def close(self) -> None:
+        self._f.close()
+
+class RunRecorder:
+    """
+    Collects one validation run while it streams (row() from the propagation
+    pass, tee() around rule sheets) and writes it in a single transaction with
+    executemany in commit(). Rows are spooled to disk until then, so the
+    database write lock is only held for the bulk insert.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._rows = _Spool()
+        self._issues = _Spool()
+
+    def row(self, rownum: Optional[int], table: str, column: str, rule_vals: List[str]) -> None:
+        self._rows.append((rownum, _str(table).upper(), _str(column).upper(), tuple(rule_vals[:9])))
+
+    def tee(self, ws, sheet: str) -> "_IssueTee":
+        return _IssueTee(ws, self, sheet)
+
+    def commit(self, run: Dict, inputs: Dict[str, Optional[str]]) -> int:
+        """
+        run:    {dmw_name, ddl_name, output, output_mode, rows, fail_rows, seconds, summary}
+        inputs: {role: path or None}; files are hashed and stored once per content.
+        Returns the new run_id.
+        """
+        hashed = []
+        for role, path in inputs.items():
+            for p in ([path] if isinstance(path, str) else (path or [])):
+                sha, n = file_sha256(p)
+                hashed.append((role, os.path.basename(p), sha, n))
+
+        conn = connect(self.db_path)
+        try:
+            with conn:
+                cur = conn.execute(
+                    "INSERT INTO runs (started_at, dmw_name, ddl_name, output, output_mode, rows, fail_rows, seconds, summary) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (_now(), run.get("dmw_name", ""), run.get("ddl_name"), run.get("output"), run.get("output_mode"),
+                     run.get("rows"), run.get("fail_rows"), run.get("seconds"),
+                     json.dumps(run.get("summary"), ensure_ascii=False) if run.get("summary") is not None else None))
+                run_id = cur.lastrowid
+                now = _now()
+                conn.executemany("INSERT OR IGNORE INTO inputs (sha256, bytes, first_seen) VALUES (?, ?, ?)",
+                                 [(sha, n, now) for _, _, sha, n in hashed])
+                conn.executemany("INSERT OR IGNORE INTO run_inputs (run_id, role, name, sha256) VALUES (?, ?, ?, ?)",
+                                 [(run_id, role, name, sha) for role, name, sha, _ in hashed])
+                conn.executemany(
+                    "INSERT INTO row_results (run_id, row_num, dest_table, dest_column, "
+                    "rule1, rule2, rule3, rule4, rule5, rule6, rule7, status, remarks) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    ((run_id, rownum, t, c) + vals for rownum, t, c, vals in self._rows))
+                conn.executemany(
+                    "INSERT INTO rule_results (run_id, dest_table, dest_column, rule, result, row_num) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    ((run_id, t, c, rule, v, rownum)
+                     for rownum, t, c, vals in self._rows
+                     for rule, v in zip(RULES, vals)
+                     if v not in ("PASS", "N/A", "")))
+                conn.executemany(
+                    "INSERT INTO rule_issues (run_id, rule, sheet, dest_table, dest_column, issue, details, row_json) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    ((run_id,) + rec for rec in self._issues))
+            # sampled statistics, so the planner picks the most selective index in query_rows
+            conn.execute("PRAGMA analysis_limit=1000")
+            conn.execute("ANALYZE row_results")
+            return run_id
+        finally:
+            conn.close()
+            self.close()
+
+    def close(self) -> None:
+        self._rows.close()
+        self._issues.close()
+
+class _IssueTee:
+    def __init__(self, ws, recorder: RunRecorder, sheet: str):
+        self.ws = ws
+        self.recorder = recorder
+        self.sheet = sheet
+        self.rule = sheet.split("_", 1)[0]
+        self.header: Optional[List[str]] = None
+
+    def append(self, row: List) -> None:
+        self.ws.append(row)
+        if self.header is None:
+            self.header = [_str(v) for v in row]
+            return
+        t, c, issue, details = issue_fields(self.header, row)
+        self.recorder._issues.append((self.rule, self.sheet, t, c, issue, details,
+                                      json.dumps(dict(zip(self.header, [_str(v) for v in row])), ensure_ascii=False)))
+
+# ----------------------------------------------------
+# Cross-run queries
+# ----------------------------------------------------
+def list_runs(conn: sqlite3.Connection, dmw: Optional[str] = None, limit: int = 20) -> List[Tuple]:
+    return conn.execute(
+        "SELECT run_id, started_at, dmw_name, ddl_name, rows, fail_rows, seconds FROM runs "
+        "WHERE (:dmw IS NULL OR dmw_name = :dmw) ORDER BY run_id DESC LIMIT :limit",
+        {"dmw": dmw, "limit": limit}).fetchall()
+
+def latest_run(conn: sqlite3.Connection, dmw: str) -> Optional[int]:
+    """Most recent run_id recorded for this DMW file name, or None."""
+    r = conn.execute("SELECT MAX(run_id) FROM runs WHERE dmw_name = ?", (dmw,)).fetchone()
+    return r[0] if r else None
+
+def failing_streak(conn: sqlite3.Connection, rule: str, runs: int = 3, dmw: Optional[str] = None,
+                   result: str = "FAIL") -> List[Tuple[str, str]]:
+    """(table, column) pairs whose `rule` was `result` in each of the last `runs` runs (of `dmw`)."""
+    return conn.execute(
+        "WITH last AS (SELECT run_id FROM runs WHERE (:dmw IS NULL OR dmw_name = :dmw) "
+        "              ORDER BY run_id DESC LIMIT :n) "
+        "SELECT dest_table, dest_column FROM rule_results "
+        "WHERE rule = :rule AND result = :result AND run_id IN (SELECT run_id FROM last) "
+        "GROUP BY dest_table, dest_column "
+        "HAVING COUNT(DISTINCT run_id) = (SELECT COUNT(*) FROM last) AND COUNT(DISTINCT run_id) = :n "
+        "ORDER BY dest_table, dest_column",
+        {"dmw": dmw, "n": runs, "rule": rule, "result": result}).fetchall()
+
+def column_history(conn: sqlite3.Connection, table: str, column: str, limit: int = 20) -> List[Tuple]:
+    return conn.execute(
+        "SELECT r.run_id, r.started_at, r.dmw_name, x.row_num, x.rule1, x.rule2, x.rule3, x.rule4, "
+        "       x.rule5, x.rule6, x.rule7, x.status "
+        "FROM row_results x JOIN runs r ON r.run_id = x.run_id "
+        "WHERE x.dest_table = ? AND x.dest_column = ? ORDER BY x.run_id DESC, x.row_num LIMIT ?",
+        (table.upper(), column.upper(), limit)).fetchall()
+
+ROW_COLUMNS = ["row_num", "dest_table", "dest_column"] + [r.lower() for r in RULES] + ["status", "remarks"]
+PAGE_SIZE = 100
+
+def query_rows(conn: sqlite3.Connection, run_id: int, rule: Optional[str] = None, status: Optional[str] = None,
+               table: Optional[str] = None, page: int = 1, page_size: int = PAGE_SIZE) -> Dict:
+    """
+    One page of a run's row results, in sheet order. rule ("Rule4") filters
+    on that rule's result = status (FAIL when not given); without a rule,
+    status filters Validation_Status. table is an exact destination table.
+    Every filter is served by an index; unfiltered pages are rowid ranges
+    (commit() inserts a run's rows contiguously), so page depth costs nothing.
+    """
+    if rule and rule not in RULES:
+        raise ValueError(f"Unknown rule: {rule}")
+    where, params = ["run_id = ?"], [run_id]
+    if rule:
+        where.append(f"{rule.lower()} = ?")
+        params.append((status or "FAIL").upper())
+    elif status:
+        where.append("status = ?")
+        params.append(status.upper())
+    if table:
+        where.append("dest_table = ?")
+        params.append(table.upper())
+    offset = (max(page, 1) - 1) * page_size
+    cols = ", ".join(ROW_COLUMNS)
+
+    if len(where) == 1:
+        lo, hi = conn.execute(
+            "SELECT (SELECT rowid FROM row_results WHERE run_id = ?1 ORDER BY rowid LIMIT 1), "
+            "       (SELECT rowid FROM row_results WHERE run_id = ?1 ORDER BY rowid DESC LIMIT 1)",
+            (run_id,)).fetchone()
+        total = hi - lo + 1 if lo is not None else 0
+        rows = conn.execute(f"SELECT {cols} FROM row_results WHERE rowid >= ? AND rowid <= ? ORDER BY rowid LIMIT ?",
+                            ((lo or 0) + offset, hi if hi is not None else -1, page_size)).fetchall()
+    else:
+        cond = " AND ".join(where)
+        total = conn.execute(f"SELECT COUNT(*) FROM row_results WHERE {cond}", params).fetchone()[0]
+        rows = conn.execute(f"SELECT {cols} FROM row_results WHERE {cond} ORDER BY rowid LIMIT ? OFFSET ?",
+                            params + [page_size, offset]).fetchall()
+    return {"run_id": run_id, "page": max(page, 1), "page_size": page_size, "total": total,
+            "pages": -(-total // page_size), "columns": ROW_COLUMNS, "rows": [list(r) for r in rows]}
+
+def run_issues(conn: sqlite3.Connection, run_id: int, rule: Optional[str] = None) -> List[Tuple]:
+    return conn.execute(
+        "SELECT rule, dest_table, dest_column, issue, details FROM rule_issues "
+        "WHERE run_id = :run AND (:rule IS NULL OR rule = :rule) ORDER BY rowid",
+        {"run": run_id, "rule": rule}).fetchall()
+
+# ----------------------------------------------------
+# CLI
+# ----------------------------------------------------
+def _print(header: List[str], rows: Iterable[Tuple]) -> None:
+    print("\t".join(header))
+    for r in rows:
+        print("\t".join("" if v is None else str(v) for v in r))
+
+def main(argv: Optional[List[str]] = None):
+    ap = argparse.ArgumentParser(prog="results_store.py", description="Query the DMW validation results warehouse")
+    ap.add_argument("--db", required=True, help="SQLite results database (validate_dmw_final.py --results-db)")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    p = sub.add_parser("runs", help="Recent runs")
+    p.add_argument("--dmw", default=None, help="Only runs of this DMW file name")
+    p.add_argument("--limit", type=int, default=20)
+
+    p = sub.add_parser("streak", help="Columns with the same rule result in each of the last N runs")
+    p.add_argument("--rule", required=True, choices=RULES)
+    p.add_argument("--runs", type=int, default=3)
+    p.add_argument("--dmw", default=None)
+    p.add_argument("--result", default="FAIL")
+
+    p = sub.add_parser("history", help="One destination column across runs")
+    p.add_argument("--table", required=True)
+    p.add_argument("--column", required=True)
+    p.add_argument("--limit", type=int, default=20)
+
+    p = sub.add_parser("rows", help="One page of a run's row results, filtered")
+    p.add_argument("--run", type=int, required=True)
+    p.add_argument("--rule", default=None, choices=RULES)
+    p.add_argument("--status", default=None, help="Result of --rule (default FAIL), else Validation_Status")
+    p.add_argument("--table", default=None)
+    p.add_argument("--page", type=int, default=1)
+    p.add_argument("--page-size", type=int, default=PAGE_SIZE)
+
+    p = sub.add_parser("issues", help="Rule sheet issues of one run")
+    p.add_argument("--run", type=int, required=True)
+    p.add_argument("--rule", default=None, choices=RULES)
+
+    args = ap.parse_args(argv)
+    conn = connect(args.db)
+    try:
+        if args.cmd == "runs":
+            _print(["run_id", "started_at", "dmw", "ddl", "rows", "fail_rows", "seconds"],
+                   list_runs(conn, args.dmw, args.limit))
+        elif args.cmd == "streak":
+            _print(["dest_table", "dest_column"], failing_streak(conn, args.rule, args.runs, args.dmw, args.result))
+        elif args.cmd == "history":
+            _print(["run_id", "started_at", "dmw", "row"] + RULES + ["status"],
+                   column_history(conn, args.table, args.column, args.limit))
+        elif args.cmd == "rows":
+            res = query_rows(conn, args.run, args.rule, args.status, args.table, args.page, args.page_size)
+            print(f"# page {res['page']}/{res['pages']} of {res['total']} rows", file=sys.stderr)
+            _print(res["columns"], res["rows"])
+        elif args.cmd == "issues":
+            _print(["rule", "dest_table", "dest_column", "issue", "details"], run_issues(conn, args.run, args.rule))
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    sys.exit(main())
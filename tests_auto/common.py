@@ -87,7 +87,8 @@ def run_validator(*, dmw: Path, ddl: Path, out: Path,
                   prev_dmw: Optional[Path] = None,
                   prev_ddl: Optional[Path] = None,
                   ref_dmw: Optional[Path] = None,
-                  master_dmw: Optional[Path] = None) -> None:
+                  master_dmw: Optional[Path] = None,
+                  extra_args: Optional[List[str]] = None) -> None:
     cmd = ["python3", str(VALIDATOR), "--dmw-xlsx", str(dmw), "--ddl-sql", str(ddl), "--out", str(out)]
     if prev_dmw:
         cmd += ["--prev-dmw", str(prev_dmw)]
@@ -97,6 +98,8 @@ def run_validator(*, dmw: Path, ddl: Path, out: Path,
         cmd += ["--ref-dmw", str(ref_dmw)]
     if master_dmw:
         cmd += ["--master-dmw", str(master_dmw)]
+    if extra_args:
+        cmd += list(extra_args)
 
     subprocess.check_call(cmd)
 
@@ -17,6 +17,12 @@ TEST_MODULES = [
     "tests_auto.test_rule6",
     "tests_auto.test_rule7",
     "tests_auto.test_strikethrough",  # best-effort only
+    "tests_auto.test_workers",
+    "tests_auto.test_outputs",
+    "tests_auto.test_results_store",
+    "tests_auto.test_results_diff",
+    "tests_auto.test_viewer",
+    "tests_auto.test_validator_pool",
 ]
 
 def main():
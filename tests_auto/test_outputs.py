@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+import csv
+import json
+import subprocess
+
+import zipfile
+
+from openpyxl import Workbook, load_workbook
+from openpyxl.comments import Comment
+from openpyxl.styles import PatternFill
+
+from tests_auto.common import (Workdir, VALIDATOR, DMW_HEADERS, make_dmw_xlsx, make_ddl_sql, run_validator,
+                               read_sheet_rows, find_col_index)
+
+SHEETS = [
+    "Baseline Data Model_output", "Rule4_DDL_Mismatch", "Rule3_Table_Mismatch",
+    "Rule5_Ref_Master_Mismatch", "Rule6_DMW_Drift", "Rule7_DDL_Drift",
+]
+
+def _fixture(wd):
+    dmw = wd.p("dmw.xlsx")
+    ddl = wd.p("ddl.sql")
+    rows = [
+        {"Destination Table": "T1", "Destination Column Name": "ID", "Destination Data Type": "INT",
+         "Destination Nullable": "NOT NULL", "Migrating Column": "Yes", "Transformation Logic": "copy"},
+        {"Destination Table": "T1", "Destination Column Name": "NAME", "Destination Data Type": "INT",
+         "Destination Nullable": "NULL", "Migrating Column": "Yes", "Transformation Logic": "copy"},
+        {"Destination Table": "T2", "Destination Column Name": "X", "Migrating Column": "Yes"},
+    ]
+    make_dmw_xlsx(dmw, rows)
+    make_ddl_sql(ddl, {"T1": {"ID": "INT NOT NULL", "NAME": "VARCHAR(10) NULL"}, "T2": {"X": "INT NULL"}})
+    return dmw, ddl
+
+def test_results_sidecars_match_workbook():
+    wd = Workdir("outputs_")
+    try:
+        dmw, ddl = _fixture(wd)
+        out = wd.p("out.xlsx")
+        side = wd.p("sidecars")
+        run_validator(dmw=dmw, ddl=ddl, out=out,
+                      extra_args=["--results-format", "jsonl", "csv", "--results-dir", str(side)])
+
+        base = read_sheet_rows(out, "Baseline Data Model_output")
+        st = find_col_index(base[0], "Validation_Status")
+        with open(side / "out.rows.jsonl", encoding="utf-8") as f:
+            recs = [json.loads(line) for line in f]
+        assert [r["Validation_Status"] for r in recs] == [r[st] for r in base[1:]]
+        assert [r["Dest_Column"] for r in recs] == ["ID", "NAME", "X"]
+        assert recs[0]["Row"] == 2  # header on row 1 of the generated DMW
+
+        with open(side / "out.Rule4_DDL_Mismatch.csv", encoding="utf-8", newline="") as f:
+            r4 = [tuple(r) for r in csv.reader(f)]
+        assert r4 == [tuple(str(v or "") for v in r) for r in read_sheet_rows(out, "Rule4_DDL_Mismatch")]
+    finally:
+        wd.cleanup()
+
+def test_results_only_output_merges_back_to_full_workbook():
+    wd = Workdir("outputs_")
+    try:
+        dmw, ddl = _fixture(wd)
+        prev = wd.p("prev.xlsx")
+        make_dmw_xlsx(prev, [{"Destination Table": "T1", "Destination Column Name": "GONE"}])
+        full = wd.p("full.xlsx")
+        slim = wd.p("slim.xlsx")
+        merged = wd.p("merged.xlsx")
+        run_validator(dmw=dmw, ddl=ddl, out=full, prev_dmw=prev)
+        run_validator(dmw=dmw, ddl=ddl, out=slim, prev_dmw=prev, extra_args=["--output-mode", "results-only"])
+
+        slim_rows = read_sheet_rows(slim, "Baseline Data Model_output")
+        assert slim_rows[0][:5] == ("Row", "Source Table", "Source Column Name",
+                                    "Destination Table", "Destination Column Name")
+        assert [r[0] for r in slim_rows[1:]] == [2, 3, 4, None]  # last: synthetic REMOVED row
+
+        subprocess.check_call(["python3", str(VALIDATOR), "merge",
+                               "--dmw-xlsx", str(dmw), "--results", str(slim), "--out", str(merged)])
+        for sheet in SHEETS:
+            assert read_sheet_rows(merged, sheet) == read_sheet_rows(full, sheet), f"{sheet} differs after merge"
+    finally:
+        wd.cleanup()
+
+def test_annotate_mode_keeps_original_workbook_and_adds_rule_columns():
+    wd = Workdir("outputs_")
+    try:
+        dmw, ddl = _fixture(wd)
+        wb = load_workbook(dmw)
+        ws = wb["Baseline Data Model"]
+        ws["A2"].fill = PatternFill("solid", fgColor="FFFF00")
+        ws["B2"].comment = Comment("check me", "analyst")
+        wb.create_sheet("Notes")["A1"] = "keep me"
+        wb.save(dmw)
+
+        full = wd.p("full.xlsx")
+        ann = wd.p("ann.xlsx")
+        run_validator(dmw=dmw, ddl=ddl, out=full)
+        run_validator(dmw=dmw, ddl=ddl, out=ann, extra_args=["--output-mode", "annotate"])
+
+        wb = load_workbook(ann)
+        try:
+            assert wb.sheetnames[:2] == ["Baseline Data Model", "Notes"]
+            assert wb.sheetnames[2:] == SHEETS[1:] + ["Summary_Stats"]
+            ws = wb["Baseline Data Model"]
+            assert ws["A2"].fill.fgColor.rgb.endswith("FFFF00")
+            assert ws["B2"].comment is not None and ws["B2"].comment.text == "check me"
+            assert wb["Notes"]["A1"].value == "keep me"
+        finally:
+            wb.close()
+
+        norm = lambda rows: [tuple("" if v is None else v for v in r) for r in rows]
+        assert norm(read_sheet_rows(ann, "Baseline Data Model")) == norm(read_sheet_rows(full, "Baseline Data Model_output"))
+        for sheet in SHEETS[1:]:
+            assert norm(read_sheet_rows(ann, sheet)) == norm(read_sheet_rows(full, sheet)), sheet
+    finally:
+        wd.cleanup()
+
+def test_annotate_mode_starts_past_the_widest_row_of_a_streamed_dmw():
+    wd = Workdir("outputs_")
+    try:
+        _, ddl = _fixture(wd)
+        dmw = wd.p("streamed.xlsx")
+        wb = Workbook(write_only=True)   # no <dimension> record
+        ws = wb.create_sheet("Baseline Data Model")
+        ws.append(DMW_HEADERS)
+        ws.append(["", "", "T1", "ID", "Yes", "", "INT", "", "NOT NULL", "copy"])
+        ws.append(["", "", "T1", "NAME", "Yes", "", "INT", "", "NULL", "copy"] + [""] * 5 + ["note"])  # column P
+        wb.save(dmw)
+
+        ann = wd.p("ann.xlsx")
+        run_validator(dmw=dmw, ddl=ddl, out=ann, extra_args=["--output-mode", "annotate"])
+
+        rows = read_sheet_rows(ann, "Baseline Data Model")
+        assert rows[2][15] == "note"
+        assert find_col_index(rows[0], "Rule1") == 16   # first column after the note
+        status = find_col_index(rows[0], "Validation_Status")
+        assert [r[status] for r in rows[1:]] == ["FAIL", "FAIL"]
+    finally:
+        wd.cleanup()
+
+def test_run_summary_json_and_sheet_match_baseline_counts():
+    wd = Workdir("outputs_")
+    try:
+        dmw, ddl = _fixture(wd)
+        out = wd.p("out.xlsx")
+        run_validator(dmw=dmw, ddl=ddl, out=out)
+
+        base = read_sheet_rows(out, "Baseline Data Model_output")
+        st = find_col_index(base[0], "Validation_Status")
+        r4 = find_col_index(base[0], "Rule4")
+        with open(wd.p("out.summary.json"), encoding="utf-8") as f:
+            summary = json.load(f)
+        assert summary["rows"] == len(base) - 1
+        assert sum(summary["status"].values()) == summary["rows"]
+        assert summary["status"].get("FAIL", 0) == sum(1 for r in base[1:] if r[st] == "FAIL")
+        assert summary["rules"]["Rule4"].get("FAIL", 0) == sum(1 for r in base[1:] if r[r4] == "FAIL")
+        assert summary["issues"]["Rule4_DDL_Mismatch"] == {"TYPE_MISMATCH": 1}
+        assert set(summary["tables"]) == {"T1", "T2"}
+
+        stats = read_sheet_rows(out, "Summary_Stats")
+        assert stats[0][0] == "Rule"
+        assert ("Rule4_DDL_Mismatch", "TYPE_MISMATCH", 1) in stats
+    finally:
+        wd.cleanup()
+
+def test_progress_callback_reports_phases_and_progress_file_ends_done():
+    from validate_dmw_final import validate
+
+    wd = Workdir("outputs_")
+    try:
+        dmw, ddl = _fixture(wd)
+        events = []
+        validate(str(dmw), str(ddl), str(wd.p("out.xlsx")), {"enabled": False}, progress=events.append)
+        phases = [e["phase"] for e in events]
+        assert phases[0] == "read" and phases[-1] == "done"
+        assert {"tables", "rules", "write", "save"} <= set(phases)
+        assert events[-1]["rows"] == 3 and events[-1]["total"] == 3
+        assert any(e["rule"] == "Rule3" for e in events)
+
+        run_validator(dmw=dmw, ddl=ddl, out=wd.p("cli.xlsx"), extra_args=["--progress-file", str(wd.p("p.json"))])
+        with open(wd.p("p.json"), encoding="utf-8") as f:
+            assert json.load(f)["phase"] == "done"
+
+        try:
+            run_validator(dmw=wd.p("missing.xlsx"), ddl=ddl, out=wd.p("bad.xlsx"),
+                          extra_args=["--progress-file", str(wd.p("bad.json"))])
+            raise AssertionError("a failed validation must exit non-zero")
+        except subprocess.CalledProcessError as e:
+            assert e.returncode == 1
+        with open(wd.p("bad.json"), encoding="utf-8") as f:
+            assert json.load(f)["phase"] == "failed"
+    finally:
+        wd.cleanup()
+
+def test_partition_output_by_table_writes_one_workbook_per_table_and_index():
+    wd = Workdir("outputs_")
+    try:
+        dmw, ddl = _fixture(wd)
+        out = wd.p("out.xlsx")
+        run_validator(dmw=dmw, ddl=ddl, out=out, extra_args=["--partition-output", "by-table"])
+
+        parts = wd.p("out.by-table")
+        with open(parts / "index.json", encoding="utf-8") as f:
+            index = json.load(f)
+        assert index["tables"] == {"T1": "T1.xlsx", "T2": "T2.xlsx"}
+        assert [(e["file"], e["rows"]) for e in index["partitions"]] == [("T1.xlsx", 2), ("T2.xlsx", 1)]
+
+        base = read_sheet_rows(out, "Baseline Data Model_output")
+        dt = find_col_index(base[0], "Destination Table")
+        t1 = read_sheet_rows(parts / "T1.xlsx", "Baseline Data Model_output")
+        assert t1 == [base[0]] + [r for r in base[1:] if r[dt] == "T1"]
+        assert read_sheet_rows(parts / "T1.xlsx", "Rule4_DDL_Mismatch")[1][:3] == ("T1", "NAME", "TYPE_MISMATCH")
+        wb = load_workbook(parts / "T2.xlsx", read_only=True)
+        try:
+            assert "Rule4_DDL_Mismatch" not in wb.sheetnames  # only sheets with rows for T2
+        finally:
+            wb.close()
+    finally:
+        wd.cleanup()
+
+def test_parallel_deflate_save_matches_plain_save():
+    import xlsx_patch
+    wd = Workdir("outputs_")
+    chunk, min_bytes = xlsx_patch.DEFLATE_CHUNK, xlsx_patch.DEFLATE_MIN_BYTES
+    xlsx_patch.DEFLATE_CHUNK, xlsx_patch.DEFLATE_MIN_BYTES = 4096, 8192  # force many pieces
+    try:
+        outs = {}
+        for workers in (1, 3):
+            wb = Workbook(write_only=True)
+            for name in ("Big", "Small"):
+                ws = wb.create_sheet(name)
+                for i in range(2000 if name == "Big" else 3):
+                    ws.append([i, f"row {i}", "x" * (i % 50)])
+            outs[workers] = wd.p(f"w{workers}.xlsx")
+            xlsx_patch.save_workbook(wb, str(outs[workers]), workers)
+
+        with zipfile.ZipFile(outs[1]) as a, zipfile.ZipFile(outs[3]) as b:
+            assert b.testzip() is None
+            assert a.namelist() == b.namelist()
+            for name in a.namelist():
+                assert a.read(name) == b.read(name) or name == "docProps/core.xml", name
+        for name in ("Big", "Small"):
+            assert read_sheet_rows(outs[3], name) == read_sheet_rows(outs[1], name)
+    finally:
+        xlsx_patch.DEFLATE_CHUNK, xlsx_patch.DEFLATE_MIN_BYTES = chunk, min_bytes
+        wd.cleanup()
+
+if __name__ == "__main__":
+    test_results_sidecars_match_workbook()
+    test_run_summary_json_and_sheet_match_baseline_counts()
+    test_results_only_output_merges_back_to_full_workbook()
+    test_annotate_mode_keeps_original_workbook_and_adds_rule_columns()
+    test_annotate_mode_starts_past_the_widest_row_of_a_streamed_dmw()
+    test_partition_output_by_table_writes_one_workbook_per_table_and_index()
+    test_parallel_deflate_save_matches_plain_save()
+    print("[OK] Output tests passed")
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+import csv
+import subprocess
+
+from openpyxl import load_workbook
+
+from tests_auto.common import Workdir, VALIDATOR, make_dmw_xlsx, make_ddl_sql, run_validator, read_sheet_rows
+
+def _rows(extra=()):
+    return [
+        {"Destination Table": "T1", "Destination Column Name": "ID", "Destination Data Type": "INT"},
+        {"Destination Table": "T1", "Destination Column Name": "NAME", "Destination Data Type": "INT"},
+    ] + list(extra)
+
+def test_results_delta_sheet_and_diff_results_command():
+    wd = Workdir("delta_")
+    try:
+        dmw = wd.p("dmw.xlsx")
+        ddl_bad = wd.p("bad.sql")
+        ddl_good = wd.p("good.sql")
+        db = wd.p("results.db")
+        make_ddl_sql(ddl_bad, {"T1": {"ID": "INT NULL", "NAME": "VARCHAR(10) NULL"}})
+        make_ddl_sql(ddl_good, {"T1": {"ID": "INT NULL", "NAME": "INT NULL"}, "T2": {"X": "INT NULL"}})
+
+        make_dmw_xlsx(dmw, _rows())
+        run_validator(dmw=dmw, ddl=ddl_bad, out=wd.p("run1.xlsx"),
+                      extra_args=["--results-db", str(db), "--results-format", "jsonl"])
+        wb = load_workbook(wd.p("run1.xlsx"), read_only=True)
+        assert "Results_Delta" not in wb.sheetnames  # first run: nothing to compare
+        wb.close()
+
+        make_dmw_xlsx(dmw, _rows([{"Destination Table": "T2", "Destination Column Name": "X",
+                                   "Destination Data Type": "INT"}]))
+        run_validator(dmw=dmw, ddl=ddl_good, out=wd.p("run2.xlsx"),
+                      extra_args=["--results-db", str(db), "--results-format", "jsonl"])
+
+        delta = read_sheet_rows(wd.p("run2.xlsx"), "Results_Delta")
+        assert delta[0][:3] == ("Dest_Table", "Dest_Column", "Occurrence")
+        changes = {(r[0], r[1], r[5], r[6]) for r in delta[1:]}
+        assert ("T1", "NAME", "FIXED", "Rule4") in changes
+        assert ("T1", "ID", "FIXED", "Rule4") in changes  # table-level escalation cleared too
+        assert ("T2", "X", "ADDED", "Validation_Status") in changes
+        assert not any(r[6] == "Rule1" for r in delta[1:])  # unchanged rules are not reported
+
+        out = wd.p("delta.csv")
+        subprocess.check_call(["python3", str(VALIDATOR), "diff-results",
+                               str(wd.p("run1.rows.jsonl")), str(wd.p("run2.rows.jsonl")), "--out", str(out)])
+        with open(out, encoding="utf-8", newline="") as f:
+            rows = list(csv.reader(f))
+        assert {(r[0], r[1], r[5], r[6]) for r in rows[1:]} == changes
+
+        subprocess.check_call(["python3", str(VALIDATOR), "diff-results", "run:1", str(wd.p("run2.xlsx")),
+                               "--db", str(db), "--out", str(out)])
+        with open(out, encoding="utf-8", newline="") as f:
+            rows = list(csv.reader(f))
+        assert {(r[0], r[1], r[5], r[6]) for r in rows[1:]} == changes
+    finally:
+        wd.cleanup()
+
+if __name__ == "__main__":
+    test_results_delta_sheet_and_diff_results_command()
+    print("[OK] Results diff tests passed")
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+import sqlite3
+import sys
+
+from tests_auto.common import Workdir, VALIDATOR, make_dmw_xlsx, make_ddl_sql, run_validator
+
+sys.path.insert(0, str(VALIDATOR.parent))
+import results_store  # noqa: E402
+
+def test_runs_are_appended_and_queryable_across_runs():
+    wd = Workdir("store_")
+    try:
+        dmw = wd.p("dmw.xlsx")
+        ddl = wd.p("ddl.sql")
+        db = wd.p("results.db")
+        make_dmw_xlsx(dmw, [
+            {"Destination Table": "T1", "Destination Column Name": "ID", "Destination Data Type": "INT"},
+            {"Destination Table": "T1", "Destination Column Name": "NAME", "Destination Data Type": "INT"},
+            {"Destination Table": "T2", "Destination Column Name": "ID", "Destination Data Type": "INT"},
+        ])
+        make_ddl_sql(ddl, {"T1": {"ID": "INT NULL", "NAME": "VARCHAR(10) NULL"}, "T2": {"ID": "INT NULL"}})
+
+        for n in range(3):
+            run_validator(dmw=dmw, ddl=ddl, out=wd.p(f"out{n}.xlsx"), extra_args=["--results-db", str(db)])
+
+        conn = results_store.connect(str(db))
+        try:
+            assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+            runs = results_store.list_runs(conn, dmw="dmw.xlsx")
+            assert [r[0] for r in runs] == [3, 2, 1]
+            assert all(r[4] == 3 for r in runs)  # rows per run
+
+            # T1 fails Rule4 (NAME type mismatch, escalated to the table) in every run; T2 never does
+            streak = results_store.failing_streak(conn, "Rule4", runs=3)
+            assert streak == [("T1", "ID"), ("T1", "NAME")]
+            assert results_store.failing_streak(conn, "Rule4", runs=4) == []  # only 3 runs exist
+
+            hist = results_store.column_history(conn, "t1", "name")
+            assert [h[0] for h in hist] == [3, 2, 1]
+            assert {h[7] for h in hist} == {"FAIL"}  # Rule4
+
+            issues = results_store.run_issues(conn, 3, "Rule4")
+            assert ("Rule4", "T1", "NAME", "TYPE_MISMATCH") in [i[:4] for i in issues]
+
+            # identical inputs are stored once
+            assert conn.execute("SELECT COUNT(*) FROM inputs").fetchone()[0] == 2
+
+            # one run's rows, filtered and paginated (rowid ranges / indexes)
+            page = results_store.query_rows(conn, 2, page=2, page_size=2)
+            assert (page["total"], page["pages"], [r[:3] for r in page["rows"]]) == (3, 2, [[4, "T2", "ID"]])
+            fails = results_store.query_rows(conn, 3, rule="Rule4")
+            assert [r[1:3] for r in fails["rows"]] == [["T1", "ID"], ["T1", "NAME"]]
+            assert results_store.query_rows(conn, 3, status="fail", table="t2")["total"] == 1  # Rule3: no Table Details
+            assert results_store.query_rows(conn, 9)["total"] == 0
+        finally:
+            conn.close()
+    finally:
+        wd.cleanup()
+
+if __name__ == "__main__":
+    test_runs_are_appended_and_queryable_across_runs()
+    print("[OK] Results store tests passed")
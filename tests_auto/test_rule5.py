@@ -1,5 +1,6 @@
 #!/usr/bin/env python3
-from tests_auto.common import Workdir, make_dmw_xlsx, make_ddl_sql, run_validator, read_sheet_rows
+from tests_auto.common import (Workdir, make_dmw_xlsx, make_ddl_sql, run_validator, read_sheet_rows,
+                               find_col_index, assert_any_row_has_value)
 
 def test_rule5_reference_subset_of_master():
     wd = Workdir("r5a_")
@@ -37,6 +38,44 @@ def test_rule5_reference_subset_of_master():
     finally:
         wd.cleanup()
 
+def test_rule5_directory_of_references_tagged_by_file():
+    wd = Workdir("r5b_")
+    try:
+        master = wd.p("master.xlsx")
+        refs = wd.p("refs")
+        refs.mkdir()
+        dmw = wd.p("dmw.xlsx")
+        ddl = wd.p("ddl.sql")
+        out = wd.p("out.xlsx")
+
+        make_dmw_xlsx(master, [
+            {"Destination Table": "TREF", "Destination Column Name": "C1"},
+            {"Destination Table": "TREF", "Destination Column Name": "C2"},
+        ])
+        # ref_a is a clean subset; ref_b adds C9; ref_c uses a table the master lacks
+        make_dmw_xlsx(refs / "ref_a.xlsx", [{"Destination Table": "TREF", "Destination Column Name": "C1"}])
+        make_dmw_xlsx(refs / "ref_b.xlsx", [{"Destination Table": "TREF", "Destination Column Name": "C9"}])
+        make_dmw_xlsx(refs / "ref_c.xlsx", [{"Destination Table": "TNEW", "Destination Column Name": "X"}])
+
+        make_dmw_xlsx(dmw, [
+            {"Destination Table": "TREF", "Destination Column Name": "C1", "Migrating Column": "Yes",
+             "Destination Data Type": "INT", "Destination Nullable": "NOT NULL", "Transformation Logic": "copy"},
+        ])
+        make_ddl_sql(ddl, {"TREF": {"C1": "INT NOT NULL"}})
+
+        run_validator(dmw=dmw, ddl=ddl, out=out, ref_dmw=refs, master_dmw=master, extra_args=["--workers", "2"])
+
+        r5 = read_sheet_rows(out, "Rule5_Ref_Master_Mismatch")
+        file_i = find_col_index(r5[0], "Reference_File")
+        got = [(r[file_i], r[2], r[3]) for r in r5[1:]]
+        assert got == [("ref_b.xlsx", "C9", "NOT_IN_MASTER"), ("ref_c.xlsx", "X", "MASTER_TABLE_MISSING")], got
+
+        base = read_sheet_rows(out, "Baseline Data Model_output")
+        assert_any_row_has_value(base, "Rule5", "FAIL")
+    finally:
+        wd.cleanup()
+
 if __name__ == "__main__":
     test_rule5_reference_subset_of_master()
+    test_rule5_directory_of_references_tagged_by_file()
     print("[OK] Rule5 tests passed")
@@ -38,6 +38,82 @@ def test_rule6_dmw_drift_added_detected_and_baseline_marked():
     finally:
         wd.cleanup()
 
+def test_rule6_attribute_drift_reports_changed_fields_info_only():
+    wd = Workdir("r6b_")
+    try:
+        prev = wd.p("prev.xlsx")
+        curr = wd.p("curr.xlsx")
+        ddl = wd.p("ddl.sql")
+        out = wd.p("out.xlsx")
+
+        make_dmw_xlsx(prev, [
+            {"Source Table": "S1", "Source Column Name": "A", "Destination Table": "T1", "Destination Column Name": "C1",
+             "Migrating Column": "Yes", "Destination Data Type": "INT", "Destination Nullable": "NOT NULL",
+             "Transformation Logic": "copy"},
+        ])
+
+        # same key, different type + source column -> attribute drift only
+        make_dmw_xlsx(curr, [
+            {"Source Table": "S1", "Source Column Name": "B", "Destination Table": "T1", "Destination Column Name": "C1",
+             "Migrating Column": "Yes", "Destination Data Type": "BIGINT", "Destination Nullable": "NOT NULL",
+             "Transformation Logic": "copy"},
+        ])
+
+        make_ddl_sql(ddl, {"T1": {"C1": "BIGINT NOT NULL"}})
+
+        run_validator(dmw=curr, ddl=ddl, out=out, prev_dmw=prev)
+
+        r6 = read_sheet_rows(out, "Rule6_DMW_Drift")
+        issues = {str(r[2] or "").strip(): str(r[3] or "") for r in r6[1:]}
+        assert issues.get("DATATYPE_CHANGED") == "Prev=INT Curr=BIGINT", issues
+        assert issues.get("SOURCE_CHANGED") == "Prev=S1.A Curr=S1.B", issues
+        assert "NULLABLE_CHANGED" not in issues and "TRANSFORMATION_CHANGED" not in issues, issues
+
+        # Rule6B is INFO only: the baseline row is not failed by attribute drift
+        base = read_sheet_rows(out, "Baseline Data Model_output")
+        assert_any_row_has_value(base, "Rule6", "PASS")
+    finally:
+        wd.cleanup()
+
+def test_rule6_attribute_drift_skips_fields_the_prev_dmw_has_no_column_for():
+    from openpyxl import Workbook
+    wd = Workdir("r6b_")
+    try:
+        prev = wd.p("prev.xlsx")
+        curr = wd.p("curr.xlsx")
+        ddl = wd.p("ddl.sql")
+        out = wd.p("out.xlsx")
+
+        # an older DMW: no Source / Migrating columns
+        wb = Workbook()
+        ws = wb.active
+        ws.title = "Baseline Data Model"
+        ws.append(["Destination Table", "Destination Column Name", "Destination Data Type",
+                   "Destination Nullable", "Transformation Logic"])
+        ws.append(["T1", "C1", "INT", "NOT NULL", "copy"])
+        ws.append(["T1", "C2", "INT", "NOT NULL", "copy"])
+        wb.save(prev)
+
+        make_dmw_xlsx(curr, [
+            {"Source Table": "S1", "Source Column Name": "A", "Destination Table": "T1", "Destination Column Name": "C1",
+             "Migrating Column": "Yes", "Destination Data Type": "BIGINT", "Destination Nullable": "NOT NULL",
+             "Transformation Logic": "copy"},
+            {"Source Table": "S1", "Source Column Name": "B", "Destination Table": "T1", "Destination Column Name": "C2",
+             "Migrating Column": "Yes", "Destination Data Type": "INT", "Destination Nullable": "NOT NULL",
+             "Transformation Logic": "copy"},
+        ])
+        make_ddl_sql(ddl, {"T1": {"C1": "BIGINT NOT NULL", "C2": "INT NOT NULL"}})
+
+        run_validator(dmw=curr, ddl=ddl, out=out, prev_dmw=prev)
+
+        r6 = read_sheet_rows(out, "Rule6_DMW_Drift")
+        drift = [(str(r[1] or ""), str(r[2] or "").strip()) for r in r6[1:] if str(r[2] or "").endswith("_CHANGED")]
+        assert drift == [("C1", "DATATYPE_CHANGED")], drift
+    finally:
+        wd.cleanup()
+
 if __name__ == "__main__":
     test_rule6_dmw_drift_added_detected_and_baseline_marked()
+    test_rule6_attribute_drift_reports_changed_fields_info_only()
+    test_rule6_attribute_drift_skips_fields_the_prev_dmw_has_no_column_for()
     print("[OK] Rule6 tests passed")
@@ -31,6 +31,41 @@ def test_rule7_ddl_drift_detected_in_sheet():
     finally:
         wd.cleanup()
 
+def test_rule7_renamed_column_reported_with_confidence():
+    wd = Workdir("r7b_")
+    try:
+        dmw = wd.p("dmw.xlsx")
+        prev_ddl = wd.p("prev.sql")
+        curr_ddl = wd.p("curr.sql")
+        out = wd.p("out.xlsx")
+
+        make_dmw_xlsx(dmw, [
+            {"Destination Table": "T1", "Destination Column Name": "ID", "Migrating Column": "Yes",
+             "Destination Data Type": "INT", "Destination Nullable": "NOT NULL", "Transformation Logic": "copy"},
+        ])
+
+        # CUST_NM -> CUSTOMER_NAME (same type); ADDR_LINE1 -> ADDR_LINE2 is a sibling, not a rename
+        make_ddl_sql(prev_ddl, {"T1": {"ID": "INT NOT NULL", "CUST_NM": "NVARCHAR(100) NULL",
+                                       "ADDR_LINE1": "NVARCHAR(50) NULL", "ADDR_LINE3": "NVARCHAR(50) NULL"}})
+        make_ddl_sql(curr_ddl, {"T1": {"ID": "INT NOT NULL", "CUSTOMER_NAME": "NVARCHAR(100) NULL",
+                                       "ADDR_LINE2": "NVARCHAR(50) NULL", "ADDR_LINE3": "NVARCHAR(50) NULL"}})
+
+        run_validator(dmw=dmw, ddl=curr_ddl, out=out, prev_ddl=prev_ddl)
+
+        r7 = read_sheet_rows(out, "Rule7_DDL_Drift")
+        by_issue = {}
+        for r in r7[1:]:
+            by_issue.setdefault(str(r[2] or "").strip(), []).append((str(r[1]), str(r[3] or "")))
+
+        renamed = by_issue.get("RENAMED", [])
+        assert [n for n, _ in renamed] == ["T1.CUST_NM -> T1.CUSTOMER_NAME"], renamed
+        assert renamed[0][1].startswith("confidence="), renamed
+        assert ("T1.ADDR_LINE2" in [n for n, _ in by_issue.get("ADDED_IN_CURRENT", [])]), by_issue
+        assert ("T1.ADDR_LINE1" in [n for n, _ in by_issue.get("REMOVED_IN_CURRENT", [])]), by_issue
+    finally:
+        wd.cleanup()
+
 if __name__ == "__main__":
     test_rule7_ddl_drift_detected_in_sheet()
+    test_rule7_renamed_column_reported_with_confidence()
     print("[OK] Rule7 tests passed")
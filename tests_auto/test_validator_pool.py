@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+import subprocess, sys
+
+import metrics
+from tests_auto.common import VALIDATOR, Workdir, make_dmw_xlsx, make_ddl_sql, run_validator, read_sheet_rows
+from validator_pool import ValidatorPool, validator_argv
+
+def test_validator_pool_matches_subprocess_and_recycles():
+    wd = Workdir("pool_")
+    pool = ValidatorPool(size=1, max_jobs=2)
+    try:
+        dmw = wd.p("dmw.xlsx")
+        ddl = wd.p("ddl.sql")
+        rows = [{"Destination Table": "T1", "Destination Column Name": c, "Migrating Column": "Yes",
+                 "Destination Data Type": "INT", "Destination Nullable": "NOT NULL",
+                 "Transformation Logic": "copy"} for c in ("C1", "C2", "C3")]
+        make_dmw_xlsx(dmw, rows, add_table_details=["T1"])
+        make_ddl_sql(ddl, {"T1": {"C1": "INT NOT NULL", "C2": "BIGINT NOT NULL"}})
+
+        run_validator(dmw=dmw, ddl=ddl, out=wd.p("sub.xlsx"))
+        argv = validator_argv(["python3", "/app/validate_dmw_final.py", "--dmw-xlsx", str(dmw),
+                               "--ddl-sql", str(ddl), "--out", str(wd.p("pool1.xlsx"))])
+        assert argv[0] == "--dmw-xlsx"
+        assert validator_argv(["python3", "generate_migration_artifacts.py"]) is None
+
+        rows_before = metrics.ROWS_TOTAL.values().get((), 0)
+        rc, out, err = pool.run(argv)
+        assert rc == 0, err
+        assert "Validation completed" in out
+        pid = pool._all[0].proc.pid
+        # the worker's phase timings and row count were merged into this process' registry
+        assert metrics.ROWS_TOTAL.values()[()] == rows_before + 3
+        assert {"read", "rules", "write"} <= {k[0] for k in metrics.PHASE_SECONDS.values()}
+        assert pool.rss()[(str(pid),)] > 0
+        for sheet in ("Baseline Data Model_output", "Rule4_DDL_Mismatch"):
+            assert read_sheet_rows(wd.p("pool1.xlsx"), sheet) == read_sheet_rows(wd.p("sub.xlsx"), sheet)
+
+        # a failing job reports a non-zero code and its traceback; the worker stays
+        rc, _, err = pool.run(["--dmw-xlsx", str(wd.p("missing.xlsx")), "--ddl-sql", str(ddl),
+                               "--out", str(wd.p("bad.xlsx"))])
+        assert rc == 1 and "Traceback" in err
+        # the CLI (subprocess path) fails the same way
+        assert subprocess.call([sys.executable, str(VALIDATOR), "--dmw-xlsx", str(wd.p("missing.xlsx")),
+                                "--ddl-sql", str(ddl), "--out", str(wd.p("bad.xlsx"))],
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL) == 1
+        # ... until max_jobs: the second job recycled it
+        assert pool._all[0].proc.pid != pid
+
+        rc, _, _ = pool.run(["--no-such-flag"])
+        assert rc == 2
+    finally:
+        pool.shutdown()
+        wd.cleanup()
@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+import json
+
+from tests_auto.common import Workdir
+from dmw_validator.viewer import build_viewer
+
+def test_viewer_writes_shards_sort_orders_and_facets():
+    wd = Workdir("viewer_")
+    try:
+        recs = [{"table": f"T{i % 3}", "field": f"C{i:03d}", "issue_type": "missing_logic" if i % 2 else "ai_review",
+                 "full_row": {"n": i}} for i in range(25)]
+        with open(wd.p("mismatched_fields.json"), "w", encoding="utf-8") as f:
+            json.dump(recs, f)
+        (wd.root / "ai").mkdir()
+        with open(wd.p("ai") / "recon_ai.sql", "w", encoding="utf-8") as f:
+            f.write("SELECT 1;\nSELECT 2;\n")
+
+        page = build_viewer(str(wd.root), shard_rows=10)
+        assert page.endswith("viewer.html")
+        report = wd.p("report")
+        with open(report / "index.json", encoding="utf-8") as f:
+            index = json.load(f)
+        ds, sql = index["datasets"]
+        assert (ds["id"], ds["total"], ds["shards"]) == ("mismatches", 25, 3)
+        assert (sql["id"], sql["total"], sql["text"], sql["sorts"]) == ("ai-recon-sql", 2, True, [])
+        assert ds["columns"] == ["table", "field", "issue_type", "full_row"]
+
+        with open(report / "mismatches" / "shard-00002.json", encoding="utf-8") as f:
+            last = json.load(f)["rows"]
+        assert len(last) == 5 and last[0][:2] == ["T2", "C020"] and json.loads(last[0][3]) == {"n": 20}
+
+        with open(report / "mismatches" / "sort-0.json", encoding="utf-8") as f:
+            order = json.load(f)
+        assert [recs[i]["table"] for i in order] == sorted(r["table"] for r in recs)
+        assert ds["facets"]["2"] == {"ai_review": 13, "missing_logic": 12}
+        with open(report / "mismatches" / "facet-2.json", encoding="utf-8") as f:
+            assert json.load(f)["missing_logic"] == list(range(1, 25, 2))
+        assert "1" not in ds["facets"]  # every field is distinct
+    finally:
+        wd.cleanup()
+
+if __name__ == "__main__":
+    test_viewer_writes_shards_sort_orders_and_facets()
+    print("[OK] Viewer tests passed")
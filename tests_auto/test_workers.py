@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+import subprocess, sys
+
+from openpyxl import load_workbook
+
+from tests_auto.common import VALIDATOR, Workdir, make_dmw_xlsx, make_ddl_sql, run_validator, read_sheet_rows
+
+SHEETS = [
+    "Baseline Data Model_output", "Rule3_Table_Mismatch", "Rule4_DDL_Mismatch",
+    "Rule5_Ref_Master_Mismatch", "Rule6_DMW_Drift", "Rule7_DDL_Drift",
+]
+
+def test_workers_output_matches_serial():
+    wd = Workdir("workers_")
+    try:
+        dmw = wd.p("dmw.xlsx")
+        prev = wd.p("prev.xlsx")
+        ddl = wd.p("ddl.sql")
+        out1 = wd.p("out1.xlsx")
+        out4 = wd.p("out4.xlsx")
+
+        rows, prev_rows, tables = [], [], {}
+        for t in range(6):
+            T = f"T{t}"
+            tables[T] = {}
+            for c in range(5):
+                C = f"C{c}"
+                rows.append({"Destination Table": T, "Destination Column Name": C, "Migrating Column": "Yes",
+                             "Destination Data Type": "INT" if c % 2 else "BIGINT", "Destination Nullable": "NOT NULL",
+                             "Transformation Logic": "copy" if c != 3 else ""})
+                if c != 4:
+                    prev_rows.append({"Destination Table": T, "Destination Column Name": C,
+                                      "Destination Data Type": "INT"})
+                if c != 2:
+                    tables[T][C] = "INT NOT NULL"
+        rows.append({"Destination Table": "NA", "Destination Column Name": "NA", "Migrating Column": "No"})
+
+        make_dmw_xlsx(dmw, rows, add_table_details=["T0", "T1", "T9"])
+        make_dmw_xlsx(prev, prev_rows + [{"Destination Table": "T5", "Destination Column Name": "GONE"}])
+        make_ddl_sql(ddl, tables)
+
+        run_validator(dmw=dmw, ddl=ddl, out=out1, prev_dmw=prev)
+        run_validator(dmw=dmw, ddl=ddl, out=out4, prev_dmw=prev, extra_args=["--workers", "4"])
+
+        for sheet in SHEETS:
+            assert read_sheet_rows(out1, sheet) == read_sheet_rows(out4, sheet), f"{sheet} differs with --workers 4"
+
+        # streamed (write_only) workbook keeps the historical sheet order
+        wb = load_workbook(out1, read_only=True)
+        try:
+            assert wb.sheetnames == [
+                "Baseline Data Model_output", "Rule4_DDL_Mismatch", "Rule3_Table_Mismatch",
+                "Rule5_Ref_Master_Mismatch", "Rule6_DMW_Drift", "Rule7_DDL_Drift", "Summary_Stats",
+            ], wb.sheetnames
+        finally:
+            wb.close()
+    finally:
+        wd.cleanup()
+
+# runs the validator CLI on a pretend 4-CPU host with process pools disabled
+NO_PROCESS_POOLS = """
+import concurrent.futures, os, runpy, sys
+def refuse(*a, **k):
+    raise AssertionError("process pool started with --workers 1")
+concurrent.futures.ProcessPoolExecutor = refuse
+os.cpu_count = lambda: 4
+sys.argv = sys.argv[1:]
+runpy.run_path(sys.argv[0], run_name="__main__")
+"""
+
+def test_explicit_single_worker_runs_serially():
+    wd = Workdir("workers1_")
+    try:
+        dmw, ddl, master, out = wd.p("dmw.xlsx"), wd.p("ddl.sql"), wd.p("master.xlsx"), wd.p("out.xlsx")
+        refs = [wd.p("ref_a.xlsx"), wd.p("ref_b.xlsx")]
+        make_dmw_xlsx(dmw, [{"Destination Table": T, "Destination Column Name": "C1", "Migrating Column": "Yes",
+                             "Destination Data Type": "INT", "Destination Nullable": "NOT NULL",
+                             "Transformation Logic": "copy"} for T in ("T1", "T2")])
+        make_ddl_sql(ddl, {"T1": {"C1": "INT NOT NULL"}, "T2": {"C1": "INT NOT NULL"}})
+        make_dmw_xlsx(master, [{"Destination Table": "T1", "Destination Column Name": "C1"}])
+        for ref in refs:
+            make_dmw_xlsx(ref, [{"Destination Table": "T1", "Destination Column Name": "C1"}])
+
+        subprocess.check_call([sys.executable, "-c", NO_PROCESS_POOLS, str(VALIDATOR),
+                               "--dmw-xlsx", str(dmw), "--ddl-sql", str(ddl), "--out", str(out),
+                               "--master-dmw", str(master), "--ref-dmw", *map(str, refs),
+                               "--partition-output", "by-table", "--workers", "1"])
+        assert read_sheet_rows(out, "Baseline Data Model_output")[1:]
+    finally:
+        wd.cleanup()
+
+if __name__ == "__main__":
+    test_workers_output_matches_serial()
+    test_explicit_single_worker_runs_serially()
+    print("[OK] Workers tests passed")
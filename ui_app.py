@@ -1,12 +1,24 @@
-from fastapi import FastAPI, UploadFile, Request
-from fastapi.responses import HTMLResponse, FileResponse
+from fastapi import FastAPI, HTTPException, Query, UploadFile, Request
+from fastapi.responses import HTMLResponse, FileResponse, JSONResponse, PlainTextResponse, RedirectResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
+from starlette.concurrency import run_in_threadpool
 from pathlib import Path
-import shutil
-import subprocess
+from contextlib import asynccontextmanager
+import re
 import uuid
 
+import metrics
+from cfg import JANITOR_CFG, JOB_CFG
+from admission import Scheduler, estimate
+from blob_store import BlobStore
+from janitor import Janitor, is_pinned, pin, touch
+from job_store import open_store
+from job_queue import FINISHED, PROGRESS_FILE, Job, JobQueue, event_stream
+from result_cache import ResultCache
+from results_store import RULES, connect as connect_results, query_rows
+from validator_pool import ValidatorPool
+
 # --------------------------------------------------
 # Paths
 # --------------------------------------------------
@@ -22,23 +34,92 @@ for d in [UPLOAD_DIR, OUTPUT_DIR, TEMPLATES_DIR, STATIC_DIR]:
 # --------------------------------------------------
 # App
 # --------------------------------------------------
-app = FastAPI(title="DMW Validation Portal")
+RESULTS_DB = "results.db"   # per-job SQLite results store behind /jobs/{id}/results
+
+# validations run in the background on warm validator processes; /upload only enqueues
+# admission: per-user fair queues and a fast lane for small DMWs, within CPU / memory budgets
+scheduler = Scheduler(JOB_CFG["cpu_budget"], JOB_CFG["mem_budget_mb"], JOB_CFG["fast_rows"], JOB_CFG["fast_slots"],
+                      JOB_CFG["max_workers"])
+pool = ValidatorPool(JOB_CFG["cpu_budget"] + JOB_CFG["fast_slots"], JOB_CFG["pool_max_jobs"],
+                     JOB_CFG["pool_max_rss_mb"]) if JOB_CFG["pool"] else None
+cache = ResultCache(OUTPUT_DIR / ".cache", JOB_CFG["cache_ttl"], JOB_CFG["cache_max_mb"] << 20) if JOB_CFG["cache"] else None
+# with DMW_JOB_STORE, jobs are shared with other portal / job_worker.py processes
+store = open_store(JOB_CFG["store"], JOB_CFG["max_attempts"]) if JOB_CFG["store"] else None
+jobs = JobQueue(workers=JOB_CFG["workers"], timeout=JOB_CFG["timeout"], pool=pool, cache=cache, scheduler=scheduler,
+                store=store, worker=JOB_CFG["embedded_worker"], lease=JOB_CFG["lease"])
+# uploads are stored once by content and hard-linked into the job directories
+blobs = BlobStore(UPLOAD_DIR / "blobs")
+# retention: unused jobs go after retention_days, then least recently used ones above the quota
+janitor = Janitor(
+    job_roots=[OUTPUT_DIR], file_roots=[UPLOAD_DIR], blobs=blobs,
+    max_age=JANITOR_CFG["retention_days"] * 86400, quota_bytes=JANITOR_CFG["quota_mb"] << 20,
+    interval=JANITOR_CFG["interval"], grace=JANITOR_CFG["grace"], busy=jobs.active,
+)
+# GET /metrics: queue depth, cache, uploads, worker memory and disk are read at scrape time
+metrics.watch(jobs=jobs, pool=pool, blobs=blobs, janitor=janitor)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if pool is not None and (store is None or JOB_CFG["embedded_worker"]):
+        pool.start()   # pre-warm: workers import the validator before the first upload
+    jobs.start()
+    if JANITOR_CFG["enabled"]:
+        janitor.start()
+    yield
+    janitor.stop()
+    jobs.shutdown(wait=False)
+
+app = FastAPI(title="DMW Validation Portal", lifespan=lifespan)
+metrics.instrument(app)   # request latency per route
 
 app.mount("/static", StaticFiles(directory=str(STATIC_DIR)), name="static")
 templates = Jinja2Templates(directory=str(TEMPLATES_DIR))
 
+def wants_json(request: Request) -> bool:
+    return "application/json" in request.headers.get("accept", "")
+
+def client_user(request: Request) -> str:
+    """Fair-queueing key: the proxy-authenticated user, else the client address."""
+    return request.headers.get("x-forwarded-user") or (request.client.host if request.client else "")
+
+def find_job(job_id: str) -> Job:
+    job = jobs.get(job_id, OUTPUT_DIR / f"job_{job_id}") if re.fullmatch(r"[0-9A-Za-z_-]+", job_id) else None
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+def job_status(job: Job) -> dict:
+    return {
+        "job_id": job.job_id,
+        "status": job.status,
+        "queue_position": jobs.position(job),
+        "lane": job.lane,
+        "created": job.created,
+        "started": job.started,
+        "finished": job.finished,
+        "returncode": job.returncode,
+        "cached": job.cached,
+        "pinned": is_pinned(job.job_dir),
+        "progress": job.progress(),
+        "files": job.files() if job.done else [],
+        "status_url": f"/jobs/{job.job_id}",
+        "events_url": f"/jobs/{job.job_id}/events",
+        "result_url": f"/jobs/{job.job_id}/result",
+    }
+
 # --------------------------------------------------
 # Home
 # --------------------------------------------------
 @app.get("/", response_class=HTMLResponse)
 async def home(request: Request):
     return templates.TemplateResponse(
+        request,
         "index.html",
         {"request": request}
     )
 
 # --------------------------------------------------
-# Upload & Validate
+# Upload & enqueue validation
 # --------------------------------------------------
 @app.post("/upload", response_class=HTMLResponse)
 async def upload(
@@ -54,23 +135,24 @@ async def upload(
     job_dir = OUTPUT_DIR / f"job_{job_id}"
     job_dir.mkdir(parents=True, exist_ok=True)
 
-    def save(file: UploadFile | None):
+    inputs = {}
+
+    def save(file: UploadFile | None, field: str):
         if not file:
             return None
         if not file.filename or not file.filename.strip():
             return None
 
-        dest = job_dir / file.filename
-        with dest.open("wb") as f:
-            shutil.copyfileobj(file.file, f)
+        dest, inputs[field] = blobs.save(file.file, job_dir / Path(file.filename).name)
         return dest
 
-    dmw_path = save(dmw_xlsx)
-    ddl_path = save(ddl_sql)
-    prev_dmw_path = save(prev_dmw)
-    prev_ddl_path = save(prev_ddl)
-    ref_dmw_path = save(ref_dmw)
-    master_dmw_path = save(master_dmw)
+    # file copies block: keep them off the event loop
+    dmw_path = await run_in_threadpool(save, dmw_xlsx, "dmw_xlsx")
+    ddl_path = await run_in_threadpool(save, ddl_sql, "ddl_sql")
+    prev_dmw_path = await run_in_threadpool(save, prev_dmw, "prev_dmw")
+    prev_ddl_path = await run_in_threadpool(save, prev_ddl, "prev_ddl")
+    ref_dmw_path = await run_in_threadpool(save, ref_dmw, "ref_dmw")
+    master_dmw_path = await run_in_threadpool(save, master_dmw, "master_dmw")
 
     out_xlsx = job_dir / "Baseline_Data_Model_output.xlsx"
 
@@ -90,22 +172,139 @@ async def upload(
         cmd += ["--ref-dmw", str(ref_dmw_path)]
     if master_dmw_path:
         cmd += ["--master-dmw", str(master_dmw_path)]
+    cmd += ["--progress-file", str(job_dir / PROGRESS_FILE)]
+    cmd += ["--results-db", str(job_dir / RESULTS_DB)]   # indexed rows for /jobs/{id}/results
+    cost = await run_in_threadpool(estimate, cmd)
+    cmd += ["--workers", str(scheduler.workers(cost.rows))]   # admitted for that many cores
 
-    result = subprocess.run(cmd, capture_output=True, text=True)
+    job = jobs.submit(Job(job_id, job_dir, cmd, output=out_xlsx.name, inputs=inputs, user=client_user(request)))
 
-    files = sorted([f.name for f in job_dir.iterdir() if f.is_file()])
+    if wants_json(request):
+        return JSONResponse(job_status(job), status_code=200 if job.done else 202)
+    if job.done:   # result cache hit
+        return RedirectResponse(f"/jobs/{job.job_id}/result", status_code=303)
+    return templates.TemplateResponse(
+        request,
+        "job.html",
+        {"request": request, **job_status(job)},
+        status_code=202,
+    )
 
-    
+# --------------------------------------------------
+# Job status + result
+# --------------------------------------------------
+@app.get("/jobs/{job_id}")
+async def job_info(job_id: str):
+    return job_status(find_job(job_id))
+
+@app.get("/jobs/{job_id}/events")
+async def job_events(job_id: str):
+    """Server-Sent Events: job status + validator progress, at most one update per progress_interval."""
+    find_job(job_id)   # 404 before the stream starts
+
+    def snapshot() -> dict:
+        # re-read on every poll: with a shared store, another process runs the job
+        try:
+            return job_status(find_job(job_id))
+        except HTTPException:   # removed meanwhile (janitor): a final error event ends the stream
+            return {"job_id": job_id, "status": "removed", "error": "Job not found"}
+
+    return StreamingResponse(
+        event_stream(snapshot, lambda e: e["status"] in FINISHED or "error" in e, JOB_CFG["progress_interval"]),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.get("/jobs/{job_id}/results")
+def job_results(
+    job_id: str,
+    rule: str | None = None,
+    status: str | None = None,
+    table: str | None = None,
+    page: int = Query(1, ge=1),
+    page_size: int = Query(100, ge=1, le=1000),
+):
+    """
+    One page of the job's row results, filtered server-side from its SQLite
+    results store: rule=4&status=FAIL (rule result, FAIL by default),
+    status=FAIL (Validation_Status), table=DEST_TABLE.
+    """
+    job = find_job(job_id)
+    if not job.done:
+        raise HTTPException(status_code=409, detail="Job has not finished")
+    db = job.job_dir / RESULTS_DB
+    if not db.exists():
+        raise HTTPException(status_code=404, detail="No indexed results for this job")
+    touch(job.job_dir)
+    if rule:
+        rule = "Rule" + rule[4:] if rule.lower().startswith("rule") else f"Rule{rule}"
+        if rule not in RULES:
+            raise HTTPException(status_code=400, detail=f"rule must be one of 1-{len(RULES)}")
+    conn = connect_results(str(db))
+    try:
+        run_id = conn.execute("SELECT MAX(run_id) FROM runs").fetchone()[0]
+        return {"job_id": job.job_id, **query_rows(conn, run_id, rule, status, table, page, page_size)}
+    finally:
+        conn.close()
+
+@app.post("/jobs/{job_id}/pin")
+async def pin_job(job_id: str):
+    """Exempt the job from retention and quota eviction (e.g. a sprint baseline)."""
+    job = find_job(job_id)
+    pin(job.job_dir)
+    return job_status(job)
+
+@app.delete("/jobs/{job_id}/pin")
+async def unpin_job(job_id: str):
+    job = find_job(job_id)
+    pin(job.job_dir, False)
+    return job_status(job)
+
+@app.get("/queue")
+def queue():
+    """Admission state: budgets in use, fast-lane slots, pending jobs per lane and user."""
+    snap = scheduler.snapshot()
+    if store is not None:   # this process' budgets; the queue itself is shared
+        snap["shared"] = {"queued": len(store.candidates(1000)), "running_by_user": store.running_by_user()}
+    return snap
+
+@app.get("/storage")
+def storage():
+    """Janitor counters: bytes in use and reclaimed, entries and blobs removed."""
+    return {**janitor.stats, "quota_bytes": janitor.quota_bytes, "max_age": janitor.max_age}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    """Prometheus scrape endpoint: request latency, queue, job and validator phase timings, cache, memory, disk."""
+    return PlainTextResponse(metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
+
+@app.get("/jobs/{job_id}/result", response_class=HTMLResponse)
+async def job_result(request: Request, job_id: str):
+    job = find_job(job_id)
+    if not job.done:
+        if wants_json(request):
+            return JSONResponse(job_status(job), status_code=202)
+        return templates.TemplateResponse(
+            request,
+            "job.html",
+            {"request": request, **job_status(job)},
+            status_code=202,
+        )
+    touch(job.job_dir)   # LRU clock for the janitor
+    if wants_json(request):
+        return {**job_status(job), "stdout": job.stdout, "stderr": job.stderr}
     return templates.TemplateResponse(
-    "result.html",
-    request=request,
-    context={
-        "request": request,
-        "job_id": job_id,
-        "stdout": result.stdout,
-        "stderr": result.stderr,
-        "files": files,
-    }
+        request,
+        "result.html",
+        {
+            "request": request,
+            "job_id": job.job_id,
+            "status": job.status,
+            "cached": job.cached,
+            "stdout": job.stdout,
+            "stderr": job.stderr,
+            "files": job.files(),
+        }
     )
 
 
@@ -117,4 +316,5 @@ async def download(job_id: str, filename: str):
     path = OUTPUT_DIR / f"job_{job_id}" / filename
     if not path.exists():
         return {"error": "File not found"}
+    touch(path.parent)
     return FileResponse(path=path, filename=filename)
@@ -1,10 +1,14 @@
 ﻿#!/usr/bin/env python3
-import argparse, traceback, logging, re
+import argparse, traceback, logging, re, os, sys, time, queue, threading, hashlib, pickle, tempfile, json, csv
+from concurrent.futures import Future, ThreadPoolExecutor
+from difflib import SequenceMatcher
 from pathlib import Path
-from typing import Dict, List, Tuple, Set, Optional, Iterable
+from typing import Callable, Dict, FrozenSet, List, Tuple, Set, Optional, Iterable, Iterator
 
 from openpyxl import load_workbook, Workbook
 from cfg import PATHS
+from xlsx_patch import save_workbook
+import metrics
 
 # ----------------------------------------------------
 # Logging
@@ -298,6 +302,30 @@ def parse_ddl(path: str) -> Dict[str, Dict[str, Dict[str, str]]]:
 
     return tables
 
+def _diff_table_cols(t: str,
+                     pcols: Dict[str, Dict[str, str]],
+                     ccols: Dict[str, Dict[str, str]]):
+    added_cols: List[Tuple[str, str, str, str]] = []
+    removed_cols: List[Tuple[str, str, str, str]] = []
+    changed_cols: List[Tuple[str, str, str, str, str, str]] = []
+
+    pset = set(pcols.keys())
+    cset = set(ccols.keys())
+
+    for c in sorted(cset - pset):
+        added_cols.append((t, c, ccols[c].get("type", ""), ccols[c].get("nullable", "")))
+    for c in sorted(pset - cset):
+        removed_cols.append((t, c, pcols[c].get("type", ""), pcols[c].get("nullable", "")))
+    for c in sorted(pset & cset):
+        pt = pcols[c].get("type", "")
+        ct = ccols[c].get("type", "")
+        pn = pcols[c].get("nullable", "")
+        cn = ccols[c].get("nullable", "")
+        if normalize_sql_type(pt) != normalize_sql_type(ct) or (pn or "") != (cn or ""):
+            changed_cols.append((t, c, pt, pn, ct, cn))
+
+    return added_cols, removed_cols, changed_cols
+
 def ddl_diff(prev: Dict[str, Dict[str, Dict[str, str]]],
              curr: Dict[str, Dict[str, Dict[str, str]]]):
     added_tables = sorted(set(curr.keys()) - set(prev.keys()))
@@ -309,25 +337,231 @@ def ddl_diff(prev: Dict[str, Dict[str, Dict[str, str]]],
     changed_cols: List[Tuple[str, str, str, str, str, str]] = []
 
     for t in common_tables:
-        pcols = prev[t]
-        ccols = curr[t]
-        pset = set(pcols.keys())
-        cset = set(ccols.keys())
-
-        for c in sorted(cset - pset):
-            added_cols.append((t, c, ccols[c].get("type", ""), ccols[c].get("nullable", "")))
-        for c in sorted(pset - cset):
-            removed_cols.append((t, c, pcols[c].get("type", ""), pcols[c].get("nullable", "")))
-        for c in sorted(pset & cset):
-            pt = pcols[c].get("type", "")
-            ct = ccols[c].get("type", "")
-            pn = pcols[c].get("nullable", "")
-            cn = ccols[c].get("nullable", "")
-            if normalize_sql_type(pt) != normalize_sql_type(ct) or (pn or "") != (cn or ""):
-                changed_cols.append((t, c, pt, pn, ct, cn))
+        a, r, c = _diff_table_cols(t, prev[t], curr[t])
+        added_cols.extend(a)
+        removed_cols.extend(r)
+        changed_cols.extend(c)
 
     return added_tables, removed_tables, added_cols, removed_cols, changed_cols
 
+# ----------------------------------------------------
+# Rule7 rename / move detection (blocked similarity matching)
+# ----------------------------------------------------
+RENAME_MIN_CONFIDENCE = 0.6
+RENAME_FULL_SCAN_PAIRS = 2500   # above this many pairs per block, shortlist by shared trigrams
+RENAME_SHORTLIST = 5
+
+def _trigrams(name: str) -> Set[str]:
+    n = f"^{name}$"
+    return {n[i:i + 3] for i in range(len(n) - 2)}
+
+_DIGITS_RE = re.compile(r"\d+")
+
+def name_similarity(a: str, b: str) -> float:
+    """
+    SequenceMatcher ratio, except names that differ only in their numbers
+    (ADDR_LINE1 / ADDR_LINE2) are ordinal siblings, not renames -> 0.0.
+    """
+    if a != b and _DIGITS_RE.sub("#", a) == _DIGITS_RE.sub("#", b):
+        return 0.0
+    return SequenceMatcher(None, a, b, autojunk=False).ratio()
+
+def _type_sig(t: str) -> str:
+    return "".join(normalize_sql_type(t))
+
+def _candidate_pairs(left: List[str], right: List[str]) -> Iterable[Tuple[int, int]]:
+    """
+    All (i, j) pairs for small blocks; for large blocks only each left name's
+    top RENAME_SHORTLIST right names by shared trigrams (inverted index).
+    """
+    if len(left) * len(right) <= RENAME_FULL_SCAN_PAIRS:
+        for i in range(len(left)):
+            for j in range(len(right)):
+                yield i, j
+        return
+
+    index: Dict[str, List[int]] = {}
+    for j, name in enumerate(right):
+        for g in _trigrams(name):
+            index.setdefault(g, []).append(j)
+    for i, name in enumerate(left):
+        shared: Dict[int, int] = {}
+        for g in _trigrams(name):
+            for j in index.get(g, ()):
+                shared[j] = shared.get(j, 0) + 1
+        for j in sorted(shared, key=lambda k: (-shared[k], k))[:RENAME_SHORTLIST]:
+            yield i, j
+
+def _greedy_match(scored: List[Tuple[float, str, str]]) -> List[Tuple[float, str, str]]:
+    """One-to-one assignment, best confidence first (ties broken by names for determinism)."""
+    used_l: Set[str] = set()
+    used_r: Set[str] = set()
+    out: List[Tuple[float, str, str]] = []
+    for conf, l, r in sorted(scored, key=lambda x: (-x[0], x[1], x[2])):
+        if l in used_l or r in used_r:
+            continue
+        used_l.add(l)
+        used_r.add(r)
+        out.append((conf, l, r))
+    return out
+
+def match_renamed_columns(removed: List[Tuple[str, str, str, str]],
+                          added: List[Tuple[str, str, str, str]],
+                          *,
+                          min_confidence: float = RENAME_MIN_CONFIDENCE) -> List[Tuple[Tuple[str, str, str, str], Tuple[str, str, str, str], float]]:
+    """
+    Pair removed/added columns of one table that are likely renames.
+    Candidates are blocked on type signature, then scored:
+      confidence = 0.7 * name similarity + 0.15 * same nullability + 0.15 * only pair in its block
+    """
+    blocks: Dict[str, Tuple[List, List]] = {}
+    for col in removed:
+        blocks.setdefault(_type_sig(col[2]), ([], []))[0].append(col)
+    for col in added:
+        blocks.setdefault(_type_sig(col[2]), ([], []))[1].append(col)
+
+    matches = []
+    for sig in sorted(blocks):
+        rem, add = blocks[sig]
+        if not rem or not add:
+            continue
+        unique = 1.0 if len(rem) == 1 and len(add) == 1 else 0.0
+        by_r = {c[1]: c for c in rem}
+        by_a = {c[1]: c for c in add}
+        scored: List[Tuple[float, str, str]] = []
+        for i, j in _candidate_pairs([c[1] for c in rem], [c[1] for c in add]):
+            r, a = rem[i], add[j]
+            conf = 0.7 * name_similarity(r[1], a[1]) + 0.15 * (1.0 if r[3] == a[3] else 0.0) + 0.15 * unique
+            if conf >= min_confidence:
+                scored.append((round(conf, 2), r[1], a[1]))
+        for conf, rn, an in _greedy_match(scored):
+            matches.append((by_r[rn], by_a[an], conf))
+    return matches
+
+def match_renamed_tables(prev: Dict[str, Dict[str, Dict[str, str]]],
+                         curr: Dict[str, Dict[str, Dict[str, str]]],
+                         removed_tables: List[str],
+                         added_tables: List[str],
+                         *,
+                         min_confidence: float = RENAME_MIN_CONFIDENCE) -> List[Tuple[str, str, float, int, int]]:
+    """
+    Pair removed/added tables that are likely renames. Candidates are blocked on
+    shared (column name, type signature) pairs, then scored:
+      confidence = 0.4 * shared column names / smaller table
+                 + 0.3 * overlap of the column type signatures (as a multiset)
+                 + 0.3 * table name similarity
+    Returns [(old, new, confidence, shared_columns, prev_columns)].
+    """
+    index: Dict[Tuple[str, str], List[str]] = {}
+    for t in added_tables:
+        for c, d in curr[t].items():
+            index.setdefault((c, _type_sig(d.get("type", ""))), []).append(t)
+
+    def _type_bag(cols: Dict[str, Dict[str, str]]) -> Dict[str, int]:
+        bag: Dict[str, int] = {}
+        for d in cols.values():
+            sig = _type_sig(d.get("type", ""))
+            bag[sig] = bag.get(sig, 0) + 1
+        return bag
+
+    scored: List[Tuple[float, str, str]] = []
+    overlap: Dict[Tuple[str, str], Tuple[int, int]] = {}
+    for t in removed_tables:
+        cands: Set[str] = set()
+        for c, d in prev[t].items():
+            cands.update(index.get((c, _type_sig(d.get("type", ""))), ()))
+        pcols = set(prev[t].keys())
+        pbag = _type_bag(prev[t])
+        for nt in sorted(cands):
+            ccols = set(curr[nt].keys())
+            cbag = _type_bag(curr[nt])
+            shared = len(pcols & ccols)
+            smaller = min(len(pcols), len(ccols)) or 1
+            types = sum(min(n, cbag.get(sig, 0)) for sig, n in pbag.items()) / max(len(pcols), len(ccols), 1)
+            conf = 0.4 * shared / smaller + 0.3 * types + 0.3 * name_similarity(t, nt)
+            if conf >= min_confidence:
+                scored.append((round(conf, 2), t, nt))
+                overlap[(t, nt)] = (shared, len(pcols))
+
+    return [(t, nt, conf, *overlap[(t, nt)]) for conf, t, nt in _greedy_match(scored)]
+
+def ddl_diff_renames(prev: Dict[str, Dict[str, Dict[str, str]]],
+                     curr: Dict[str, Dict[str, Dict[str, str]]],
+                     *,
+                     min_confidence: float = RENAME_MIN_CONFIDENCE) -> Dict[str, List]:
+    """
+    ddl_diff() plus rename / move detection for Rule7. Matched pairs are taken out
+    of the plain ADDED/REMOVED lists. Returns a dict with:
+      added_tables, removed_tables, renamed_tables [(old, new, conf, shared, prev_columns)],
+      added_cols, removed_cols, changed_cols,
+      renamed_cols [(table, old, new, type, prev_nullable, curr_nullable, conf)],
+      moved_cols   [(old_table, new_table, col, type, prev_nullable, curr_nullable, conf)]
+    """
+    added_tables, removed_tables, added_cols, removed_cols, changed_cols = ddl_diff(prev, curr)
+
+    # Tables: renamed pairs are then diffed column-by-column like common tables
+    renamed_tables = match_renamed_tables(prev, curr, removed_tables, added_tables, min_confidence=min_confidence)
+    for old, new, *_ in renamed_tables:
+        a, r, c = _diff_table_cols(new, prev[old], curr[new])
+        added_cols.extend(a)
+        removed_cols.extend(r)
+        changed_cols.extend(c)
+    gone = {old for old, *_ in renamed_tables}
+    came = {new for _, new, *_ in renamed_tables}
+    removed_tables = [t for t in removed_tables if t not in gone]
+    added_tables = [t for t in added_tables if t not in came]
+
+    # Columns renamed within a table (blocked on table, then type signature)
+    rem_by_t: Dict[str, List[Tuple[str, str, str, str]]] = {}
+    add_by_t: Dict[str, List[Tuple[str, str, str, str]]] = {}
+    for col in removed_cols:
+        rem_by_t.setdefault(col[0], []).append(col)
+    for col in added_cols:
+        add_by_t.setdefault(col[0], []).append(col)
+
+    renamed_cols: List[Tuple[str, str, str, str, str, str, float]] = []
+    matched: Set[Tuple[str, str]] = set()
+    for t in sorted(set(rem_by_t) & set(add_by_t)):
+        for r, a, conf in match_renamed_columns(rem_by_t[t], add_by_t[t], min_confidence=min_confidence):
+            renamed_cols.append((t, r[1], a[1], a[2], r[3], a[3], conf))
+            matched.add((r[0], r[1]))
+            matched.add((a[0], a[1]))
+    removed_cols = [c for c in removed_cols if (c[0], c[1]) not in matched]
+    added_cols = [c for c in added_cols if (c[0], c[1]) not in matched]
+
+    # Columns moved across tables: same name + type signature, unique on both sides
+    rem_sig: Dict[Tuple[str, str], List[Tuple[str, str, str, str]]] = {}
+    add_sig: Dict[Tuple[str, str], List[Tuple[str, str, str, str]]] = {}
+    for col in removed_cols:
+        rem_sig.setdefault((col[1], _type_sig(col[2])), []).append(col)
+    for col in added_cols:
+        add_sig.setdefault((col[1], _type_sig(col[2])), []).append(col)
+
+    moved_cols: List[Tuple[str, str, str, str, str, str, float]] = []
+    matched = set()
+    for sig in sorted(set(rem_sig) & set(add_sig)):
+        rs, as_ = rem_sig[sig], add_sig[sig]
+        if len(rs) != 1 or len(as_) != 1 or rs[0][0] == as_[0][0]:
+            continue
+        r, a = rs[0], as_[0]
+        conf = 1.0 if r[3] == a[3] else 0.9
+        moved_cols.append((r[0], a[0], r[1], a[2], r[3], a[3], conf))
+        matched.add((r[0], r[1]))
+        matched.add((a[0], a[1]))
+    removed_cols = [c for c in removed_cols if (c[0], c[1]) not in matched]
+    added_cols = [c for c in added_cols if (c[0], c[1]) not in matched]
+
+    return {
+        "added_tables": added_tables,
+        "removed_tables": removed_tables,
+        "renamed_tables": renamed_tables,
+        "added_cols": added_cols,
+        "removed_cols": removed_cols,
+        "changed_cols": changed_cols,
+        "renamed_cols": renamed_cols,
+        "moved_cols": moved_cols,
+    }
+
 # ----------------------------------------------------
 # Rule1 / Rule2 (row-level)
 # ----------------------------------------------------
@@ -426,19 +660,100 @@ def load_dmw_dest_keys(path: str) -> Dict[str, Set[str]]:
     wb.close()
     return out
 
-def load_dmw_dest_defs(path: str) -> Dict[Tuple[str, str], Dict[str, str]]:
+# Mapping attributes fingerprinted per (dest table, dest column) for Rule6B,
+# in report order: (field, issue code)
+MAPPING_FIELDS: Tuple[Tuple[str, str], ...] = (
+    ("type", "DATATYPE_CHANGED"),
+    ("nullable", "NULLABLE_CHANGED"),
+    ("transform", "TRANSFORMATION_CHANGED"),
+    ("source", "SOURCE_CHANGED"),
+    ("migrating", "MIGRATING_CHANGED"),
+)
+ALL_MAPPING_FIELDS = frozenset(f for f, _ in MAPPING_FIELDS)
+
+def mapping_fields_present(ix: Dict[str, Optional[int]]) -> FrozenSet[str]:
+    """MAPPING_FIELDS the workbook has columns for (ix: resolved column indexes, None when missing)."""
+    needs = {"type": ("dtype_i",), "nullable": ("dnull_i",), "transform": ("trans_i",),
+             "source": ("st_i", "sc_i"), "migrating": ("mig_i",)}
+    return frozenset(f for f, cols in needs.items() if all(ix.get(c) is not None for c in cols))
+
+def mapping_def(dmw_type: str, dmw_len: str, dmw_null: str, dmw_tran: str,
+                source: str = "", migrating: str = "", present: FrozenSet[str] = ALL_MAPPING_FIELDS) -> Dict:
+    """
+    Build the per-key mapping definition used by Rule4A / Rule6B.
+    "norm" holds the normalised attributes (MAPPING_FIELDS order) and "fp" a
+    stable content hash of them, so drift detection is a hash join on (T, C).
+    "present" (shared per workbook) names the fields its columns resolved.
+    """
+    dmw_type_full = s(dmw_type).upper()
+    if dmw_len and "(" not in dmw_type_full and ")" not in dmw_type_full:
+        dmw_type_full = f"{dmw_type_full}({s(dmw_len)})"
+
+    d = {
+        "type": dmw_type_full,
+        "nullable": normalize_nullable(dmw_null),
+        "transform": s(dmw_tran),
+        "source": s(source).upper(),
+        "migrating": yn(migrating),
+        "present": present,
+    }
+    norm = ("\x1f".join(normalize_sql_type(d["type"])), d["nullable"], d["transform"], d["source"], d["migrating"])
+    d["norm"] = norm
+    d["fp"] = hashlib.blake2b("\x1e".join(norm).encode("utf-8"), digest_size=8).hexdigest()
+    return d
+
+def mapping_changes(prev_def: Dict, curr_def: Dict) -> List[str]:
+    """
+    Fields (MAPPING_FIELDS names) whose normalised value differs; [] when
+    fingerprints match. A field is compared only when both workbooks have its
+    column (e.g. an older DMW without "Migrating Column" reports no migrating drift).
     """
-    For Rule6B (attribute drift, INFO only).
+    if prev_def.get("fp") == curr_def.get("fp"):
+        return []
+    both = prev_def.get("present", ALL_MAPPING_FIELDS) & curr_def.get("present", ALL_MAPPING_FIELDS)
+    return [f for (f, _), p, c in zip(MAPPING_FIELDS, prev_def["norm"], curr_def["norm"]) if p != c and f in both]
+
+def mapping_drift(prev_defs: Dict[Tuple[str, str], Dict],
+                  curr_defs: Dict[Tuple[str, str], Dict]) -> List[Tuple[str, str, List[str]]]:
+    """One-pass hash join over current keys: [(T, C, changed_fields)] in current-key order."""
+    out: List[Tuple[str, str, List[str]]] = []
+    for key, curr_def in curr_defs.items():
+        prev_def = prev_defs.get(key)
+        if not prev_def:
+            continue
+        changed = mapping_changes(prev_def, curr_def)
+        if changed:
+            out.append((key[0], key[1], changed))
+    return out
+
+def mapping_issue_rows(t: str, c: str, changed: List[str], prev_def: Dict, curr_def: Dict) -> List[List[str]]:
+    """Rule6_DMW_Drift rows (INFO) for one modified key, one per changed field."""
+    issues = dict(MAPPING_FIELDS)
+    rows: List[List[str]] = []
+    for f in changed:
+        if f == "transform":
+            det = "Transformation logic changed"
+        else:
+            det = f"Prev={prev_def.get(f, '')} Curr={curr_def.get(f, '')}"
+        rows.append([t, c, issues[f], det])
+    return rows
+
+def load_dmw_dest_defs(path: str) -> Dict[Tuple[str, str], Dict]:
+    """
+    For Rule6 (key drift + attribute drift, INFO only).
     Returns:
-      defs[(T,C)] = {"type": "...", "nullable": "...", "transform": "..."}
+      defs[(T,C)] = mapping_def(...) -> {"type", "nullable", "transform", "source", "migrating", "norm", "fp"}
     """
     wb = load_workbook(path, read_only=True, data_only=True)
     ws = wb.active
     hr, cols, lookup = _load_sheet_header(ws)
     start = hr + 1
 
+    st_i = resolve_col(lookup, "Source Table")
+    sc_i = resolve_col(lookup, "Source Column Name", prefer_after=st_i if st_i is not None else None)
     dt_i = resolve_col(lookup, "Destination Table")
     dc_i = resolve_col(lookup, "Destination Column Name", prefer_after=dt_i if dt_i is not None else None)
+    mig_i = resolve_col(lookup, "Migrating Column", prefer_before=dt_i)
 
     # Destination-specific fields can be duplicated ("Data Type", "Max Length") -> anchor after dest column
     dtype_i = resolve_col(lookup, "Destination Data Type", prefer_after=dc_i)
@@ -446,10 +761,12 @@ def load_dmw_dest_defs(path: str) -> Dict[Tuple[str, str], Dict[str, str]]:
     dnull_i = resolve_col(lookup, "Destination Nullable", prefer_after=dc_i)
     trans_i = resolve_col(lookup, "Transformation Logic", prefer_after=dc_i)
 
-    out: Dict[Tuple[str, str], Dict[str, str]] = {}
+    out: Dict[Tuple[str, str], Dict] = {}
     if dt_i is None or dc_i is None:
         wb.close()
         return out
+    present = mapping_fields_present({"dtype_i": dtype_i, "dnull_i": dnull_i, "trans_i": trans_i,
+                                      "st_i": st_i, "sc_i": sc_i, "mig_i": mig_i})
 
     for r in ws.iter_rows(min_row=start, max_row=ws.max_row, values_only=True):
         if r is None:
@@ -463,122 +780,175 @@ def load_dmw_dest_defs(path: str) -> Dict[Tuple[str, str], Dict[str, str]]:
         if is_na(DT) or is_na(DC):
             continue
 
-        dmw_type = vals[dtype_i] if dtype_i is not None and dtype_i < len(vals) else ""
-        dmw_len  = vals[dlen_i]  if dlen_i  is not None and dlen_i  < len(vals) else ""
-        dmw_null = vals[dnull_i] if dnull_i is not None and dnull_i < len(vals) else ""
-        dmw_tran = vals[trans_i] if trans_i is not None and trans_i < len(vals) else ""
-
-        dmw_type_full = s(dmw_type).upper()
-        if dmw_len and "(" not in dmw_type_full and ")" not in dmw_type_full:
-            dmw_type_full = f"{dmw_type_full}({s(dmw_len)})"
+        ST = vals[st_i] if st_i is not None and st_i < len(vals) else ""
+        SC = vals[sc_i] if sc_i is not None and sc_i < len(vals) else ""
 
-        out[(s(DT).upper(), s(DC).upper())] = {
-            "type": dmw_type_full,
-            "nullable": normalize_nullable(dmw_null),
-            "transform": s(dmw_tran),
-        }
+        out[(s(DT).upper(), s(DC).upper())] = mapping_def(
+            vals[dtype_i] if dtype_i is not None and dtype_i < len(vals) else "",
+            vals[dlen_i]  if dlen_i  is not None and dlen_i  < len(vals) else "",
+            vals[dnull_i] if dnull_i is not None and dnull_i < len(vals) else "",
+            vals[trans_i] if trans_i is not None and trans_i < len(vals) else "",
+            source=f"{ST}.{SC}",
+            migrating=vals[mig_i] if mig_i is not None and mig_i < len(vals) else "",
+            present=present,
+        )
 
     wb.close()
     return out
 
-def dmw_drift(prev: Dict[str, Set[str]], curr: Dict[str, Set[str]]):
+def dest_keys_from_defs(defs: Dict[Tuple[str, str], Dict]) -> Dict[str, Set[str]]:
+    """Same shape as load_dmw_dest_keys(), derived from already-loaded defs (no second workbook pass)."""
+    out: Dict[str, Set[str]] = {}
+    for t, c in defs.keys():
+        out.setdefault(t, set()).add(c)
+    return out
+
+def dmw_drift(prev: Dict[str, Set[str]], curr: Dict[str, Set[str]],
+              prev_defs: Optional[Dict[Tuple[str, str], Dict]] = None,
+              curr_defs: Optional[Dict[Tuple[str, str], Dict]] = None):
+    """
+    added/removed: key-level drift (Rule6A).
+    modified: [(T, C, "field, field")] from the fingerprint join when defs are given.
+    """
     prev_keys = {(t, c) for t, cols in prev.items() for c in cols}
     curr_keys = {(t, c) for t, cols in curr.items() for c in cols}
     added = sorted(curr_keys - prev_keys)
     removed = sorted(prev_keys - curr_keys)
     modified: List[Tuple[str, str, str]] = []
+    if prev_defs is not None and curr_defs is not None:
+        modified = [(t, c, ", ".join(changed)) for t, c, changed in mapping_drift(prev_defs, curr_defs)]
     return added, removed, modified
 
 # ----------------------------------------------------
-# MAIN VALIDATION
+# Rule5 batch: many reference DMWs against one master index
 # ----------------------------------------------------
-def validate(dmw_xlsx, ddl_sql, out_xlsx, ai_cfg, prev_dmw=None, prev_ddl=None, ref_dmw=None, master_dmw=None):
-    #ddl_curr = parse_ddl(ddl_sql)
-    from parse_ddl_v2 import parse_ddl_v2
-    ddl_curr = parse_ddl_v2(ddl_sql)
-    ddl_prev = parse_ddl(prev_ddl) if prev_ddl else None
-
-    prev_keys_by_table = load_dmw_dest_keys(prev_dmw) if prev_dmw else None
-    prev_defs = load_dmw_dest_defs(prev_dmw) if prev_dmw else None
+RULE5_HEADER = ["Master_Table", "Reference_Table", "Column", "Issue", "Details", "Reference_File"]
 
-    master_keys = load_dmw_dest_keys(master_dmw) if master_dmw else None
-    ref_keys = load_dmw_dest_keys(ref_dmw) if ref_dmw else None
+def expand_ref_paths(ref_dmw) -> List[str]:
+    """
+    --ref-dmw accepts one path or a list; each entry is a workbook or a directory
+    (every *.xlsx inside, sorted, skipping Excel "~$" lock files). Order is kept.
+    """
+    if not ref_dmw:
+        return []
+    entries = [ref_dmw] if isinstance(ref_dmw, (str, Path)) else list(ref_dmw)
+    out: List[str] = []
+    for e in entries:
+        p = Path(e)
+        if p.is_dir():
+            out.extend(str(x) for x in sorted(p.glob("*.xlsx")) if not x.name.startswith("~$"))
+        else:
+            out.append(str(p))
+    return out
 
-    wb_data = load_workbook(dmw_xlsx, read_only=True, data_only=True)
-    ws_data = wb_data.active
+def rule5_check(ref_keys: Dict[str, Set[str]],
+                master_keys: Dict[str, Set[str]],
+                ref_name: str = "") -> Tuple[List[List[str]], Set[str]]:
+    """Reference tables must be a subset of master tables. Returns (Rule5 sheet rows, failing tables)."""
+    rows: List[List[str]] = []
+    fail_tables: Set[str] = set()
+    for rt, rcols in ref_keys.items():
+        mcols = master_keys.get(rt, set())
+        if not mcols:
+            for c in sorted(rcols):
+                rows.append([rt, rt, c, "MASTER_TABLE_MISSING", "Reference table exists but master table not found", ref_name])
+            fail_tables.add(rt)
+            continue
+        extra = sorted(rcols - mcols)
+        for c in extra:
+            rows.append([rt, rt, c, "NOT_IN_MASTER", "Reference column not found in master table (ref must be subset)", ref_name])
+            fail_tables.add(rt)
+    return rows, fail_tables
 
-    header_row = detect_header_row_flexible(ws_data, min_non_empty=10, max_scan=30, default_row=2)
-    data_start = header_row + 1
-    columns, lookup = build_header_index(ws_data, header_row)
+_RULE5_MASTER: Optional[Dict[str, Set[str]]] = None
 
-    # Core identity
-    st_i = resolve_col(lookup, "Source Table")
-    sc_i = resolve_col(lookup, "Source Column Name", prefer_after=st_i if st_i is not None else None)
-    dt_i = resolve_col(lookup, "Destination Table")
-    dc_i = resolve_col(lookup, "Destination Column Name", prefer_after=dt_i if dt_i is not None else None)
+def _rule5_init(master_keys: Dict[str, Set[str]]) -> None:
+    # pool initializer: ship the master index once per worker process, not once per task
+    global _RULE5_MASTER
+    _RULE5_MASTER = master_keys
 
-    # Rule1 columns (destination fields are duplicated in real DMW; anchor after destination column)
-    mig_i   = resolve_col(lookup, "Migrating Column", prefer_before=dt_i)
-    rsn_i   = resolve_col(lookup, "Reason for Not Migrating", prefer_before=dt_i)
-    dtype_i = resolve_col(lookup, "Destination Data Type", prefer_after=dc_i)
-    dlen_i  = resolve_col(lookup, "Destination Data Length", prefer_after=dc_i)
-    dnull_i = resolve_col(lookup, "Destination Nullable", prefer_after=dc_i)
-    trans_i = resolve_col(lookup, "Transformation Logic", prefer_after=dc_i)
+def _rule5_task(path: str) -> Tuple[List[List[str]], Set[str]]:
+    return rule5_check(load_dmw_dest_keys(path), _RULE5_MASTER or {}, Path(path).name)
 
-    # Rule2 columns
-    intro_i = resolve_col(lookup, "Introduced Sprint")
-    last_i  = resolve_col(lookup, "Last Updated Sprint")
-    clog_i  = resolve_col(lookup, "Change Log")
-
-    out_wb = Workbook()
-    ws_main = out_wb.active
-    ws_main.title = "Baseline Data Model_output"
-
-    ws_r4 = out_wb.create_sheet("Rule4_DDL_Mismatch")
-    ws_r4.append(["Table", "Column", "Issue", "Details"])
+def rule5_batch(master_keys: Dict[str, Set[str]],
+                ref_paths: List[str],
+                workers: int = 1) -> List[Tuple[List[List[str]], Set[str]]]:
+    """
+    Check every reference workbook against the one master index.
+    Results are returned in ref_paths order; with workers > 1 the reference
+    workbooks are parsed and checked in a process pool.
+    """
+    if workers <= 1 or len(ref_paths) <= 1:
+        return [rule5_check(load_dmw_dest_keys(p), master_keys, Path(p).name) for p in ref_paths]
 
-    ws_r3 = out_wb.create_sheet("Rule3_Table_Mismatch")
-    ws_r3.append(["Table", "Issue", "Details"])
+    from concurrent.futures import ProcessPoolExecutor
 
-    ws_r5 = out_wb.create_sheet("Rule5_Ref_Master_Mismatch")
-    ws_r5.append(["Master_Table", "Reference_Table", "Column", "Issue", "Details"])
+    logging.info("Rule5: checking %d reference DMWs on %d workers", len(ref_paths), min(workers, len(ref_paths)))
+    with ProcessPoolExecutor(max_workers=min(workers, len(ref_paths)),
+                             initializer=_rule5_init, initargs=(master_keys,)) as pool:
+        return list(pool.map(_rule5_task, ref_paths))
 
-    ws_r6 = out_wb.create_sheet("Rule6_DMW_Drift")
-    ws_r6.append(["Dest_Table", "Dest_Column", "Issue", "Details"])
+# ----------------------------------------------------
+# Table-partitioned evaluation (Rule1/2 + per-table Rule4 / Rule6B)
+# ----------------------------------------------------
+RULE_COLS = [
+    "Rule1", "Rule2", "Rule3", "Rule4",
+    "Rule5", "Rule6", "Rule7",
+    "Validation_Status", "Validation_Remarks", "AI_Suggestion"
+]
+
+# Column indices a partition needs to evaluate rows (resolved once in validate()).
+ROW_INDEX_KEYS = (
+    "st_i", "sc_i", "dt_i", "dc_i",
+    "mig_i", "rsn_i", "dtype_i", "dlen_i", "dnull_i", "trans_i",
+    "intro_i", "last_i", "clog_i",
+)
 
-    ws_r7 = out_wb.create_sheet("Rule7_DDL_Drift")
-    ws_r7.append(["Object", "Name", "Issue", "Details"])
+def project_row_index(ix: Dict[str, Optional[int]]) -> Tuple[List[int], Dict[str, Optional[int]]]:
+    """
+    Workers only need the rule columns, not all 60+ DMW columns.
+    Returns (source column positions to keep, index remapped onto the projected row).
+    """
+    keep = sorted({i for i in ix.values() if i is not None})
+    pos = {i: n for n, i in enumerate(keep)}
+    return keep, {k: (pos[i] if i is not None else None) for k, i in ix.items()}
 
-    RULE_COLS = [
-        "Rule1", "Rule2", "Rule3", "Rule4",
-        "Rule5", "Rule6", "Rule7",
-        "Validation_Status", "Validation_Remarks", "AI_Suggestion"
-    ]
-    ws_main.append(columns + RULE_COLS)
+class PartitionEvaluator:
+    """
+    Streaming evaluator for one partition of destination tables.
 
-    dest_map: Dict[str, Set[str]] = {}
-    dmw_defs: Dict[Tuple[str, str], Dict[str, str]] = {}    # current defs
-    baseline_tables: Set[str] = set()
-    curr_keys_by_table: Dict[str, Set[str]] = {}
+    Rows are fed in sheet order through add() (Rule1/Rule2 + seed results);
+    finish() runs the per-table Rule4 and Rule6B checks and returns the
+    partition result the parent merges:
+      {"seeds": [(seq, tail)], "dest_map", "r4_rows": {table: [...]},
+       "mismatch_keys", "table_has_rule4_issue", "r6b_rows": [(first_seq, [...])]}
+    """
 
-    # -----------------------------
-    # Single pass rows
-    # -----------------------------
-    for row_cells in ws_data.iter_rows(min_row=data_start, max_row=ws_data.max_row, values_only=False):
-        vals = [s(c.value) for c in row_cells[:len(columns)]]
-        if all(v == "" for v in vals):
-            break
+    def __init__(self, ix: Dict[str, Optional[int]]):
+        self.ix = ix
+        self.present = mapping_fields_present(ix)
+        self.seeds: List[Tuple[int, List[str]]] = []
+        self.dest_map: Dict[str, Set[str]] = {}
+        self.dmw_defs: Dict[Tuple[str, str], Dict] = {}
+        self.first_seq: Dict[Tuple[str, str], int] = {}
+
+    def add(self, seq: int, vals: List[str], strike: bool) -> None:
+        ix = self.ix
+        st_i, sc_i, dt_i, dc_i = ix["st_i"], ix["sc_i"], ix["dt_i"], ix["dc_i"]
+        mig_i, rsn_i, dtype_i, dlen_i = ix["mig_i"], ix["rsn_i"], ix["dtype_i"], ix["dlen_i"]
+        dnull_i, trans_i = ix["dnull_i"], ix["trans_i"]
+        intro_i, last_i, clog_i = ix["intro_i"], ix["last_i"], ix["clog_i"]
 
         # Strikethrough => N/A for all rules
-        if any_strikethrough(row_cells):
-            ws_main.append(vals + [
+        if strike:
+            self.seeds.append((seq, [
                 "N/A", "N/A", "N/A", "N/A",
                 "N/A", "N/A", "N/A",
                 "N/A",
                 "Strikethrough: field cancelled by Apps team",
                 ""
-            ])
-            continue
+            ]))
+            return
 
         ST = vals[st_i] if st_i is not None and st_i < len(vals) else ""
         SC = vals[sc_i] if sc_i is not None and sc_i < len(vals) else ""
@@ -590,14 +960,14 @@ def validate(dmw_xlsx, ddl_sql, out_xlsx, ai_cfg, prev_dmw=None, prev_ddl=None,
 
         # Helper row
         if source_na and dest_na:
-            ws_main.append(vals + [
+            self.seeds.append((seq, [
                 "N/A", "N/A", "N/A", "N/A",
                 "N/A", "N/A", "N/A",
                 "N/A",
                 "Source and Destination are NA — helper row",
                 ""
-            ])
-            continue
+            ]))
+            return
 
         # Destination missing => Rule4 N/A (others run where applicable)
         if is_na(DT) or is_na(DC):
@@ -609,20 +979,18 @@ def validate(dmw_xlsx, ddl_sql, out_xlsx, ai_cfg, prev_dmw=None, prev_ddl=None,
             if extra:
                 remarks = f"{remarks} | {extra}"
 
-            ws_main.append(vals + [
+            self.seeds.append((seq, [
                 r1, r2, "N/A", "N/A",
                 "N/A", "N/A", "N/A",
                 status, remarks, ""
-            ])
-            continue
+            ]))
+            return
 
         # Normal row
         tblU = s(DT).upper()
         colU = s(DC).upper()
 
-        baseline_tables.add(tblU)
-        dest_map.setdefault(tblU, set()).add(colU)
-        curr_keys_by_table.setdefault(tblU, set()).add(colU)
+        self.dest_map.setdefault(tblU, set()).add(colU)
 
         r1, r1r = rule1_check(vals, mig_i=mig_i, rsn_i=rsn_i, dtype_i=dtype_i, dlen_i=dlen_i, dnull_i=dnull_i, trans_i=trans_i)
         r2, r2r = rule2_check(vals, intro_i=intro_i, last_i=last_i, log_i=clog_i)
@@ -630,85 +998,1027 @@ def validate(dmw_xlsx, ddl_sql, out_xlsx, ai_cfg, prev_dmw=None, prev_ddl=None,
         remarks = " | ".join([x for x in [r1r, r2r] if x])
 
         # seed; Rule3/4/5/6/7 will be propagated later
-        ws_main.append(vals + [
+        self.seeds.append((seq, [
             r1, r2, "PASS", "PASS",
             "PASS", "PASS", "PASS",
             status, remarks, ""
-        ])
+        ]))
 
         # store current DMW defs for Rule4A + Rule6B
-        dmw_type = vals[dtype_i] if dtype_i is not None and dtype_i < len(vals) else ""
-        dmw_len  = vals[dlen_i]  if dlen_i  is not None and dlen_i  < len(vals) else ""
-        dmw_null = vals[dnull_i] if dnull_i is not None and dnull_i < len(vals) else ""
-        dmw_tran = vals[trans_i] if trans_i is not None and trans_i < len(vals) else ""
-
-        dmw_type_full = s(dmw_type).upper()
-        if dmw_len and "(" not in dmw_type_full and ")" not in dmw_type_full:
-            dmw_type_full = f"{dmw_type_full}({s(dmw_len)})"
-
-        dmw_defs[(tblU, colU)] = {
-            "type": dmw_type_full,
-            "nullable": normalize_nullable(dmw_null),
-            "transform": s(dmw_tran),
+        self.first_seq.setdefault((tblU, colU), seq)
+        self.dmw_defs[(tblU, colU)] = mapping_def(
+            vals[dtype_i] if dtype_i is not None and dtype_i < len(vals) else "",
+            vals[dlen_i]  if dlen_i  is not None and dlen_i  < len(vals) else "",
+            vals[dnull_i] if dnull_i is not None and dnull_i < len(vals) else "",
+            vals[trans_i] if trans_i is not None and trans_i < len(vals) else "",
+            source=f"{ST}.{SC}",
+            migrating=vals[mig_i] if mig_i is not None and mig_i < len(vals) else "",
+            present=self.present,
+        )
+
+    def drain_seeds(self) -> List[Tuple[int, List[str]]]:
+        """Hand over the seeds produced so far (streaming callers spool them with their rows)."""
+        out, self.seeds = self.seeds, []
+        return out
+
+    def finish(self,
+               ddl: Dict[str, Dict[str, Dict[str, str]]],
+               prev_defs: Optional[Dict[Tuple[str, str], Dict]]) -> Dict:
+        dest_map = self.dest_map
+        dmw_defs = self.dmw_defs
+
+        # ------------------------------------------------
+        # Rule4: DDL alignment for this partition's tables
+        # ------------------------------------------------
+        r4_rows: Dict[str, List[List[str]]] = {}
+        mismatch_keys: Set[Tuple[str, str]] = set()
+        table_has_rule4_issue: Set[str] = set()
+
+        for tbl, ddl_cols in ddl.items():
+            tblU = tbl.upper()
+            ddl_set = set(ddl_cols.keys())
+            dmw_set = dest_map.get(tblU, set())
+            out = r4_rows.setdefault(tblU, [])
+
+            # DMW_ONLY (exists in DMW, not in DDL)
+            for col in sorted(dmw_set - ddl_set):
+                out.append([tblU, col, "DMW_ONLY", "Destination column appears in DMW but not in DDL"])
+                mismatch_keys.add((tblU, col))
+                table_has_rule4_issue.add(tblU)
+
+            # Type / Nullable mismatches
+            for col in sorted(dmw_set & ddl_set):
+                ddl_def = ddl_cols.get(col, {})
+                dmw_def = dmw_defs.get((tblU, col), {})
+
+                ddl_type = ddl_def.get("type", "")
+                dmw_type = dmw_def.get("type", "")
+
+                ddl_null = ddl_def.get("nullable", "")
+                dmw_null = dmw_def.get("nullable", "")
+
+                if ddl_type and dmw_type and not type_compatible(dmw_type, ddl_type):
+                    out.append([tblU, col, "TYPE_MISMATCH", f"DMW type={dmw_type} vs DDL type={ddl_type}"])
+                    mismatch_keys.add((tblU, col))
+                    table_has_rule4_issue.add(tblU)
+
+                if ddl_null and dmw_null and ddl_null != dmw_null:
+                    out.append([tblU, col, "NULLABLE_MISMATCH", f"DMW nullable={dmw_null} vs DDL nullable={ddl_null}"])
+                    mismatch_keys.add((tblU, col))
+                    table_has_rule4_issue.add(tblU)
+
+            # MISSING_IN_DMW (exists in DDL, not in DMW)
+            if dmw_set:
+                for col in sorted(ddl_set - dmw_set):
+                    out.append([tblU, col, "MISSING_IN_DMW", "Column exists in DDL but not mapped in DMW"])
+                    table_has_rule4_issue.add(tblU)
+
+        # ------------------------------------------------
+        # Rule6B (INFO only): fingerprint join for keys present in both prev and current
+        # ------------------------------------------------
+        r6b_rows: List[Tuple[int, List[List[str]]]] = []
+        if prev_defs is not None:
+            for t, c, changed in mapping_drift(prev_defs, dmw_defs):
+                key = (t, c)
+                r6b_rows.append((self.first_seq[key], mapping_issue_rows(t, c, changed, prev_defs[key], dmw_defs[key])))
+
+        return {
+            "seeds": self.seeds,
+            "dest_map": dest_map,
+            "r4_rows": r4_rows,
+            "mismatch_keys": mismatch_keys,
+            "table_has_rule4_issue": table_has_rule4_issue,
+            "r6b_rows": r6b_rows,
         }
 
+def evaluate_partition(task: Dict) -> Dict:
+    """
+    Process-pool entry point for one partition.
+
+    task = {
+      "ix":        column indices (ROW_INDEX_KEYS),
+      "rows":      [(seq, vals, strike), ...] in sheet order, or
+      "rows_path": a RowSpool file of those records (streamed, not held in memory),
+      "ddl":       {table: cols} current DDL for the partition's tables (DDL order),
+      "prev_defs": {(T, C): def} previous DMW defs for the partition's tables, or None,
+    }
+    """
+    ev = PartitionEvaluator(task["ix"])
+    for seq, vals, strike in task["rows"] if "rows" in task else read_spool(task["rows_path"]):
+        ev.add(seq, vals, strike)
+    return ev.finish(task["ddl"], task["prev_defs"])
+
+def plan_partitions(table_rows: Dict[str, int], workers: int) -> List[List[str]]:
+    """
+    Greedy largest-first bin packing of destination tables into `workers` buckets
+    by row count. Deterministic: ties broken by table name.
+    """
+    buckets: List[List[str]] = [[] for _ in range(max(1, workers))]
+    load = [0] * len(buckets)
+    for t in sorted(table_rows, key=lambda k: (-table_rows[k], k)):
+        b = min(range(len(buckets)), key=lambda n: (load[n], n))
+        buckets[b].append(t)
+        load[b] += table_rows[t]
+    return [b for b in buckets if b]
+
+def run_partitions(rows: Iterable[Tuple[int, List[str], bool]],
+                   ix: Dict[str, Optional[int]],
+                   ddl_curr: Dict[str, Dict[str, Dict[str, str]]],
+                   prev_defs: Optional[Dict[Tuple[str, str], Dict]],
+                   workers: int) -> List[Dict]:
+    """
+    workers <= 1: evaluate everything in-process as a single partition.
+    workers  > 1: shard rows by destination table into a process pool; the
+                  projected rows go through disk (a RowSpool, then one spool file
+                  per partition that its process streams back), not memory.
+    rows is consumed once, so it may be a stream (e.g. read back from a RowSpool).
+    """
+    if workers <= 1:
+        return [evaluate_partition({"ix": ix, "rows": rows, "ddl": ddl_curr, "prev_defs": prev_defs})]
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    dt_i = ix["dt_i"]
+    keep, pix = project_row_index(ix)
+
+    # the plan needs every table's row count, so rows are spooled once before routing
+    table_rows: Dict[str, int] = {}
+    with tempfile.TemporaryDirectory(prefix="dmw-parts-") as tmp, RowSpool() as projected:
+        for seq, vals, strike in rows:
+            DT = s(vals[dt_i] if dt_i is not None and dt_i < len(vals) else "").upper()
+            table_rows[DT] = table_rows.get(DT, 0) + 1
+            projected.put((DT, seq, [vals[i] if i < len(vals) else "" for i in keep], strike))
+
+        plan = plan_partitions(table_rows, workers)
+        part_of = {t: n for n, tables in enumerate(plan) for t in tables}
+        parts = [RowSpool(path=os.path.join(tmp, f"part{n}.rows")) for n in range(len(plan))]
+        for DT, seq, proj, strike in projected.records():   # sheet order, so each part stays sorted
+            parts[part_of[DT]].put((seq, proj, strike))
+
+        tasks = []
+        for tables, part in zip(plan, parts):
+            part.close()
+            tset = set(tables)
+            tasks.append({
+                "ix": pix,
+                "rows_path": part.path,
+                "ddl": {t: cols for t, cols in ddl_curr.items() if t.upper() in tset},
+                "prev_defs": ({k: v for k, v in prev_defs.items() if k[0] in tset}
+                              if prev_defs is not None else None),
+            })
+
+        logging.info("Partitioned %d rows / %d tables into %d tasks", projected.count, len(table_rows), len(tasks))
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks)) or 1) as pool:
+            return list(pool.map(evaluate_partition, tasks))
+
+# ----------------------------------------------------
+# Pipeline stages (reader → rules → writer) over bounded queues
+# ----------------------------------------------------
+PIPELINE_CHUNK = 512   # rows per queue item (amortises queue/lock overhead)
+PIPELINE_DEPTH = 8     # chunks in flight per queue before the producer blocks
+
+_END = object()
+
+class _StageError:
+    def __init__(self, exc: BaseException):
+        self.exc = exc
+
+def pipelined(items: Iterable, *, depth: int = PIPELINE_DEPTH, name: str = "dmw-stage") -> Iterator:
+    """
+    Run a producer iterable on its own thread and yield its items through a
+    bounded queue (back-pressure). Producer exceptions are re-raised in the
+    consumer; if the consumer stops early the producer is told to stop.
+    """
+    q: "queue.Queue" = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+
+    def _put(item) -> bool:
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _produce():
+        try:
+            for item in items:
+                if not _put(item):
+                    return
+        except BaseException as e:
+            _put(_StageError(e))
+            return
+        _put(_END)
+
+    t = threading.Thread(target=_produce, name=name, daemon=True)
+    t.start()
+    try:
+        while True:
+            item = q.get()
+            if item is _END:
+                break
+            if isinstance(item, _StageError):
+                raise item.exc
+            yield item
+    finally:
+        stop.set()
+        t.join()
+
+def iter_row_chunks(ws, min_row: int, ncols: int, chunk: int = PIPELINE_CHUNK) -> Iterator[List[Tuple[List[str], bool]]]:
+    """Reader stage: decode DMW rows as (vals, strikethrough) in chunks; stops at the first empty row."""
+    buf: List[Tuple[List[str], bool]] = []
+    for row_cells in ws.iter_rows(min_row=min_row, max_row=ws.max_row, values_only=False):
+        vals = [s(c.value) for c in row_cells[:ncols]]
+        if all(v == "" for v in vals):
+            break
+        buf.append((vals, any_strikethrough(row_cells)))
+        if len(buf) >= chunk:
+            yield buf
+            buf = []
+    if buf:
+        yield buf
+
+class SheetWriter:
+    """
+    Writer stage: appends rows to a worksheet from its own thread, fed through a
+    bounded queue so row propagation and cell serialisation overlap.
+    threaded=False appends inline (same output, no thread). Use as a context
+    manager; close() drains the queue and re-raises any writer error.
+    """
+
+    def __init__(self, ws, *, threaded: bool = True, depth: int = PIPELINE_DEPTH, chunk: int = PIPELINE_CHUNK):
+        self.ws = ws
+        self.chunk = chunk
+        self._buf: List[List] = []
+        self._err: Optional[BaseException] = None
+        self._q: Optional["queue.Queue"] = queue.Queue(maxsize=depth) if threaded else None
+        self._t: Optional[threading.Thread] = None
+        if self._q is not None:
+            self._t = threading.Thread(target=self._run, name="dmw-writer", daemon=True)
+            self._t.start()
+
+    def _run(self) -> None:
+        while True:
+            rows = self._q.get()
+            if rows is _END:
+                return
+            if self._err is not None:
+                continue  # keep draining so the producer never blocks
+            try:
+                for r in rows:
+                    self.ws.append(r)
+            except BaseException as e:
+                self._err = e
+
+    def append(self, row: List) -> None:
+        if self._q is None:
+            self.ws.append(row)
+            return
+        self._buf.append(row)
+        if len(self._buf) >= self.chunk:
+            self._q.put(self._buf)
+            self._buf = []
+
+    def close(self) -> None:
+        if self._q is not None and self._t is not None:
+            if self._buf:
+                self._q.put(self._buf)
+                self._buf = []
+            self._q.put(_END)
+            self._t.join()
+            self._t = None
+        if self._err is not None:
+            raise self._err
+
+    def __enter__(self) -> "SheetWriter":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+def _read_chunks(f) -> Iterator[Tuple]:
+    while True:
+        try:
+            chunk = pickle.load(f)
+        except EOFError:
+            return
+        yield from chunk
+
+def read_spool(path: str) -> Iterator[Tuple]:
+    """Records of a closed RowSpool file, in put() order (e.g. in another process)."""
+    with open(path, "rb") as f:
+        yield from _read_chunks(f)
+
+class RowSpool:
+    """
+    Disk-backed FIFO for baseline rows between the read pass and the write pass.
+    Records are pickled in chunks to an anonymous temp file (or to `path`, to
+    be read back elsewhere with read_spool() once closed), so memory stays
+    bounded by one chunk regardless of DMW size. Iterating yields
+    (seq, vals, strike, tail) in append order; seq is the append position.
+    put() / records() store and replay arbitrary picklable records instead.
+    """
+
+    def __init__(self, chunk: int = PIPELINE_CHUNK, path: Optional[str] = None):
+        self.chunk = chunk
+        self.count = 0
+        self.path = path
+        self._f = open(path, "w+b") if path else tempfile.TemporaryFile(prefix="dmw-rows-")
+        self._buf: List[Tuple] = []
+
+    def append(self, vals: List[str], strike: bool, tail: Optional[List[str]] = None) -> int:
+        self.put((vals, strike, tail))
+        return self.count - 1
+
+    def put(self, record: Tuple) -> None:
+        self._buf.append(record)
+        self.count += 1
+        if len(self._buf) >= self.chunk:
+            self._flush()
+
+    def _flush(self) -> None:
+        if self._buf:
+            pickle.dump(self._buf, self._f, protocol=pickle.HIGHEST_PROTOCOL)
+            self._buf = []
+
+    def records(self) -> Iterator[Tuple]:
+        self._flush()
+        self._f.seek(0)
+        yield from _read_chunks(self._f)
+        self._f.seek(0, os.SEEK_END)
+
+    def __iter__(self) -> Iterator[Tuple[int, List[str], bool, Optional[List[str]]]]:
+        for seq, (vals, strike, tail) in enumerate(self.records()):
+            yield seq, vals, strike, tail
+
+    def close(self) -> None:
+        if self.path and not self._f.closed:
+            self._flush()   # kept for read_spool()
+        self._f.close()
+
+    def __enter__(self) -> "RowSpool":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+class SpoolSheet:
+    """
+    Worksheet stand-in for --output-mode annotate: result rows
+    ([row number] + keys + rule columns) are spooled to disk; rows without a
+    number (synthetic Rule6 REMOVED rows) are kept in `appended`.
+    """
+
+    def __init__(self):
+        self.spool = RowSpool()
+        self.appended: List[List] = []
+
+    def append(self, row: List) -> None:
+        if row[0] is None:
+            self.appended.append(row)
+        else:
+            self.spool.append(row, False)
+
+def _resolved(fn, *args) -> Future:
+    """Run fn now and wrap its outcome in a Future (used when the pipeline is off)."""
+    f: Future = Future()
+    try:
+        f.set_result(fn(*args))
+    except Exception as e:
+        f.set_exception(e)
+    return f
+
+def load_table_details_tables(path: str) -> Set[str]:
+    """Rule3 input: upper-cased table names listed on the "Table Details" sheet (empty if absent)."""
+    wb_td = load_workbook(path, read_only=True, data_only=True)
+    ws_td = None
+
+    # Locate "Table Details" sheet (robust match)
+    for sn in wb_td.sheetnames:
+        if norm_col(sn) == norm_col("TABLE DETAILS"):
+            ws_td = wb_td[sn]
+            break
+
+    table_details_set: Set[str] = set()
+
+    if ws_td is not None:
+        hr = detect_header_row_flexible(
+            ws_td,
+            min_non_empty=1,
+            max_scan=10,
+            default_row=1
+        )
+        tcols, tlookup = build_header_index(ws_td, hr)
+        start = hr + 1
+
+        # Resolve table name column safely
+        table_i = (
+            resolve_col(tlookup, "Table Name")
+            or resolve_col(tlookup, "Destination Table")
+        )
+
+        if table_i is None:
+            for k, idxs in tlookup.items():
+                if "TABLE" in k:
+                    table_i = idxs[0]
+                    break
+
+        if table_i is not None:
+            for r in ws_td.iter_rows(
+                min_row=start,
+                max_row=ws_td.max_row,
+                values_only=True
+            ):
+                if not r:
+                    break
+
+                vals = [s(v) for v in r[:len(tcols)]]
+                if all(v == "" for v in vals):
+                    break
+
+                tname = vals[table_i] if table_i < len(vals) else ""
+                if not is_na(tname):
+                    table_details_set.add(s(tname).upper())
+
+    wb_td.close()
+    return table_details_set
+
+def resolve_dmw_layout(ws) -> Tuple[int, List[str], Dict[str, Optional[int]]]:
+    """Detect the DMW header row and resolve rule columns: (data_start, columns, ix)."""
+    header_row = detect_header_row_flexible(ws, min_non_empty=10, max_scan=30, default_row=2)
+    columns, lookup = build_header_index(ws, header_row)
+
+    # Core identity
+    st_i = resolve_col(lookup, "Source Table")
+    sc_i = resolve_col(lookup, "Source Column Name", prefer_after=st_i if st_i is not None else None)
+    dt_i = resolve_col(lookup, "Destination Table")
+    dc_i = resolve_col(lookup, "Destination Column Name", prefer_after=dt_i if dt_i is not None else None)
+
+    # Rule1 columns (destination fields are duplicated in real DMW; anchor after destination column)
+    mig_i   = resolve_col(lookup, "Migrating Column", prefer_before=dt_i)
+    rsn_i   = resolve_col(lookup, "Reason for Not Migrating", prefer_before=dt_i)
+    dtype_i = resolve_col(lookup, "Destination Data Type", prefer_after=dc_i)
+    dlen_i  = resolve_col(lookup, "Destination Data Length", prefer_after=dc_i)
+    dnull_i = resolve_col(lookup, "Destination Nullable", prefer_after=dc_i)
+    trans_i = resolve_col(lookup, "Transformation Logic", prefer_after=dc_i)
+
+    # Rule2 columns
+    intro_i = resolve_col(lookup, "Introduced Sprint")
+    last_i  = resolve_col(lookup, "Last Updated Sprint")
+    clog_i  = resolve_col(lookup, "Change Log")
+
+    return header_row + 1, columns, dict(zip(ROW_INDEX_KEYS, (
+        st_i, sc_i, dt_i, dc_i,
+        mig_i, rsn_i, dtype_i, dlen_i, dnull_i, trans_i,
+        intro_i, last_i, clog_i,
+    )))
+
+# ----------------------------------------------------
+# Results sidecars (JSONL / CSV / Parquet) written alongside the XLSX
+# ----------------------------------------------------
+RESULT_FORMATS = ("jsonl", "csv", "parquet")
+RESULT_ROW_COLS = ["Row", "Dest_Table", "Dest_Column"] + RULE_COLS[:-1]  # no AI column
+PARQUET_BATCH = 8192
+
+class _JsonlTable:
+    def __init__(self, path: str, cols: List[str]):
+        self.cols = cols
+        self._f = open(path, "w", encoding="utf-8")
+
+    def write(self, row: List) -> None:
+        self._f.write(json.dumps(dict(zip(self.cols, row)), ensure_ascii=False) + "\n")
+
+    def close(self) -> None:
+        self._f.close()
+
+class _CsvTable:
+    def __init__(self, path: str, cols: List[str]):
+        self._f = open(path, "w", encoding="utf-8", newline="")
+        self._w = csv.writer(self._f)
+        self._w.writerow(cols)
+
+    def write(self, row: List) -> None:
+        self._w.writerow(row)
+
+    def close(self) -> None:
+        self._f.close()
+
+class _ParquetTable:
+    """All columns are strings except Row (int64); rows are flushed in PARQUET_BATCH row groups."""
+
+    def __init__(self, path: str, cols: List[str]):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise RuntimeError("Parquet results need pyarrow (pip install pyarrow)") from e
+        self._pa = pa
+        self.cols = cols
+        self.schema = pa.schema([(c, pa.int64() if c == "Row" else pa.string()) for c in cols])
+        self._w = pq.ParquetWriter(path, self.schema)
+        self._buf: List[List] = []
+
+    def write(self, row: List) -> None:
+        self._buf.append(row)
+        if len(self._buf) >= PARQUET_BATCH:
+            self._flush()
+
+    def _flush(self) -> None:
+        if self._buf:
+            cols = list(zip(*self._buf))
+            self._w.write_table(self._pa.Table.from_arrays(
+                [self._pa.array(c, type=f.type) for c, f in zip(cols, self.schema)], schema=self.schema))
+            self._buf = []
+
+    def close(self) -> None:
+        self._flush()
+        self._w.close()
+
+_TABLE_WRITERS = {"jsonl": _JsonlTable, "csv": _CsvTable, "parquet": _ParquetTable}
+
+class ResultsSink:
+    """
+    Machine-readable copies of the run's results, written while it streams:
+      <stem>.rows.<fmt>          one record per baseline row (RESULT_ROW_COLS)
+      <stem>.<rule sheet>.<fmt>  one table per rule sheet (same columns as the sheet)
+    Row is the DMW sheet row number (empty for synthetic Rule6 REMOVED rows).
+    Several formats may be written at once; with no formats this is a no-op.
+    """
+
+    def __init__(self, out_dir: str, stem: str, formats: Iterable[str] = ()):
+        self.formats = list(dict.fromkeys(f.lower() for f in formats))
+        bad = [f for f in self.formats if f not in RESULT_FORMATS]
+        if bad:
+            raise ValueError(f"Unknown results format(s): {', '.join(bad)}")
+        self.out_dir = out_dir
+        self.stem = stem
+        self.paths: List[str] = []
+        self._tables: Dict[str, List] = {}
+        if self.formats:
+            os.makedirs(out_dir, exist_ok=True)
+            self._tables["rows"] = self._open("rows", RESULT_ROW_COLS)
+
+    def _open(self, name: str, cols: List[str]) -> List:
+        out = []
+        for fmt in self.formats:
+            path = os.path.join(self.out_dir, f"{self.stem}.{name}.{fmt}")
+            out.append(_TABLE_WRITERS[fmt](path, cols))
+            self.paths.append(path)
+        return out
+
+    def row(self, rownum: Optional[int], table: str, column: str, rule_vals: List[str]) -> None:
+        for w in self._tables.get("rows", ()):
+            w.write([rownum, table, column] + list(rule_vals))
+
+    def tee(self, ws, name: str) -> "TeeSheet":
+        """Wrap a rule worksheet so every append also lands in the `name` issue table."""
+        return TeeSheet(ws, self, name)
+
+    def issue(self, name: str, row: List) -> None:
+        for w in self._tables.get(name, ()):
+            w.write([s(v) for v in row])
+
+    def close(self) -> None:
+        for writers in self._tables.values():
+            for w in writers:
+                w.close()
+        self._tables = {}
+
+class TeeSheet:
+    """Worksheet proxy: the first append is the header (opens the sidecar tables), the rest are issues."""
+
+    def __init__(self, ws, sink: ResultsSink, name: str):
+        self.ws = ws
+        self.sink = sink
+        self.name = name
+        self._header = True
+
+    def append(self, row: List) -> None:
+        self.ws.append(row)
+        if not self.sink.formats:
+            return
+        if self._header:
+            self._header = False
+            self.sink._tables[self.name] = self.sink._open(self.name, [s(v) for v in row])
+            return
+        self.sink.issue(self.name, row)
+
+# ----------------------------------------------------
+# Progress events for validate(progress=...) / --progress-file
+# ----------------------------------------------------
+PROGRESS_INTERVAL = 0.5   # min seconds between row-count events
+
+class Progress:
+    """
+    Calls callback(event), event = {phase, rule, rows, total, rows_per_s,
+    eta_s, elapsed_s}: phase() always emits, rows() at most once per
+    `interval`. Rates and ETA are per phase. Without a callback only the
+    metrics are kept: time per phase, and rows / throughput at "done".
+    """
+
+    def __init__(self, callback: Optional[Callable[[Dict], None]] = None, interval: float = PROGRESS_INTERVAL):
+        self.callback = callback
+        self.interval = interval
+        self.started = self._phase_started = self._last = time.time()
+        self.name, self.rule, self.count, self.total = "start", None, 0, None
+        self._spent: Dict[str, float] = {}   # seconds per phase name (a phase may recur, e.g. rules)
+
+    def phase(self, name: str, rule: Optional[str] = None, total: Optional[int] = None, rows: int = 0) -> None:
+        now = time.time()
+        self._spent[self.name] = self._spent.get(self.name, 0.0) + now - self._phase_started
+        if name == "done":
+            for phase, spent in self._spent.items():
+                metrics.PHASE_SECONDS.labels(phase).observe(spent)
+            metrics.ROWS_TOTAL.inc(rows)
+            if rows and now > self.started:
+                metrics.ROWS_PER_SECOND.observe(rows / (now - self.started))
+        self.name, self.rule, self.total, self.count = name, rule, total, rows
+        self._phase_started = now
+        if self.callback is not None:
+            self._emit(now)
+
+    def rows(self, n: int) -> None:
+        if self.callback is None:
+            return
+        self.count = n
+        now = time.time()
+        if now - self._last >= self.interval:
+            self._emit(now)
+
+    def _emit(self, now: float) -> None:
+        self._last = now
+        spent = now - self._phase_started
+        rate = self.count / spent if self.count and spent > 0 else 0.0
+        eta = (self.total - self.count) / rate if rate and self.total and self.total > self.count else None
+        try:
+            self.callback({"phase": self.name, "rule": self.rule, "rows": self.count, "total": self.total,
+                           "rows_per_s": round(rate, 1), "eta_s": round(eta, 1) if eta is not None else None,
+                           "elapsed_s": round(now - self.started, 1)})
+        except Exception:
+            logging.exception("Progress callback failed")
+
+def progress_file(path: str) -> Callable[[Dict], None]:
+    """validate(progress=...) callback keeping the latest event in a JSON file (replaced atomically)."""
+    def write(event: Dict) -> None:
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(event, f)
+        os.replace(tmp, path)
+    return write
+
+# ----------------------------------------------------
+# Run summary (Summary_Stats sheet + <stem>.summary.json), counted while streaming
+# ----------------------------------------------------
+SUMMARY_SHEET = "Summary_Stats"
+SUMMARY_VALUES = ["PASS", "FAIL", "INFO", "N/A"]   # column order; anything else is appended
+
+def _value_cols(counters: Iterable[Dict[str, int]]) -> List[str]:
+    seen = {k for c in counters for k in c}
+    return [v for v in SUMMARY_VALUES if v in seen or v in ("PASS", "FAIL")] + sorted(seen - set(SUMMARY_VALUES))
+
+class RunSummary:
+    """
+    Streaming counters for one run:
+      rules[RuleN][value], status[value], tables[DEST_TABLE][status],
+      issues[sheet][issue type]
+    Fed by row() from the propagation pass and by tee()'d rule sheets.
+    """
+
+    def __init__(self):
+        self.rows = 0
+        self.rules: Dict[str, Dict[str, int]] = {r: {} for r in RULE_COLS[:7]}
+        self.status: Dict[str, int] = {}
+        self.tables: Dict[str, Dict[str, int]] = {}
+        self.issues: Dict[str, Dict[str, int]] = {}
+
+    def row(self, table: str, rule_vals: List[str], status: str) -> None:
+        self.rows += 1
+        for name, v in zip(RULE_COLS[:7], rule_vals):
+            c = self.rules[name]
+            c[v] = c.get(v, 0) + 1
+        self.status[status] = self.status.get(status, 0) + 1
+        t = self.tables.setdefault(s(table).upper() or "(none)", {})
+        t[status] = t.get(status, 0) + 1
+
+    def tee(self, ws, name: str) -> "IssueCounter":
+        self.issues.setdefault(name, {})
+        return IssueCounter(ws, self.issues[name])
+
+    def as_dict(self, **run_info) -> Dict:
+        return {
+            "run": run_info,
+            "rows": self.rows,
+            "status": self.status,
+            "rules": self.rules,
+            "tables": {t: self.tables[t] for t in sorted(self.tables)},
+            "issues": self.issues,
+        }
+
+    def write_sheet(self, ws) -> None:
+        """Blocks (rules, status, destination tables, rule-sheet issues) separated by a blank row."""
+        cols = _value_cols(self.rules.values())
+        ws.append(["Rule"] + cols + ["Total"])
+        for name, c in self.rules.items():
+            ws.append([name] + [c.get(v, 0) for v in cols] + [sum(c.values())])
+        ws.append([])
+
+        ws.append(["Validation_Status", "Count"])
+        for v in _value_cols([self.status]):
+            ws.append([v, self.status.get(v, 0)])
+        ws.append(["Total", self.rows])
+        ws.append([])
+
+        cols = _value_cols(self.tables.values())
+        ws.append(["Dest_Table"] + cols + ["Total"])
+        for t in sorted(self.tables):
+            c = self.tables[t]
+            ws.append([t] + [c.get(v, 0) for v in cols] + [sum(c.values())])
+        ws.append([])
+
+        ws.append(["Sheet", "Issue", "Count"])
+        for sheet, c in self.issues.items():
+            for issue in sorted(c):
+                ws.append([sheet, issue, c[issue]])
+
+    def write_json(self, path: str, **run_info) -> None:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.as_dict(**run_info), f, indent=2, ensure_ascii=False)
+
+class IssueCounter:
+    """Worksheet proxy counting rows per value of the sheet's "Issue" column (taken from the header)."""
+
+    def __init__(self, ws, counts: Dict[str, int]):
+        self.ws = ws
+        self.counts = counts
+        self._issue_i: Optional[int] = None
+        self._header = True
+
+    def append(self, row: List) -> None:
+        self.ws.append(row)
+        if self._header:
+            self._header = False
+            self._issue_i = next((i for i, v in enumerate(row) if s(v) == "Issue"), None)
+            return
+        if self._issue_i is not None and self._issue_i < len(row):
+            k = s(row[self._issue_i])
+            self.counts[k] = self.counts.get(k, 0) + 1
+
+# ----------------------------------------------------
+# Output modes: full (DMW columns + rule columns) or results-only (+ merge)
+# ----------------------------------------------------
+OUTPUT_MODES = ("full", "results-only", "annotate")
+KEY_INDEX_KEYS = ("st_i", "sc_i", "dt_i", "dc_i")
+
+def key_positions(ix: Dict[str, Optional[int]]) -> List[int]:
+    """DMW positions of the key columns (source/destination table + column) present in this sheet."""
+    return [ix[k] for k in KEY_INDEX_KEYS if ix[k] is not None]
+
+def merge_results(dmw_xlsx: str, results_xlsx: str, out_xlsx: str) -> None:
+    """
+    Rebuild the full annotated workbook from the source DMW and a
+    --output-mode results-only workbook. Baseline rows are joined on DMW row
+    number (key columns must agree); rows without a number are the synthetic
+    Rule6 REMOVED rows and are appended after the DMW rows, as validate() does.
+    Rule sheets are copied across unchanged.
+    """
+    wb_data = load_workbook(dmw_xlsx, read_only=True, data_only=True)
+    wb_res = load_workbook(results_xlsx, read_only=True, data_only=True)
+    try:
+        ws_data = wb_data.active
+        data_start, columns, ix = resolve_dmw_layout(ws_data)
+        key_pos = key_positions(ix)
+        nkeys = len(key_pos)
+
+        res_rows = wb_res["Baseline Data Model_output"].iter_rows(values_only=True)
+        header = next(res_rows, None)
+        if header is None or s(header[0]) != "Row" or len(header) != 1 + nkeys + len(RULE_COLS):
+            raise ValueError(f"{results_xlsx} is not a results-only output for {dmw_xlsx}")
+
+        out_wb = Workbook(write_only=True)
+        ws_main = out_wb.create_sheet("Baseline Data Model_output")
+        ws_main.append(columns + RULE_COLS)
+
+        rownum = data_start
+        pending = next(res_rows, None)
+        for chunk in iter_row_chunks(ws_data, data_start, len(columns)):
+            for vals, _ in chunk:
+                if pending is None or pending[0] != rownum:
+                    raise ValueError(f"Results have no row for DMW row {rownum}")
+                keys = [s(v) for v in pending[1:1 + nkeys]]
+                if keys != [vals[i] if i < len(vals) else "" for i in key_pos]:
+                    raise ValueError(f"Results row {rownum} keys {keys} do not match the DMW")
+                ws_main.append(vals + [s(v) for v in pending[1 + nkeys:]])
+                rownum += 1
+                pending = next(res_rows, None)
+
+        while pending is not None:
+            if pending[0] is not None:
+                raise ValueError(f"Results row {pending[0]} is past the end of the DMW")
+            data = [""] * len(columns)
+            for i, v in zip(key_pos, pending[1:1 + nkeys]):
+                data[i] = s(v)
+            ws_main.append(data + [s(v) for v in pending[1 + nkeys:]])
+            pending = next(res_rows, None)
+
+        for name in wb_res.sheetnames:
+            if name == "Baseline Data Model_output":
+                continue
+            ws = out_wb.create_sheet(name)
+            for row in wb_res[name].iter_rows(values_only=True):
+                ws.append(list(row))
+
+        save_workbook(out_wb, out_xlsx, os.cpu_count() or 1)
+    finally:
+        wb_data.close()
+        wb_res.close()
+
+# ----------------------------------------------------
+# MAIN VALIDATION
+# ----------------------------------------------------
+def validate(dmw_xlsx, ddl_sql, out_xlsx, ai_cfg, prev_dmw=None, prev_ddl=None, ref_dmw=None, master_dmw=None,
+             workers: Optional[int] = None, pipeline: bool = True,
+             results_formats: Optional[Iterable[str]] = None, results_dir: Optional[str] = None,
+             output_mode: str = "full", results_db: Optional[str] = None,
+             diff_against: Optional[str] = None, partition_output: Optional[str] = None,
+             partition_format: str = "xlsx", partition_group_rows: int = 0,
+             progress: Optional[Callable[[Dict], None]] = None):
+    if output_mode not in OUTPUT_MODES:
+        raise ValueError(f"Unknown output mode: {output_mode}")
+    # workers unset: rows are evaluated in-process and the parallel phases (Rule5,
+    # partitioned output, save) use every CPU; an explicit 1 keeps everything serial
+    pool_workers = workers if workers is not None else (os.cpu_count() or 1)
+    workers = workers or 1
+    if partition_output:
+        from partition_output import PARTITION_MODES, PartitionOutput
+        if partition_output not in PARTITION_MODES:
+            raise ValueError(f"Unknown partition output: {partition_output}")
+    #ddl_curr = parse_ddl(ddl_sql)
+    from parse_ddl_v2 import parse_ddl_v2
+
+    # Side inputs (DDLs, prev/ref/master DMWs, Table Details) are independent of the
+    # main row pass; with the pipeline on they load on their own threads meanwhile.
+    prefetch = ThreadPoolExecutor(max_workers=4, thread_name_prefix="dmw-inputs") if pipeline else None
+
+    def submit(fn, *args) -> Future:
+        return prefetch.submit(fn, *args) if prefetch is not None else _resolved(fn, *args)
+
+    f_ddl_curr = submit(parse_ddl_v2, ddl_sql)
+    f_ddl_prev = submit(parse_ddl, prev_ddl) if prev_ddl else None
+    f_prev_defs = submit(load_dmw_dest_defs, prev_dmw) if prev_dmw else None
+    ref_paths = expand_ref_paths(ref_dmw)
+    rule5_enabled = bool(master_dmw and ref_paths)
+    f_master = submit(load_dmw_dest_keys, master_dmw) if rule5_enabled else None
+    f_td = submit(load_table_details_tables, dmw_xlsx)
+
+    started = time.time()
+    prog = Progress(progress)
+    out_stem = os.path.splitext(os.path.basename(out_xlsx))[0]
+    side_dir = results_dir or os.path.dirname(os.path.abspath(out_xlsx))
+    sink = ResultsSink(side_dir, out_stem, results_formats or ())
+    summary = RunSummary()
+    recorder = None
+    if results_db:
+        from results_store import RunRecorder
+        recorder = RunRecorder(results_db)
+
+    wb_data = load_workbook(dmw_xlsx, read_only=True, data_only=True)
+    ws_data = wb_data.active
+
+    data_start, columns, ix = resolve_dmw_layout(ws_data)
+    st_i, sc_i, dt_i, dc_i = ix["st_i"], ix["sc_i"], ix["dt_i"], ix["dc_i"]
+
+    # results-only: DMW row number + key columns instead of every source column
+    # annotate: same rows, replayed into a copy of the DMW's own sheet XML after the run
+    results_only = output_mode != "full"
+    annotate = output_mode == "annotate"
+    key_pos = key_positions(ix)
+
+    if annotate:
+        from xlsx_patch import InlineSheetPart, sheet_width
+        # first free column in the DMW sheet; max_column trusts <dimension>, which streamed writers omit
+        rule_col = max(len(columns), sheet_width(dmw_xlsx))
+        ws_main = SpoolSheet()
+        rule_parts: List[InlineSheetPart] = []
+
+        def new_sheet(title: str) -> InlineSheetPart:
+            rule_parts.append(InlineSheetPart(title))
+            return rule_parts[-1]
+    else:
+        # write_only: rows are serialised as they are appended (no Cell objects kept),
+        # so every sheet is written in a single forward pass.
+        out_wb = Workbook(write_only=True)
+        ws_main = out_wb.create_sheet("Baseline Data Model_output")
+        new_sheet = out_wb.create_sheet
+
+    # by-table: full baseline rows + table-keyed issue rows, one file per destination table
+    parts = None
+    if partition_output:
+        parts = PartitionOutput(os.path.join(side_dir, f"{out_stem}.{partition_output}"),
+                                columns + RULE_COLS, len(columns) + RULE_COLS.index("Validation_Status"),
+                                fmt=partition_format, workers=pool_workers,
+                                group_rows=partition_group_rows)
+
+    def rule_sheet(title: str):
+        ws = sink.tee(new_sheet(title), title)
+        if recorder is not None:
+            ws = recorder.tee(ws, title)
+        if parts is not None:
+            ws = parts.tee(ws, title)
+        return summary.tee(ws, title)
+
+    ws_r4 = rule_sheet("Rule4_DDL_Mismatch")
+    ws_r4.append(["Table", "Column", "Issue", "Details"])
+
+    ws_r3 = rule_sheet("Rule3_Table_Mismatch")
+    ws_r3.append(["Table", "Issue", "Details"])
+
+    ws_r5 = rule_sheet("Rule5_Ref_Master_Mismatch")
+    ws_r5.append(RULE5_HEADER)
+
+    ws_r6 = rule_sheet("Rule6_DMW_Drift")
+    ws_r6.append(["Dest_Table", "Dest_Column", "Issue", "Details"])
+
+    ws_r7 = rule_sheet("Rule7_DDL_Drift")
+    ws_r7.append(["Object", "Name", "Issue", "Details"])
+
+    if annotate:
+        pass  # header cells are patched into the DMW's own header row
+    elif results_only:
+        ws_main.append(["Row"] + [columns[i] for i in key_pos] + RULE_COLS)
+    else:
+        ws_main.append(columns + RULE_COLS)
+
+    # -----------------------------
+    # Single pass rows: reader thread decodes chunks, rule evaluation consumes them;
+    # rows (+ seeds when evaluated inline) are spooled to disk for the write pass
+    # -----------------------------
+    spool = RowSpool()
+    evaluator = PartitionEvaluator(ix) if workers <= 1 else None
+
+    # max_row comes from the sheet's dimension record: an estimate (trailing blank rows)
+    prog.phase("read", "Rule1/Rule2" if evaluator is not None else None,
+               total=ws_data.max_row - data_start + 1 if ws_data.max_row else None)
+    chunks = iter_row_chunks(ws_data, data_start, len(columns))
+    if pipeline:
+        chunks = pipelined(chunks, name="dmw-reader")
+    for chunk in chunks:
+        if evaluator is None:
+            for vals, strike in chunk:
+                spool.append(vals, strike)
+        else:
+            for n, (vals, strike) in enumerate(chunk):
+                evaluator.add(spool.count + n, vals, strike)
+            for (vals, strike), (_, tail) in zip(chunk, evaluator.drain_seeds()):
+                spool.append(vals, strike, tail)
+        prog.rows(spool.count)
+
     wb_data.close()
+
+    ddl_curr = f_ddl_curr.result()
+    ddl_prev = f_ddl_prev.result() if f_ddl_prev else None
+    prev_defs = f_prev_defs.result() if f_prev_defs else None
+    prev_keys_by_table = dest_keys_from_defs(prev_defs) if prev_defs is not None else None
+    master_keys = f_master.result() if f_master else None
+
+    # -----------------------------
+    # Per-table Rule4 / Rule6B (optionally sharded into a process pool)
+    # -----------------------------
+    prog.phase("tables", "Rule4/Rule6B" if evaluator is not None else "Rule1/Rule2/Rule4/Rule6B", total=spool.count)
+    if evaluator is not None:
+        results = [evaluator.finish(ddl_curr, prev_defs)]
+    else:
+        results = run_partitions(((seq, vals, strike) for seq, vals, strike, _ in spool),
+                                 ix, ddl_curr, prev_defs, workers)
+
+    # only partitioned runs hand seeds back separately; inline seeds are in the spool
+    seeds: Dict[int, List[str]] = {}
+    dest_map: Dict[str, Set[str]] = {}
+    mismatch_keys: Set[Tuple[str, str]] = set()
+    table_has_rule4_issue: Set[str] = set()
+    r4_by_table: Dict[str, List[List[str]]] = {}
+    r6b_rows: List[Tuple[int, List[List[str]]]] = []
+    for res in results:
+        for seq, tail in res["seeds"]:
+            seeds[seq] = tail
+        for t, cols in res["dest_map"].items():
+            dest_map.setdefault(t, set()).update(cols)
+        mismatch_keys |= res["mismatch_keys"]
+        table_has_rule4_issue |= res["table_has_rule4_issue"]
+        r4_by_table.update(res["r4_rows"])
+        r6b_rows.extend(res["r6b_rows"])
+
+    baseline_tables: Set[str] = set(dest_map.keys())
+    curr_keys_by_table: Dict[str, Set[str]] = dest_map
+
     # ------------------------------------------------
 # Rule3: Baseline Data Model vs Table Details
 # ------------------------------------------------
-    # ------------------------------------------------
-# Rule3: Baseline Data Model vs Table Details
-# ------------------------------------------------
+    rule3_fail_tables: Set[str] = set()
+    prog.phase("rules", "Rule3")
     try:
-        wb_td = load_workbook(dmw_xlsx, read_only=True, data_only=True)
-        ws_td = None
-
-        # Locate "Table Details" sheet (robust match)
-        for sn in wb_td.sheetnames:
-            if norm_col(sn) == norm_col("TABLE DETAILS"):
-                ws_td = wb_td[sn]
-                break
-
-        table_details_set: Set[str] = set()
-
-        if ws_td is not None:
-            hr = detect_header_row_flexible(
-                ws_td,
-                min_non_empty=1,
-                max_scan=10,
-                default_row=1
-            )
-            tcols, tlookup = build_header_index(ws_td, hr)
-            start = hr + 1
-
-            # Resolve table name column safely
-            table_i = (
-                resolve_col(tlookup, "Table Name")
-                or resolve_col(tlookup, "Destination Table")
-            )
-
-            if table_i is None:
-                for k, idxs in tlookup.items():
-                    if "TABLE" in k:
-                        table_i = idxs[0]
-                        break
-
-            if table_i is not None:
-                for r in ws_td.iter_rows(
-                    min_row=start,
-                    max_row=ws_td.max_row,
-                    values_only=True
-                ):
-                    if not r:
-                        break
-
-                    vals = [s(v) for v in r[:len(tcols)]]
-                    if all(v == "" for v in vals):
-                        break
-
-                    tname = vals[table_i] if table_i < len(vals) else ""
-                    if not is_na(tname):
-                        table_details_set.add(s(tname).upper())
+        table_details_set = f_td.result()
 
         # ------------------------------------------------
         # A️⃣ Baseline → Table Details missing
@@ -734,113 +2044,45 @@ def validate(dmw_xlsx, ddl_sql, out_xlsx, ai_cfg, prev_dmw=None, prev_ddl=None,
                 "Table listed in Table Details but not used in Baseline Data Model"
             ])
 
-        wb_td.close()
+        rule3_fail_tables = set(rule3_missing_tables) | set(rule3_unused_tables)
 
     except Exception:
         logging.exception("Rule3 processing failed")
 
+    if prefetch is not None:
+        prefetch.shutdown(wait=True)
+
 
     # ------------------------------------------------
-    # Rule4: DDL alignment (Rule4A + Rule4B)
+    # Rule4: DDL alignment (Rule4A + Rule4B) — merged in DDL table order
     # ------------------------------------------------
- 
-    from parse_ddl_v2 import parse_ddl_v2
-
-    ddl_curr = parse_ddl_v2(ddl_sql)
-
-    mismatch_keys = set()
-    table_has_rule4_issue = set()
-    missing_in_dmw = []
-
-    for tbl, ddl_cols in ddl_curr.items():
-        tblU = tbl.upper()
-        ddl_set = set(ddl_cols.keys())
-        dmw_set = dest_map.get(tblU, set())
-
-        # ------------------------------------------------
-        # DMW_ONLY (exists in DMW, not in DDL)
-        # ------------------------------------------------
-        for col in sorted(dmw_set - ddl_set):
-            ws_r4.append([
-                tblU,
-                col,
-                "DMW_ONLY",
-                "Destination column appears in DMW but not in DDL"
-            ])
-            mismatch_keys.add((tblU, col))
-            table_has_rule4_issue.add(tblU)
-
-        # ------------------------------------------------
-        # Type / Nullable mismatches
-        # ------------------------------------------------
-        for col in sorted(dmw_set & ddl_set):
-            ddl_def = ddl_cols.get(col, {})
-            dmw_def = dmw_defs.get((tblU, col), {})
-
-            ddl_type = ddl_def.get("type", "")
-            dmw_type = dmw_def.get("type", "")
-
-            ddl_null = ddl_def.get("nullable", "")
-            dmw_null = dmw_def.get("nullable", "")
-
-            if ddl_type and dmw_type and not type_compatible(dmw_type, ddl_type):
-                ws_r4.append([
-                    tblU,
-                    col,
-                    "TYPE_MISMATCH",
-                    f"DMW type={dmw_type} vs DDL type={ddl_type}"
-                ])
-                mismatch_keys.add((tblU, col))
-                table_has_rule4_issue.add(tblU)
-
-            if ddl_null and dmw_null and ddl_null != dmw_null:
-                ws_r4.append([
-                    tblU,
-                    col,
-                    "NULLABLE_MISMATCH",
-                    f"DMW nullable={dmw_null} vs DDL nullable={ddl_null}"
-                ])
-                mismatch_keys.add((tblU, col))
-                table_has_rule4_issue.add(tblU)
-
-        # ------------------------------------------------
-        # MISSING_IN_DMW (exists in DDL, not in DMW)
-        # ------------------------------------------------
-        if dmw_set:
-            for col in sorted(ddl_set - dmw_set):
-                ws_r4.append([
-                    tblU,
-                    col,
-                    "MISSING_IN_DMW",
-                    "Column exists in DDL but not mapped in DMW"
-                ])
-                missing_in_dmw.append((tblU, col))
-                table_has_rule4_issue.add(tblU)
+    for tbl in ddl_curr.keys():
+        for row in r4_by_table.get(tbl.upper(), []):
+            ws_r4.append(row)
 
     # ------------------------------------------------
     # Rule5: Reference tables subset of master tables
     # ------------------------------------------------
+    # Master index is built once; reference DMWs are checked in parallel (one
+    # process each, up to --workers or the CPU count) into one consolidated sheet.
     rule5_fail_tables: Set[str] = set()
-    if master_keys is not None and ref_keys is not None:
-        for rt, rcols in ref_keys.items():
-            mcols = master_keys.get(rt, set())
-            if not mcols:
-                for c in sorted(rcols):
-                    ws_r5.append([rt, rt, c, "MASTER_TABLE_MISSING", "Reference table exists but master table not found"])
-                rule5_fail_tables.add(rt)
-                continue
-            extra = sorted(rcols - mcols)
-            for c in extra:
-                ws_r5.append([rt, rt, c, "NOT_IN_MASTER", "Reference column not found in master table (ref must be subset)"])
-                rule5_fail_tables.add(rt)
+    if rule5_enabled:
+        prog.phase("rules", "Rule5", total=len(ref_paths))
+        for rows5, fails in rule5_batch(master_keys, ref_paths, pool_workers):
+            for row in rows5:
+                ws_r5.append(row)
+            rule5_fail_tables |= fails
 
     # ------------------------------------------------
     # Rule6A: DMW drift (prev vs current) - FAIL on structural drift
     # Rule6B: Attribute drift (INFO only, do NOT fail baseline)
     # ------------------------------------------------
     drift_keys: Set[Tuple[str, str]] = set()
+    removed_rows: List[List[str]] = []
     if prev_keys_by_table is not None:
-        added, removed, modified = dmw_drift(prev_keys_by_table, curr_keys_by_table)
+        prog.phase("rules", "Rule6")
+        # modified keys come from the per-partition fingerprint join (Rule6B below)
+        added, removed, _ = dmw_drift(prev_keys_by_table, curr_keys_by_table)
 
         for (t, c) in added:
             ws_r6.append([t, c, "ADDED_IN_CURRENT", "Destination column exists in current DMW but not in previous frozen DMW"])
@@ -849,10 +2091,6 @@ def validate(dmw_xlsx, ddl_sql, out_xlsx, ai_cfg, prev_dmw=None, prev_ddl=None,
         for (t, c) in removed:
             ws_r6.append([t, c, "REMOVED_IN_CURRENT", "Destination column existed in previous frozen DMW but not in current DMW"])
 
-        for (t, c, det) in modified:
-            ws_r6.append([t, c, "MODIFIED", det])
-            drift_keys.add((t, c))
-
         # Synthetic baseline rows for removed (so baseline shows FAIL evidence)
         if removed and dt_i is not None and dc_i is not None:
             for (t, c) in removed:
@@ -865,7 +2103,7 @@ def validate(dmw_xlsx, ddl_sql, out_xlsx, ai_cfg, prev_dmw=None, prev_ddl=None,
                     data[dt_i] = t
                 if dc_i < len(data):
                     data[dc_i] = c
-                ws_main.append(data + [
+                removed_rows.append(data + [
                     "N/A", "N/A", "PASS", "PASS",
                     "PASS", "FAIL", "PASS",
                     "FAIL",
@@ -873,120 +2111,238 @@ def validate(dmw_xlsx, ddl_sql, out_xlsx, ai_cfg, prev_dmw=None, prev_ddl=None,
                     ""
                 ])
 
-        # Rule6B (INFO only): compare attributes for keys present in both prev and current
+        # Rule6B (INFO only): one row per changed field, emitted in first-seen row order
         if prev_defs is not None:
-            for key, curr_def in dmw_defs.items():
-                prev_def = prev_defs.get(key)
-                if not prev_def:
-                    continue
-                t, c = key
-
-                if normalize_sql_type(prev_def.get("type", "")) != normalize_sql_type(curr_def.get("type", "")):
-                    ws_r6.append([t, c, "DATATYPE_CHANGED", f"Prev={prev_def.get('type','')} Curr={curr_def.get('type','')}"])
-
-                if normalize_nullable(prev_def.get("nullable", "")) != normalize_nullable(curr_def.get("nullable", "")):
-                    ws_r6.append([t, c, "NULLABLE_CHANGED", f"Prev={prev_def.get('nullable','')} Curr={curr_def.get('nullable','')}"])
-
-                if s(prev_def.get("transform", "")) != s(curr_def.get("transform", "")):
-                    ws_r6.append([t, c, "TRANSFORMATION_CHANGED", "Transformation logic changed"])
+            for _, found in sorted(r6b_rows, key=lambda x: x[0]):
+                for row in found:
+                    ws_r6.append(row)
 
     # ------------------------------------------------
     # Rule7: DDL drift (prev vs current)
     # ------------------------------------------------
+    rule7_has_issues = False  # sheet-only
     if ddl_prev is not None:
-        added_tables, removed_tables, added_cols, removed_cols, changed_cols = ddl_diff(ddl_prev, ddl_curr)
+        prog.phase("rules", "Rule7")
+        drift = ddl_diff_renames(ddl_prev, ddl_curr)
+        rule7_has_issues = any(drift.values())
 
-        for t in added_tables:
+        for t in drift["added_tables"]:
             ws_r7.append(["TABLE", t, "ADDED_IN_CURRENT", "Table exists in current DDL but not in previous DDL"])
-        for t in removed_tables:
+        for t in drift["removed_tables"]:
             ws_r7.append(["TABLE", t, "REMOVED_IN_CURRENT", "Table exists in previous DDL but not in current DDL"])
-        for (t, c, typ, nul) in added_cols:
+        for (old, new, conf, shared, total) in drift["renamed_tables"]:
+            ws_r7.append(["TABLE", f"{old} -> {new}", "RENAMED", f"confidence={conf:.2f} shared_columns={shared}/{total}"])
+        for (t, c, typ, nul) in drift["added_cols"]:
             ws_r7.append(["COLUMN", f"{t}.{c}", "ADDED_IN_CURRENT", f"type={typ} nullable={nul}"])
-        for (t, c, typ, nul) in removed_cols:
+        for (t, c, typ, nul) in drift["removed_cols"]:
             ws_r7.append(["COLUMN", f"{t}.{c}", "REMOVED_IN_CURRENT", f"type={typ} nullable={nul}"])
-        for (t, c, pt, pn, ct, cn) in changed_cols:
+        for (t, c, pt, pn, ct, cn) in drift["changed_cols"]:
             ws_r7.append(["COLUMN", f"{t}.{c}", "MODIFIED", f"prev type={pt} nullable={pn} | curr type={ct} nullable={cn}"])
+        for (t, old, new, typ, pn, cn, conf) in drift["renamed_cols"]:
+            ws_r7.append(["COLUMN", f"{t}.{old} -> {t}.{new}", "RENAMED", f"confidence={conf:.2f} type={typ} nullable={pn} -> {cn}"])
+        for (pt, ct, c, typ, pn, cn, conf) in drift["moved_cols"]:
+            ws_r7.append(["COLUMN", f"{pt}.{c} -> {ct}.{c}", "MOVED", f"confidence={conf:.2f} type={typ} nullable={pn} -> {cn}"])
 
     # ------------------------------------------------
-    # Propagate Rule3/4/5/6/7 to baseline (single rewrite)
+    # Results delta vs a previous run (explicit source, else the last run of
+    # this DMW in --results-db): status / rule transitions only
     # ------------------------------------------------
-    rule_cols_n = len(RULE_COLS)
-    all_rows = list(ws_main.iter_rows(min_row=2, values_only=True))
-    ws_main.delete_rows(2, ws_main.max_row)
-
-    rule3_has_issues = ws_r3.max_row > 1
-    rule7_has_issues = ws_r7.max_row > 1  # sheet-only
-
-    for r in all_rows:
-        if r is None or len(r) < rule_cols_n:
-            continue
-
-        data = list(r[:-rule_cols_n])
-        r1, r2, r3, r4, r5, r6, r7, status, remarks, ai = r[-rule_cols_n:]
-
-        DT = s(data[dt_i]) if dt_i is not None and dt_i < len(data) else ""
-        DC = s(data[dc_i]) if dc_i is not None and dc_i < len(data) else ""
-        tblU = DT.upper()
-        key = (tblU, DC.upper())
+    delta = ws_delta = None
+    if not diff_against and results_db and os.path.exists(results_db):
+        from results_store import connect, latest_run
+        conn = connect(results_db)
+        try:
+            last = latest_run(conn, os.path.basename(dmw_xlsx))
+        finally:
+            conn.close()
+        diff_against = f"run:{last}" if last is not None else None
+    if diff_against:
+        from results_diff import ResultsDiff, open_results, DELTA_SHEET, DELTA_HEADER
+        delta = ResultsDiff(open_results(diff_against, results_db))
+        ws_delta = new_sheet(DELTA_SHEET)
+        if parts is not None:
+            ws_delta = parts.tee(ws_delta, DELTA_SHEET)
+        ws_delta.append(DELTA_HEADER)
 
-        # Rule3: fail rows that have a destination table if table details mismatch exists
-       # if rule3_has_issues and not is_na(DT):
-        #    r3 = "INFO"
-         #   remarks = (remarks + " | " if remarks else "") + "Rule3 table mismatch – see Rule3_Table_Mismatch"
-
-        rule3_fail_tables = {row[0] for row in ws_r3.iter_rows(min_row=2, values_only=True)}
+    # ------------------------------------------------
+    # Propagate Rule3/4/5/6/7 to baseline (single write, in sheet order)
+    # ------------------------------------------------
+    rule_cols_n = len(RULE_COLS)
+    rule3_has_issues = bool(rule3_fail_tables)
+
+    def all_rows() -> Iterator[Tuple[Optional[int], List[str]]]:
+        for seq, vals, _, tail in spool:
+            yield data_start + seq, vals + (tail if tail is not None else seeds[seq])
+        for r in removed_rows:
+            yield None, r
+
+    prog.phase("write", total=spool.count + len(removed_rows))
+    with spool, SheetWriter(ws_main, threaded=pipeline) as writer:
+        for n, (rownum, r) in enumerate(all_rows(), 1):
+            if not n & 1023:
+                prog.rows(n)
+            if r is None or len(r) < rule_cols_n:
+                continue
 
-        # later, per row
-        if tblU in rule3_fail_tables:
-            r3 = "FAIL"
-            status = "FAIL"
-            remarks = (remarks + " | " if remarks else "") + \
-                    "Rule3 mismatch – see Rule3_Table_Mismatch"
-        else:
-            r3 = "PASS"
+            data = list(r[:-rule_cols_n])
+            r1, r2, r3, r4, r5, r6, r7, status, remarks, ai = r[-rule_cols_n:]
 
+            DT = s(data[dt_i]) if dt_i is not None and dt_i < len(data) else ""
+            DC = s(data[dc_i]) if dc_i is not None and dc_i < len(data) else ""
+            tblU = DT.upper()
+            key = (tblU, DC.upper())
 
-                # Rule4: exact mismatch OR table-level escalation if table has any Rule4 issues
-        if r4 != "N/A":
-            if key in mismatch_keys or tblU in table_has_rule4_issue:
-                r4 = "FAIL"
-                status = "FAIL"
-                remarks = (remarks + " | " if remarks else "") + "Rule4 mismatch – see Rule4_DDL_Mismatch"
-            else:
-                r4 = "PASS"
+            # Rule3: fail rows that have a destination table if table details mismatch exists
+           # if rule3_has_issues and not is_na(DT):
+            #    r3 = "INFO"
+             #   remarks = (remarks + " | " if remarks else "") + "Rule3 table mismatch – see Rule3_Table_Mismatch"
 
-        # Rule5: if table flagged in rule5_fail_tables, fail rows for that table
-        if master_keys is not None and ref_keys is not None:
-            if tblU in rule5_fail_tables:
-                r5 = "FAIL"
+            # per row
+            if tblU in rule3_fail_tables:
+                r3 = "FAIL"
                 status = "FAIL"
-                remarks = (remarks + " | " if remarks else "") + "Rule5 mismatch – see Rule5_Ref_Master_Mismatch"
+                remarks = (remarks + " | " if remarks else "") + \
+                        "Rule3 mismatch – see Rule3_Table_Mismatch"
             else:
-                r5 = "PASS"
-
-        # Rule6A only: structural drift causes FAIL; Rule6B does NOT fail baseline
-        if prev_keys_by_table is not None:
-            if key in drift_keys:
-                r6 = "FAIL"
-                status = "FAIL"
-                remarks = (remarks + " | " if remarks else "") + "Rule6 drift – see Rule6_DMW_Drift"
+                r3 = "PASS"
+
+
+                    # Rule4: exact mismatch OR table-level escalation if table has any Rule4 issues
+            if r4 != "N/A":
+                if key in mismatch_keys or tblU in table_has_rule4_issue:
+                    r4 = "FAIL"
+                    status = "FAIL"
+                    remarks = (remarks + " | " if remarks else "") + "Rule4 mismatch – see Rule4_DDL_Mismatch"
+                else:
+                    r4 = "PASS"
+
+            # Rule5: if table flagged in rule5_fail_tables, fail rows for that table
+            if rule5_enabled:
+                if tblU in rule5_fail_tables:
+                    r5 = "FAIL"
+                    status = "FAIL"
+                    remarks = (remarks + " | " if remarks else "") + "Rule5 mismatch – see Rule5_Ref_Master_Mismatch"
+                else:
+                    r5 = "PASS"
+
+            # Rule6A only: structural drift causes FAIL; Rule6B does NOT fail baseline
+            if prev_keys_by_table is not None:
+                if key in drift_keys:
+                    r6 = "FAIL"
+                    status = "FAIL"
+                    remarks = (remarks + " | " if remarks else "") + "Rule6 drift – see Rule6_DMW_Drift"
+                else:
+                    r6 = "PASS"
+
+            # Rule7: sheet-only
+            if ddl_prev is not None:
+                r7 = "PASS" if not rule7_has_issues else "PASS"
+
+            rule_vals = [r1, r2, r3, r4, r5, r6, r7, status, remarks, ai]
+            if results_only:
+                writer.append([rownum] + [data[i] if i < len(data) else "" for i in key_pos] + rule_vals)
             else:
-                r6 = "PASS"
-
-        # Rule7: sheet-only
-        if ddl_prev is not None:
-            r7 = "PASS" if not rule7_has_issues else "PASS"
-
-        ws_main.append(data + [r1, r2, r3, r4, r5, r6, r7, status, remarks, ai])
-
-    out_wb.save(out_xlsx)
+                writer.append(data + rule_vals)
+            sink.row(rownum, DT, DC, [r1, r2, r3, r4, r5, r6, r7, status, remarks])
+            summary.row(DT, rule_vals, status)
+            if recorder is not None:
+                recorder.row(rownum, DT, DC, rule_vals)
+            if parts is not None:
+                parts.row(DT, data + rule_vals)
+            if delta is not None:
+                for d in delta.feed(rownum, DT, DC, dict(zip(RULE_COLS[:8], rule_vals))):
+                    ws_delta.append(d)
+
+    if delta is not None:
+        for d in delta.finish():
+            ws_delta.append(d)
+        summary.issues[DELTA_SHEET] = delta.counts
+
+    sink.close()
+    prog.phase("save")
+    if parts is not None:
+        logging.info(f"Partitioned output index → {parts.close()}")
+    summary.write_sheet(new_sheet(SUMMARY_SHEET))
+    # sheet parts are deflated in parallel (same worker sizing as Rule5)
+    if annotate:
+        from xlsx_patch import annotate_workbook
+        nkeys = len(key_pos)
+
+        def rule_cells(vals: List) -> List[Tuple[int, str]]:
+            return [(rule_col + k, v) for k, v in enumerate(vals)]
+
+        def patches() -> Iterator[Tuple[int, List[Tuple[int, str]]]]:
+            yield data_start - 1, rule_cells(RULE_COLS)
+            for _, row, _, _ in ws_main.spool:
+                yield row[0], rule_cells(row[1 + nkeys:])
+
+        appended = [list(zip(key_pos, row[1:1 + nkeys])) + rule_cells(row[1 + nkeys:]) for row in ws_main.appended]
+        try:
+            annotate_workbook(dmw_xlsx, out_xlsx, patches=patches(), appended=appended,
+                              width=rule_col + len(RULE_COLS), new_sheets=rule_parts, workers=pool_workers)
+        finally:
+            ws_main.spool.close()
+            for part in rule_parts:
+                part.close()
+    else:
+        save_workbook(out_wb, out_xlsx, pool_workers)
+
+    run_info = dict(dmw=os.path.basename(dmw_xlsx), ddl=os.path.basename(ddl_sql),
+                    output=os.path.basename(out_xlsx), output_mode=output_mode,
+                    seconds=round(time.time() - started, 3))
+    if diff_against:
+        run_info["diff_against"] = diff_against
+    if parts is not None:
+        run_info["partitions"] = os.path.relpath(parts.index_path, side_dir)
+    if recorder is not None:
+        run_info["run_id"] = recorder.commit(
+            {"dmw_name": run_info["dmw"], "ddl_name": run_info["ddl"], "output": os.path.abspath(out_xlsx),
+             "output_mode": output_mode, "rows": summary.rows, "fail_rows": summary.status.get("FAIL", 0),
+             "seconds": run_info["seconds"], "summary": summary.as_dict()},
+            {"dmw": dmw_xlsx, "ddl": ddl_sql, "prev_dmw": prev_dmw, "prev_ddl": prev_ddl,
+             "ref_dmw": ref_paths, "master_dmw": master_dmw})
+        logging.info(f"Results stored as run {run_info['run_id']} → {results_db}")
+
+    summary_json = os.path.join(side_dir, f"{out_stem}.summary.json")
+    summary.write_json(summary_json, **run_info)
+    logging.info(f"Run summary → {summary_json}")
+    for path in sink.paths:
+        logging.info(f"Results sidecar → {path}")
+    prog.phase("done", total=summary.rows, rows=summary.rows)
     print(f"[OK] Validation completed → {out_xlsx}")
     logging.info(f"Validation completed → {out_xlsx}")
 
 # ----------------------------------------------------
 # CLI
 # ----------------------------------------------------
-def main():
+def merge_main(argv: List[str]):
+    ap = argparse.ArgumentParser(prog="validate_dmw_final.py merge",
+                                 description="Rebuild the full annotated workbook from a results-only output")
+    ap.add_argument("--dmw-xlsx", required=True, help="The DMW the results were produced from")
+    ap.add_argument("--results", required=True, help="Workbook written with --output-mode results-only")
+    ap.add_argument("--out", required=True)
+    args = ap.parse_args(argv)
+
+    try:
+        merge_results(args.dmw_xlsx, args.results, args.out)
+        print(f"[OK] Merge completed → {args.out}")
+    except Exception:
+        traceback.print_exc()
+        logging.exception("FATAL ERROR")
+        return 1
+    return 0
+
+def main(argv: Optional[List[str]] = None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv and argv[0] == "merge":
+        return merge_main(argv[1:])
+    if argv and argv[0] == "results":
+        from results_store import main as results_main
+        return results_main(argv[1:])
+    if argv and argv[0] == "diff-results":
+        from results_diff import main as diff_main
+        return diff_main(argv[1:])
+
     ap = argparse.ArgumentParser()
     ap.add_argument("--dmw-xlsx", required=True)
     ap.add_argument("--ddl-sql", required=True)
@@ -994,11 +2350,42 @@ def main():
     ap.add_argument("--enable-ai", action="store_true")
     ap.add_argument("--prev-dmw", default=None)
     ap.add_argument("--prev-ddl", default=None)
-    ap.add_argument("--ref-dmw", default=None)
+    ap.add_argument("--ref-dmw", nargs="+", default=None,
+                    help="Reference DMW workbook(s) and/or directories of workbooks for Rule5")
     ap.add_argument("--master-dmw", default=None)
-
-    args = ap.parse_args()
+    ap.add_argument("--workers", type=int, default=None,
+                    help="Shard rows by destination table across N worker processes; N also caps "
+                         "Rule5, partitioned output and save. Unset: rows in-process, the rest "
+                         "on every CPU. 1: fully serial")
+    ap.add_argument("--no-pipeline", action="store_true",
+                    help="Run read / rules / write sequentially on one thread")
+    ap.add_argument("--results-format", nargs="+", choices=RESULT_FORMATS, default=None,
+                    help="Also write per-row results and per-rule issue tables as JSONL / CSV / Parquet")
+    ap.add_argument("--results-dir", default=None,
+                    help="Directory for --results-format files (default: next to --out)")
+    ap.add_argument("--output-mode", choices=OUTPUT_MODES, default="full",
+                    help="results-only: baseline sheet carries row number + key columns + rule columns "
+                         "(rebuild the full workbook with the 'merge' command); "
+                         "annotate: copy of the DMW with rule columns appended to its own sheet "
+                         "and the rule sheets added (formatting and other sheets kept)")
+    ap.add_argument("--results-db", default=None,
+                    help="Append this run to a SQLite results warehouse (query it with 'results'); "
+                         "adds a Results_Delta sheet vs the previous run of the same DMW")
+    ap.add_argument("--diff-against", default=None,
+                    help="Previous results for the Results_Delta sheet: rows sidecar, output .xlsx, or run:N")
+    ap.add_argument("--partition-output", choices=("by-table",), default=None,
+                    help="Also write one compact output per destination table into <stem>.by-table/ "
+                         "(next to --out, or in --results-dir) with an index.json")
+    ap.add_argument("--partition-format", choices=("xlsx", "csv"), default="xlsx",
+                    help="File format for --partition-output (csv: baseline rows only)")
+    ap.add_argument("--partition-group-rows", type=int, default=0,
+                    help="Pack consecutive small tables into one partition file of up to N rows")
+    ap.add_argument("--progress-file", default=None,
+                    help="Keep the latest progress event (phase, rows, rows/s, rule, ETA) in this JSON file")
+
+    args = ap.parse_args(argv)
     ai_cfg = {"enabled": args.enable_ai}
+    progress = progress_file(args.progress_file) if args.progress_file else None
 
     try:
         validate(
@@ -1009,11 +2396,26 @@ def main():
             prev_dmw=args.prev_dmw,
             prev_ddl=args.prev_ddl,
             ref_dmw=args.ref_dmw,
-            master_dmw=args.master_dmw
+            master_dmw=args.master_dmw,
+            workers=args.workers,
+            pipeline=not args.no_pipeline,
+            results_formats=args.results_format,
+            results_dir=args.results_dir,
+            output_mode=args.output_mode,
+            results_db=args.results_db,
+            diff_against=args.diff_against,
+            partition_output=args.partition_output,
+            partition_format=args.partition_format,
+            partition_group_rows=args.partition_group_rows,
+            progress=progress,
         )
-    except Exception:
+    except Exception as e:
         traceback.print_exc()
         logging.exception("FATAL ERROR")
+        if progress is not None:
+            progress({"phase": "failed", "error": f"{type(e).__name__}: {e}"})
+        return 1
+    return 0
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(main())
\ No newline at end of file
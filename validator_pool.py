@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+# ----------------------------------------------------
+# Pre-warmed validator processes: each worker imports validate_dmw_final once
+# (openpyxl, cfg, logging) and then runs jobs by calling its main(argv)
+# directly; workers are recycled after max_jobs jobs or above max_rss_mb.
+# The metrics a job records in its worker (metrics.py) are merged into the
+# parent's registry when it returns.
+# ----------------------------------------------------
+import io, logging, multiprocessing, os, queue, sys, threading, time
+from contextlib import redirect_stderr, redirect_stdout
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import metrics
+
+ROOT = Path(__file__).resolve().parent
+
+VALIDATOR = "validate_dmw_final.py"
+
+Result = Tuple[int, str, str]   # (returncode, stdout, stderr)
+POLL = 0.5   # seconds between checks of a run's cancel event
+
+class _Cancelled(Exception):
+    pass
+
+def validator_argv(cmd: List[str]) -> Optional[List[str]]:
+    """The validator's own arguments if cmd is `python[3] .../validate_dmw_final.py ...`, else None."""
+    if len(cmd) >= 2 and Path(cmd[0]).name.startswith("python") and Path(cmd[1]).name == VALIDATOR:
+        return list(cmd[2:])
+    return None
+
+def _rss_mb() -> float:
+    """Current resident set size; falls back to the peak where /proc is unavailable."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1 << 20)
+    except (OSError, ValueError, IndexError):
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / (1 << 20) if sys.platform == "darwin" else peak / 1024
+
+def _worker_main(conn) -> None:
+    """Worker process: preload the validator, then serve (argv, cwd) requests until None."""
+    if str(ROOT) not in sys.path:
+        sys.path.insert(0, str(ROOT))
+    import validate_dmw_final
+    conn.send(("ready", os.getpid()))
+    while True:
+        msg = conn.recv()
+        if msg is None:
+            break
+        argv, cwd = msg
+        out, err = io.StringIO(), io.StringIO()
+        prev = os.getcwd()
+        try:
+            with redirect_stdout(out), redirect_stderr(err):
+                if cwd:
+                    os.chdir(cwd)
+                rc = validate_dmw_final.main(list(argv))
+            rc = rc if isinstance(rc, int) else 0
+        except SystemExit as e:   # argparse errors
+            rc = e.code if isinstance(e.code, int) else 1
+        except BaseException:
+            import traceback
+            err.write(traceback.format_exc())
+            rc = 1
+        finally:
+            os.chdir(prev)
+        conn.send((rc, out.getvalue(), err.getvalue(), _rss_mb(), metrics.REGISTRY.drain()))
+
+class _Worker:
+    def __init__(self, ctx):
+        self.conn, child = ctx.Pipe()
+        # not a daemon: validate() may start its own process pools (--workers, Rule5)
+        self.proc = ctx.Process(target=_worker_main, args=(child,), name="dmw-validator")
+        self.proc.start()
+        child.close()
+        self.jobs = 0
+        self.ready = False
+        self.rss_mb = 0.0   # after its last job
+
+    def call(self, argv: List[str], cwd: Optional[str], timeout: Optional[float],
+             cancel: Optional[threading.Event] = None) -> Tuple[int, str, str, float, Dict]:
+        if not self.ready:
+            self.conn.recv()          # wait for the preload to finish (only the first job)
+            self.ready = True
+        self.conn.send((argv, cwd))
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self.conn.poll(POLL if deadline is None else max(0.0, min(POLL, deadline - time.monotonic()))):
+            if deadline is not None and time.monotonic() >= deadline:
+                raise TimeoutError
+            if cancel is not None and cancel.is_set():
+                raise _Cancelled
+        self.jobs += 1
+        return self.conn.recv()
+
+    def stop(self, kill: bool = False) -> None:
+        try:
+            if kill:
+                self.proc.kill()
+            else:
+                self.conn.send(None)
+            self.proc.join(timeout=10)
+        except (OSError, BrokenPipeError):
+            pass
+        finally:
+            if self.proc.is_alive():
+                self.proc.kill()
+            self.conn.close()
+
+class ValidatorPool:
+    """
+    `size` validator processes (spawn, so it is safe from a threaded server),
+    started by start() - call it at server startup so the imports are paid
+    before the first upload; run() starts the pool itself otherwise. start()
+    must not run at import time of a __main__ module: spawn re-imports it.
+    run() borrows an idle worker, blocking until one is free. A worker is
+    replaced after max_jobs jobs, when its RSS after a job exceeds max_rss_mb,
+    on timeout or once the run's `cancel` event is set (killed), or if it died.
+    """
+
+    def __init__(self, size: int = 2, max_jobs: int = 20, max_rss_mb: float = 1536):
+        self.size = max(1, size)
+        self.max_jobs = max_jobs
+        self.max_rss_mb = max_rss_mb
+        self._ctx = multiprocessing.get_context("spawn")
+        self._idle: "queue.Queue[_Worker]" = queue.Queue()
+        self._all: List[_Worker] = []
+        self._lock = threading.Lock()
+        self._started = self._closed = False
+
+    def start(self) -> "ValidatorPool":
+        with self._lock:
+            if self._started:
+                return self
+            self._started = True
+        for _ in range(self.size):
+            self._idle.put(self._spawn())
+        return self
+
+    def _spawn(self) -> _Worker:
+        w = _Worker(self._ctx)
+        with self._lock:
+            self._all.append(w)
+        return w
+
+    def _retire(self, w: _Worker, kill: bool = False) -> None:
+        with self._lock:
+            if w in self._all:
+                self._all.remove(w)
+        w.stop(kill=kill)
+
+    def run(self, argv: List[str], cwd: Optional[str] = None, timeout: Optional[float] = None,
+            cancel: Optional[threading.Event] = None) -> Result:
+        if self._closed:
+            raise RuntimeError("Validator pool is shut down")
+        self.start()
+        w = self._idle.get()
+        started = time.time()
+        try:
+            rc, out, err, rss, recorded = w.call(argv, cwd, timeout, cancel)
+        except TimeoutError:
+            self._retire(w, kill=True)
+            self._idle.put(self._spawn())
+            return -1, "", f"Validation timed out after {timeout}s"
+        except _Cancelled:
+            self._retire(w, kill=True)
+            self._idle.put(self._spawn())
+            return -1, "", "Validation cancelled"
+        except (EOFError, OSError) as e:
+            logging.error(f"Validator worker {w.proc.pid} died: {e!r}")
+            self._retire(w, kill=True)
+            self._idle.put(self._spawn())
+            return -1, "", f"Validator worker died (exit code {w.proc.exitcode})"
+        metrics.REGISTRY.merge(recorded)
+        w.rss_mb = rss
+        logging.info(f"Validator worker {w.proc.pid}: job {w.jobs} in {time.time() - started:.1f}s, rss {rss:.0f} MB")
+        if w.jobs >= self.max_jobs or rss > self.max_rss_mb:
+            logging.info(f"Recycling validator worker {w.proc.pid} (jobs={w.jobs}, rss={rss:.0f} MB)")
+            self._retire(w)
+            w = self._spawn()
+        self._idle.put(w)
+        return rc, out, err
+
+    def rss(self) -> Dict[Tuple[str], float]:
+        """Resident bytes of each live worker after its last job, by pid (for metrics.WORKER_RSS)."""
+        with self._lock:
+            return {(str(w.proc.pid),): w.rss_mb * (1 << 20) for w in self._all if w.ready}
+
+    def shutdown(self) -> None:
+        self._closed = self._started = True
+        with self._lock:
+            workers = list(self._all)
+        for w in workers:
+            self._retire(w)
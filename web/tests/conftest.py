@@ -1,8 +1,32 @@
+import os
 import pytest
 from fastapi.testclient import TestClient
 from pathlib import Path
+os.environ.setdefault("DMW_JOB_POOL", "0")   # tests fake the validator at job_queue.run_command
+os.environ.setdefault("DMW_RESULT_CACHE", "0")   # enabled per test on a temporary directory
+import web.app
 from web.app import app
 
+@pytest.fixture(autouse=True)
+def isolated_dirs(tmp_path, monkeypatch):
+    """Uploads, job directories, blobs and the result cache under tmp_path, not web/uploads and web/outputs."""
+    import metrics
+    from blob_store import BlobStore
+    from janitor import Janitor
+    from result_cache import ResultCache
+    uploads, outputs = tmp_path / "web_uploads", tmp_path / "web_outputs"
+    uploads.mkdir()
+    outputs.mkdir()
+    blobs = BlobStore(uploads / "blobs")
+    janitor = Janitor(job_roots=[outputs], file_roots=[uploads], blobs=blobs, busy=web.app.jobs.active)
+    monkeypatch.setattr(web.app, "UPLOAD_DIR", uploads)
+    monkeypatch.setattr(web.app, "OUTPUT_DIR", outputs)
+    monkeypatch.setattr(web.app, "blobs", blobs)
+    monkeypatch.setattr(web.app, "janitor", janitor)
+    if web.app.jobs.cache is not None:
+        monkeypatch.setattr(web.app.jobs, "cache", ResultCache(outputs / ".cache"))
+    metrics.watch(blobs=blobs, janitor=janitor)
+
 @pytest.fixture
 def client():
     return TestClient(app)
@@ -0,0 +1,64 @@
+import openpyxl
+
+from admission import Cost, Scheduler, estimate, sniff_rows
+
+def _cost(rows, mem_mb=100):
+    return Cost(rows, rows * 100, 1.0, mem_mb)
+
+def test_sniff_rows_reads_dimension_or_extrapolates(tmp_path):
+    wb = openpyxl.Workbook()
+    for i in range(1200):
+        wb.active.append([f"T{i}", f"C{i}", "INT"])
+    wb.save(tmp_path / "dmw.xlsx")
+    assert sniff_rows(tmp_path / "dmw.xlsx") == 1199   # header excluded
+
+    wb = openpyxl.Workbook(write_only=True)   # streamed: no <dimension> record
+    ws = wb.create_sheet()
+    for i in range(3000):
+        ws.append([f"T{i}", f"C{i}", "INT"])
+    wb.save(tmp_path / "streamed.xlsx")
+    assert 2700 < sniff_rows(tmp_path / "streamed.xlsx") < 3300
+
+    (tmp_path / "ddl.sql").write_text("CREATE TABLE T1 (C1 INT);")
+    cost = estimate(["python3", "validate_dmw_final.py", "--dmw-xlsx", str(tmp_path / "dmw.xlsx"),
+                     "--ddl-sql", str(tmp_path / "ddl.sql"), "--out", str(tmp_path / "out.xlsx")])
+    assert cost.rows == 1199 and cost.bytes > 0 and cost.mem_mb > 64
+
+def test_scheduler_budgets_fair_queues_and_fast_lane():
+    s = Scheduler(cpu=2, mem_mb=1000, small_rows=5000, fast_slots=1)
+    for i in range(3):
+        s.add(f"alice{i}", _cost(300_000, 400), "alice")
+    s.add("bob0", _cost(50_000, 400), "bob")
+    s.add("huge", _cost(900_000, 1500), "carol")
+    assert s.admit() == ["alice0", "bob0"]          # round-robin between users, within the budget
+    assert s.position("alice1") == 1 and s.position("huge") == 0 and s.position("alice0") == 0
+
+    assert s.add("tiny0", _cost(200), "dave") == "fast"
+    s.add("tiny1", _cost(300), "erin")
+    assert s.admit() == ["tiny0"]                   # reserved slot while the budget is full
+    s.release("tiny0")
+    assert s.admit() == ["tiny1"]
+
+    s.release("alice0")
+    assert s.admit() == []                          # carol's oversized job is next: it waits to run alone
+    s.release("bob0")
+    assert s.admit() == ["huge"]
+    s.release("huge")
+    assert s.admit() == ["alice1", "alice2"]
+    assert s.snapshot()["mem_used_mb"] == 800
+
+def test_large_jobs_get_more_workers_and_budget_a_core_for_each(tmp_path):
+    s = Scheduler(cpu=4, mem_mb=10_000, small_rows=5000, fast_slots=0, max_workers=3)
+    assert [s.workers(n) for n in (0, 50_000, 50_001, 120_000, 10_000_000)] == [1, 1, 2, 3, 3]
+
+    (tmp_path / "ddl.sql").write_text("CREATE TABLE T1 (C1 INT);")
+    cmd = ["python3", "validate_dmw_final.py", "--ddl-sql", str(tmp_path / "ddl.sql"), "--workers", "3"]
+    assert estimate(cmd).cpu == 3.0
+    assert estimate(cmd[:-2]).cpu == 1.0
+
+    s.add("big", Cost(200_000, 0, 3.0, 100), "alice")
+    s.add("medium", Cost(100_000, 0, 2.0, 100), "bob")
+    assert s.admit() == ["big"]                     # 3 + 2 cores exceed the budget of 4
+    assert s.snapshot()["cpu_used"] == 3.0
+    s.release("big")
+    assert s.admit() == ["medium"]
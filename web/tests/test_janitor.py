@@ -0,0 +1,75 @@
+import io
+import os
+import time
+
+from blob_store import BlobStore
+from janitor import Janitor, pin
+
+def _job(root, name, size, age, blobs=None):
+    d = root / name
+    d.mkdir()
+    (d / "out.xlsx").write_bytes(b"x" * size)
+    t = time.time() - age
+    if blobs is not None:
+        blobs.save(io.BytesIO(name.encode() * 50), d / "dmw.xlsx")
+        os.utime(d / "dmw.xlsx", (t, t))   # the blob's inode: stored back then
+    os.utime(d, (t, t))
+    return d
+
+def test_janitor_retention_quota_pins_and_blobs(tmp_path):
+    outputs, uploads = tmp_path / "outputs", tmp_path / "uploads"
+    outputs.mkdir()
+    uploads.mkdir()
+    blobs = BlobStore(uploads / "blobs")
+    expired = _job(outputs, "job_old", 1000, 30 * 86400, blobs)
+    baseline = _job(outputs, "job_base", 1000, 60 * 86400)
+    pin(baseline)
+    lru = _job(outputs, "job_lru", 1000, 3 * 86400, blobs)
+    recent = _job(outputs, "job_new", 1000, 86400, blobs)
+    running = _job(outputs, "job_run", 1000, 20 * 86400)
+    fresh = _job(outputs, "job_fresh", 5000, 0)   # inside the grace window
+    stray = uploads / "legacy.xlsx"
+    stray.write_bytes(b"y" * 100)
+    os.utime(stray, (time.time() - 40 * 86400,) * 2)
+    (outputs / ".cache").mkdir()
+
+    jan = Janitor(job_roots=[outputs], file_roots=[uploads], blobs=blobs, max_age=14 * 86400,
+                  quota_bytes=9000, grace=300, busy=lambda p: p == running)
+    before = jan.usage()
+    done = jan.run_once()
+
+    # retention removes the expired job, its now-unreferenced blob and the stray upload;
+    # quota removes the least recently used remaining job; pinned and running jobs stay
+    assert not expired.exists() and not stray.exists() and not lru.exists()
+    assert baseline.exists() and running.exists() and recent.exists() and fresh.exists()
+    assert done["removed"] == 3 and done["pinned"] == 1
+    assert len(list(blobs.blobs())) == 1   # only job_new's upload is still linked
+    assert done["reclaimed"] == before - jan.usage() == jan.stats["bytes_reclaimed"]
+    assert jan.stats["blobs_removed"] == 2 and jan.usage() <= 9000
+
+    assert jan.run_once()["removed"] == 0
+
+def test_janitor_pass_between_put_and_link_keeps_the_blob(tmp_path):
+    import threading
+    outputs = tmp_path / "outputs"
+    job = outputs / "job_1"
+    job.mkdir(parents=True)
+    blobs = BlobStore(tmp_path / "uploads" / "blobs")
+    digest, _ = blobs.put(io.BytesIO(b"dmw" * 100))
+    old = time.time() - 30 * 86400
+    os.utime(blobs.path(digest), (old, old))   # an old orphan, about to be uploaded again
+    jan = Janitor(job_roots=[outputs], blobs=blobs, grace=0)
+
+    link = blobs.link
+    def link_during_a_janitor_pass(d, dest):
+        sweep = threading.Thread(target=jan.run_once)
+        sweep.start()
+        sweep.join(0.2)   # blocks on the store's lock until the upload is linked
+        return link(d, dest)
+    blobs.link = link_during_a_janitor_pass
+
+    path, _ = blobs.save(io.BytesIO(b"dmw" * 100), job / "dmw.xlsx")
+    while jan.stats["runs"] == 0:
+        time.sleep(0.01)
+    assert path.read_bytes() == b"dmw" * 100
+    assert blobs.path(digest).exists() and jan.stats["blobs_removed"] == 0
@@ -0,0 +1,134 @@
+import json
+import time
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+from admission import Scheduler
+from job_queue import Job, JobQueue
+from job_store import RedisJobStore, SQLiteJobStore
+from test_ui_upload import _upload
+
+@pytest.fixture(params=["sqlite", "redis"])
+def stores(request, tmp_path):
+    """Two handles on one store, as two worker processes would have."""
+    if request.param == "sqlite":
+        return [SQLiteJobStore(tmp_path / "jobs.db", max_attempts=2) for _ in range(2)]
+    fakeredis = pytest.importorskip("fakeredis")
+    pytest.importorskip("lupa")   # Lua scripting
+    server = fakeredis.FakeServer()
+    return [RedisJobStore(client=fakeredis.FakeRedis(server=server, decode_responses=True), max_attempts=2)
+            for _ in range(2)]
+
+def _data(job_id, created):
+    return {"job_id": job_id, "status": "queued", "created": created, "job_dir": f"/jobs/{job_id}", "cmd": []}
+
+def test_claims_are_fair_exclusive_and_leased(stores):
+    a, b = stores
+    a.add("big1", _data("big1", 1), "alice", "main", 300_000, 500)
+    a.add("big2", _data("big2", 2), "alice", "main", 300_000, 500)
+    a.add("bob1", _data("bob1", 3), "bob", "main", 50_000, 150)
+    a.add("tiny", _data("tiny", 4), "carol", "fast", 100, 64)
+    a.add("hit", {**_data("hit", 5), "status": "done"}, "dave")   # result cache hit: recorded, not queued
+    assert b.position("tiny") == 0 and b.position("big2") == 3
+
+    assert a.claim("w1", 60)["job_id"] == "tiny"              # fast lane first
+    assert b.claim("w2", 60)["job_id"] == "big1"
+    assert a.claim("w1", 60, fits=lambda c: c["mem_mb"] < 200)["job_id"] == "bob1"   # bob has nothing running
+    assert b.try_claim("bob1", "w2", 60) is None              # exclusive
+    assert a.get("hit")["status"] == "done" and len(a.unfinished()) == 4
+
+    done = {**_data("tiny", 4), "status": "done", "returncode": 0}
+    assert b.finish("tiny", "w2", done) is None               # not the lease holder
+    assert a.finish("tiny", "w1", done) == "done" and b.get("tiny")["returncode"] == 0
+    assert a.finish("bob1", "w1", {**_data("bob1", 3), "status": "failed"}, retry=True) == "queued"
+
+    assert a.renew("big1", "w1", -1) is False                 # w2 holds it
+    assert b.renew("big1", "w2", -1)                          # let it expire: the worker "died"
+    assert a.reap() == 1 and a.get("big1")["status"] == "queued"
+    big1 = a.claim("w1", -1)
+    assert big1["job_id"] == "big1" and big1["attempts"] == 2
+    assert b.reap() == 1                                      # second expiry: out of attempts
+    failed = a.get("big1")
+    assert failed["status"] == "failed" and "lease expired" in failed["stderr"]
+    assert b.finish("big1", "w1", {**_data("big1", 1), "status": "done"}) is None
+
+def _fake_validator(cmd, **kwargs):
+    Path(cmd[cmd.index("--out") + 1]).write_bytes(b"xlsx")
+    return type("Result", (), {"returncode": 0, "stdout": "[OK] Validation completed", "stderr": ""})()
+
+def test_web_process_submits_and_worker_process_runs(tmp_path):
+    store_path = tmp_path / "jobs.db"
+    web = JobQueue(store=SQLiteJobStore(store_path), worker=False)
+    worker = JobQueue(store=SQLiteJobStore(store_path), poll=0.05,
+                      scheduler=Scheduler(cpu=1, mem_mb=4096, small_rows=5000, fast_slots=1))
+    job_dir = tmp_path / "job_1"
+    job_dir.mkdir()
+    cmd = ["python3", "validate_dmw_final.py", "--dmw-xlsx", str(job_dir / "dmw.xlsx"), "--out", str(job_dir / "out.xlsx")]
+    try:
+        with patch("job_queue.run_command", side_effect=_fake_validator):
+            web.submit(Job("1", job_dir, cmd, output="out.xlsx", user="alice"))
+            assert web.get("1", job_dir).status == "queued" and web.active(job_dir)
+            worker.start()
+            deadline = time.time() + 10
+            while web.get("1", job_dir).status != "done" and time.time() < deadline:
+                time.sleep(0.05)
+        job = web.get("1", job_dir)
+        assert job.status == "done" and job.attempts == 1 and "Validation completed" in job.stdout
+        assert job.files() == ["out.xlsx"] and not web.active(job_dir)
+    finally:
+        worker.shutdown()
+        web.shutdown()
+
+def test_lost_lease_cancels_the_local_run(tmp_path):
+    import sqlite3
+    import threading
+    store_path = tmp_path / "jobs.db"
+    worker = JobQueue(store=SQLiteJobStore(store_path), poll=0.05, lease=0.3,
+                      scheduler=Scheduler(cpu=1, mem_mb=4096, small_rows=5000, fast_slots=1))
+    job_dir = tmp_path / "job_1"
+    job_dir.mkdir()
+    cmd = ["python3", "validate_dmw_final.py", "--dmw-xlsx", str(job_dir / "dmw.xlsx"), "--out", str(job_dir / "out.xlsx")]
+    started, cancelled = threading.Event(), threading.Event()
+
+    def slow_validator(cmd, cancel=None, **kwargs):
+        started.set()
+        if cancel.wait(10):
+            cancelled.set()
+        return type("Result", (), {"returncode": -9, "stdout": "", "stderr": ""})()
+
+    try:
+        with patch("job_queue.run_command", side_effect=slow_validator):
+            worker.submit(Job("1", job_dir, cmd, output="out.xlsx", user="alice"))
+            assert started.wait(10)
+            with sqlite3.connect(store_path) as conn:   # another worker took the job over
+                conn.execute("UPDATE jobs SET owner = 'other', lease_expires = ? WHERE job_id = '1'", (time.time() + 60,))
+            assert cancelled.wait(10)
+            deadline = time.time() + 10
+            while worker.running() and time.time() < deadline:
+                time.sleep(0.05)
+        record = SQLiteJobStore(store_path).get("1")
+        assert record["status"] == "running"                        # left to its new owner
+        assert json.loads((job_dir / "job.json").read_text())["status"] == "running"   # not overwritten
+    finally:
+        worker.shutdown()
+
+def test_job_events_follow_a_job_run_by_another_process(client, sample_xlsx, sample_sql, tmp_path, monkeypatch):
+    import threading
+    import web.app
+    store_path = tmp_path / "jobs.db"
+    monkeypatch.setattr(web.app, "jobs", JobQueue(store=SQLiteJobStore(store_path), worker=False))
+    worker = JobQueue(store=SQLiteJobStore(store_path), poll=0.05,
+                      scheduler=Scheduler(cpu=1, mem_mb=4096, small_rows=5000, fast_slots=1))
+    try:
+        with patch("job_queue.run_command", side_effect=_fake_validator), \
+                patch.dict("web.app.JOB_CFG", progress_interval=0.05):
+            job_id = _upload(client, sample_xlsx, sample_sql).json()["job_id"]
+            threading.Timer(0.3, worker.start).start()   # picked up while the stream is open
+            resp = client.get(f"/jobs/{job_id}/events")
+        events = [json.loads(line[len("data: "):]) for line in resp.text.splitlines() if line.startswith("data: ")]
+        assert events[0]["status"] == "queued" and events[-1]["status"] == "done"
+    finally:
+        worker.shutdown()
+        web.app.jobs.shutdown()
@@ -0,0 +1,54 @@
+import pytest
+
+from metrics import Counter, Gauge, Histogram, Registry
+
+def test_render_uses_the_prometheus_text_format():
+    reg = Registry()
+    hits = Counter("t_hits_total", "Hits", ["route"], registry=reg)
+    depth = Gauge("t_depth", "Depth", registry=reg)
+    latency = Histogram("t_seconds", "Latency", ["route"], buckets=(0.1, 1), registry=reg)
+    hits.labels("/a").inc()
+    hits.labels(route='/b"x').inc(2)
+    depth.set(3)
+    for v in (0.05, 0.1, 0.5, 7):
+        latency.labels("/a").observe(v)
+
+    lines = reg.render().splitlines()
+    assert "# TYPE t_hits_total counter" in lines
+    assert 't_hits_total{route="/a"} 1' in lines
+    assert 't_hits_total{route="/b\\"x"} 2' in lines
+    assert "t_depth 3" in lines
+    assert 't_seconds_bucket{route="/a",le="0.1"} 2' in lines   # le is inclusive, counts are cumulative
+    assert 't_seconds_bucket{route="/a",le="1"} 3' in lines
+    assert 't_seconds_bucket{route="/a",le="+Inf"} 4' in lines
+    assert 't_seconds_count{route="/a"} 4' in lines
+    assert 't_seconds_sum{route="/a"} 7.65' in lines
+
+    with pytest.raises(ValueError):
+        hits.labels("/a").inc(-1)
+    with pytest.raises(ValueError):
+        hits.labels("/a", "extra")
+
+def test_function_metrics_are_read_at_scrape_time():
+    reg = Registry()
+    state = {"fast": 1, "main": 4}
+    Gauge("t_queue", "Queue", ["lane"], registry=reg).set_function(lambda: state)
+    state["main"] = 5
+    assert 't_queue{lane="main"} 5' in reg.render().splitlines()
+
+def test_drain_hands_increments_to_another_registry():
+    worker, portal = Registry(), Registry()
+    for reg in (worker, portal):
+        Counter("t_rows_total", "Rows", registry=reg)
+        Histogram("t_phase_seconds", "Phase", ["phase"], buckets=(1, 10), registry=reg)
+        Gauge("t_rss", "RSS", registry=reg)
+    worker.get("t_rows_total").inc(100)
+    worker.get("t_phase_seconds").labels("read").observe(2)
+    worker.get("t_rss").set(5)
+    portal.get("t_rows_total").inc(1)
+
+    portal.merge(worker.drain())
+    portal.merge(worker.drain())   # drained: nothing twice
+    assert portal.get("t_rows_total").values() == {(): 101}
+    assert 't_phase_seconds_bucket{phase="read",le="10"} 1' in portal.render().splitlines()
+    assert portal.get("t_rss").values() == {}   # gauges stay with their process
@@ -0,0 +1,39 @@
+import os
+import time
+
+from result_cache import ResultCache
+
+def _job(tmp_path, name, size):
+    d = tmp_path / name
+    d.mkdir()
+    (d / "in.sql").write_text(name)
+    (d / "out.xlsx").write_bytes(b"x" * size)
+    return d
+
+def test_result_cache_ttl_and_lru_eviction(tmp_path):
+    cache = ResultCache(tmp_path / "cache", ttl=60, max_bytes=250, version="v1")
+    jobs = [_job(tmp_path, f"job{i}", 100) for i in range(3)]
+    keys = [cache.key({"ddl_sql": f"digest{i}"}, ["--ddl-sql", str(d / "in.sql"), "--out", str(d / "out.xlsx")], d)
+            for i, d in enumerate(jobs)]
+    assert len(set(keys)) == 3
+    assert cache.key({}, [], jobs[0]) is None
+    assert cache.key({"x": "1"}, ["--ref-dmw", str(jobs[1] / "in.sql")], jobs[0]) is None  # file outside the job
+
+    cache.put(keys[0], jobs[0], ["out.xlsx"], "ok 0")
+    cache.put(keys[1], jobs[1], ["out.xlsx"], "ok 1")
+    meta = tmp_path / "cache" / keys[1] / "meta.json"
+    os.utime(meta, (time.time() - 10, time.time() - 10))
+    fresh = tmp_path / "fresh"
+    fresh.mkdir()
+    assert cache.get(keys[0], fresh)["stdout"] == "ok 0"   # job0 is now the most recently used
+    assert (fresh / "out.xlsx").read_bytes() == b"x" * 100
+
+    cache.put(keys[2], jobs[2], ["out.xlsx"], "ok 2")     # 300 bytes > 250: evict the LRU entry
+    assert cache.get(keys[1], fresh) is None
+    assert cache.get(keys[2], fresh) is not None and cache.stats["evictions"] == 1
+
+    cache.ttl = -1
+    assert cache.get(keys[2], fresh) is None
+    assert not (tmp_path / "cache" / keys[2]).exists()
+    assert ResultCache(tmp_path / "cache", version="v2").key({"ddl_sql": "digest0"}, [], jobs[0]) != \
+        ResultCache(tmp_path / "cache", version="v1").key({"ddl_sql": "digest0"}, [], jobs[0])
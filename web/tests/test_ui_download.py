@@ -1,8 +1,7 @@
-from pathlib import Path
-
 def test_download_file(client, tmp_path):
+    from web.app import OUTPUT_DIR
     job_id = "jobtest"
-    out_dir = Path("web/outputs") / f"job_{job_id}"
+    out_dir = OUTPUT_DIR / f"job_{job_id}"
     out_dir.mkdir(parents=True, exist_ok=True)
 
     f = out_dir / "test.txt"
@@ -1,19 +1,54 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
 from unittest.mock import patch, MagicMock
 
+def _fake_validator(release=None):
+    def run(cmd, **kwargs):
+        if release is not None:
+            release.wait(10)
+        Path(cmd[cmd.index("--out") + 1]).write_bytes(b"xlsx")
+        result = MagicMock()
+        result.returncode = 0
+        result.stdout = "[OK] Validation completed"
+        result.stderr = ""
+        return result
+    return run
+
+def _upload(client, sample_xlsx, sample_sql, ddl=None, browser=False):
+    """POST /upload of the sample DMW and DDL (or `ddl` bytes); a JSON reply unless browser."""
+    return client.post(
+        "/upload",
+        files={"dmw_xlsx": ("dmw.xlsx", sample_xlsx.read_bytes()),
+               "ddl_sql": ("ddl.sql", sample_sql.read_bytes() if ddl is None else ddl)},
+        headers={} if browser else {"Accept": "application/json"},
+    )
+
+def _wait_done(client, job_id, timeout=10):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = client.get(f"/jobs/{job_id}").json()
+        if job["status"] not in ("queued", "running"):
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f"job {job_id} still {job['status']}")
+
 def test_upload_triggers_validation(client, sample_xlsx, sample_sql):
-    fake_result = MagicMock()
-    fake_result.stdout = "[OK] Validation completed"
-    fake_result.stderr = ""
-
-    with patch("web.app.subprocess.run", return_value=fake_result) as mock_run:
-        resp = client.post(
-            "/upload",
-            files={
-                "dmw_xlsx": ("dmw.xlsx", sample_xlsx.read_bytes()),
-                "ddl_sql": ("ddl.sql", sample_sql.read_bytes()),
-            },
-        )
+    release = threading.Event()   # still running when /upload answers
+    with patch("job_queue.run_command", side_effect=_fake_validator(release)) as mock_run:
+        resp = _upload(client, sample_xlsx, sample_sql)
 
+        assert resp.status_code == 202
+        job_id = resp.json()["job_id"]
+        release.set()
+        job = _wait_done(client, job_id)
+        assert job["status"] == "done"
+        assert "Baseline_Data_Model_output.xlsx" in job["files"]
+
+        resp = client.get(f"/jobs/{job_id}/result")
         assert resp.status_code == 200
         assert "[OK] Validation completed" in resp.text
         assert "Baseline_Data_Model_output.xlsx" in resp.text
@@ -24,3 +59,174 @@ def test_upload_triggers_validation(client, sample_xlsx, sample_sql):
         assert "--dmw-xlsx" in args
         assert "--ddl-sql" in args
         assert "--out" in args
+        assert args[args.index("--workers") + 1] == "1"   # a small DMW: one core
+
+def test_upload_returns_before_validation_finishes(client, sample_xlsx, sample_sql):
+    release = threading.Event()
+    with patch("job_queue.run_command", side_effect=_fake_validator(release)):
+        resp = _upload(client, sample_xlsx, sample_sql, browser=True)
+        assert resp.status_code == 202
+        job_id = resp.json()["job_id"] if resp.headers["content-type"].startswith("application/json") else None
+        assert job_id is None and "Validation Queued" in resp.text  # browser form: job page
+
+        job_id = next(j for j in reversed(resp.text.split("/jobs/")) if "/result" in j).split("/")[0]
+        assert client.get(f"/jobs/{job_id}").json()["status"] in ("queued", "running")
+        assert client.get(f"/jobs/{job_id}/result").status_code == 202
+        assert client.get("/download/none/none").status_code == 200  # other routes still answer
+
+        release.set()
+        assert _wait_done(client, job_id)["status"] == "done"
+
+def test_unknown_job_is_404(client):
+    assert client.get("/jobs/doesnotexist").status_code == 404
+    assert client.get("/jobs/..%2F..%2Fetc").status_code == 404
+
+def test_repeated_uploads_are_stored_once(client, sample_xlsx, sample_sql):
+    from web.app import OUTPUT_DIR
+    with patch("job_queue.run_command", side_effect=_fake_validator()):
+        jobs = []
+        for _ in range(2):
+            resp = _upload(client, sample_xlsx, sample_sql)
+            jobs.append(_wait_done(client, resp.json()["job_id"]))
+
+    a, b = (OUTPUT_DIR / f"job_{j['job_id']}" / "ddl.sql" for j in jobs)
+    assert a.read_bytes() == sample_sql.read_bytes()
+    assert a.stat().st_ino == b.stat().st_ino  # one blob, linked into both jobs
+    job = json.loads((OUTPUT_DIR / f"job_{jobs[0]['job_id']}" / "job.json").read_text())
+    assert job["inputs"]["ddl_sql"] == hashlib.sha256(sample_sql.read_bytes()).hexdigest()
+
+def test_identical_job_is_served_from_result_cache(client, sample_xlsx, sample_sql, tmp_path, monkeypatch):
+    from result_cache import ResultCache
+    from web.app import jobs
+    monkeypatch.setattr(jobs, "cache", ResultCache(tmp_path / "cache"))
+
+    with patch("job_queue.run_command", side_effect=_fake_validator()) as mock_run:
+        first = _wait_done(client, _upload(client, sample_xlsx, sample_sql).json()["job_id"])
+        assert first["status"] == "done" and not first["cached"]
+
+        resp = _upload(client, sample_xlsx, sample_sql)
+        assert resp.status_code == 200
+        hit = resp.json()
+        assert hit["status"] == "done" and hit["cached"]
+        assert "Baseline_Data_Model_output.xlsx" in hit["files"]
+        assert "[OK] Validation completed" in client.get(f"/jobs/{hit['job_id']}/result").text
+        assert mock_run.call_count == 1
+
+        resp = _upload(client, sample_xlsx, sample_sql, ddl=b"CREATE TABLE T2 (C1 INT);")
+        changed = _wait_done(client, resp.json()["job_id"])
+        assert not changed["cached"] and mock_run.call_count == 2
+
+def test_job_events_stream_progress_until_done(client, sample_xlsx, sample_sql):
+    def validator(cmd, **kwargs):
+        progress = Path(cmd[cmd.index("--progress-file") + 1])
+        progress.write_text(json.dumps({"phase": "read", "rule": "Rule1/Rule2", "rows": 10, "total": 20}))
+        time.sleep(0.3)
+        progress.write_text(json.dumps({"phase": "done", "rows": 20, "total": 20}))
+        return _fake_validator()(cmd)
+
+    with patch("job_queue.run_command", side_effect=validator), patch.dict("web.app.JOB_CFG", progress_interval=0.05):
+        resp = _upload(client, sample_xlsx, sample_sql)
+        job_id = resp.json()["job_id"]
+        resp = client.get(f"/jobs/{job_id}/events")
+
+    assert resp.headers["content-type"].startswith("text/event-stream")
+    events = [json.loads(line[len("data: "):]) for line in resp.text.splitlines() if line.startswith("data: ")]
+    assert events[-1]["status"] == "done"
+    assert "progress.json" not in events[-1]["files"]
+    assert any((e["progress"] or {}).get("phase") == "read" for e in events)
+    assert all(a != b for a, b in zip(events, events[1:]))  # only changes are sent
+
+def test_job_events_end_with_an_error_when_the_job_is_removed(client, sample_xlsx, sample_sql, monkeypatch):
+    import web.app
+    from fastapi import HTTPException
+    release, removed = threading.Event(), threading.Event()
+    find_job = web.app.find_job
+
+    def find_or_gone(job_id):
+        if removed.is_set():   # as once the janitor has deleted it
+            raise HTTPException(status_code=404, detail="Job not found")
+        return find_job(job_id)
+
+    with patch("job_queue.run_command", side_effect=_fake_validator(release)), \
+            patch.dict("web.app.JOB_CFG", progress_interval=0.05):
+        resp = _upload(client, sample_xlsx, sample_sql)
+        job_id = resp.json()["job_id"]
+        monkeypatch.setattr(web.app, "find_job", find_or_gone)
+        threading.Timer(0.3, removed.set).start()
+        resp = client.get(f"/jobs/{job_id}/events")
+        release.set()
+
+    assert resp.status_code == 200
+    events = [json.loads(line[len("data: "):]) for line in resp.text.splitlines() if line.startswith("data: ")]
+    assert events[0]["status"] in ("queued", "running")
+    assert events[-1] == {"job_id": job_id, "status": "removed", "error": "Job not found"}
+
+def test_job_results_are_filtered_and_paginated_server_side(client, sample_xlsx, sample_sql):
+    from results_store import RunRecorder
+
+    def validator(cmd, **kwargs):
+        rec = RunRecorder(cmd[cmd.index("--results-db") + 1])
+        for n in range(250):
+            r4 = "FAIL" if n % 5 == 0 else "PASS"
+            rec.row(n + 2, f"T{n % 3}", f"C{n}", ["PASS", "PASS", "PASS", r4, "N/A", "N/A", "N/A",
+                                                  "FAIL" if r4 == "FAIL" else "PASS", ""])
+        rec.commit({"dmw_name": "dmw.xlsx"}, {})
+        return _fake_validator()(cmd)
+
+    with patch("job_queue.run_command", side_effect=validator):
+        resp = _upload(client, sample_xlsx, sample_sql)
+        job_id = resp.json()["job_id"]
+        _wait_done(client, job_id)
+
+    page = client.get(f"/jobs/{job_id}/results", params={"page": 3, "page_size": 100}).json()
+    assert (page["total"], page["pages"], len(page["rows"])) == (250, 3, 50)
+    assert page["rows"][0][:3] == [202, "T2", "C200"]
+
+    fails = client.get(f"/jobs/{job_id}/results", params={"rule": "4", "status": "FAIL", "table": "t1"}).json()
+    rule4 = fails["columns"].index("rule4")
+    assert fails["total"] == sum(1 for n in range(250) if n % 5 == 0 and n % 3 == 1)
+    assert all(r[rule4] == "FAIL" and r[1] == "T1" for r in fails["rows"])
+    assert client.get(f"/jobs/{job_id}/results", params={"status": "FAIL"}).json()["total"] == 50
+
+    assert client.get(f"/jobs/{job_id}/results", params={"rule": "9"}).status_code == 400
+    assert client.get(f"/jobs/{job_id}/results", params={"page": 0}).status_code == 422
+
+def test_pinned_job_survives_the_janitor(client, sample_xlsx, sample_sql, monkeypatch):
+    import web.app
+    from janitor import Janitor
+    from web.app import OUTPUT_DIR
+    with patch("job_queue.run_command", side_effect=_fake_validator()):
+        resp = _upload(client, sample_xlsx, sample_sql)
+        job_id = _wait_done(client, resp.json()["job_id"])["job_id"]
+
+    assert client.post(f"/jobs/{job_id}/pin").json()["pinned"]
+    job_dir = OUTPUT_DIR / f"job_{job_id}"
+    janitor = Janitor(job_roots=[OUTPUT_DIR], busy=lambda p: p != job_dir)   # leave other jobs alone
+    monkeypatch.setattr(web.app, "janitor", janitor)
+    old = time.time() - 365 * 86400
+    os.utime(job_dir, (old, old))
+    janitor.run_once()
+    assert job_dir.exists()
+    assert ".pinned" not in client.get(f"/jobs/{job_id}").json()["files"]
+
+    assert not client.delete(f"/jobs/{job_id}/pin").json()["pinned"]
+    os.utime(job_dir, (old, old))
+    janitor.run_once()
+    assert not job_dir.exists()
+    assert client.get("/storage").json()["entries_removed"] >= 1
+
+def test_metrics_endpoint_reports_requests_and_jobs(client, sample_xlsx, sample_sql):
+    with patch("job_queue.run_command", side_effect=_fake_validator()):
+        resp = _upload(client, sample_xlsx, sample_sql)
+        job_id = _wait_done(client, resp.json()["job_id"])["job_id"]
+    client.get(f"/jobs/{job_id}")
+
+    resp = client.get("/metrics")
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/plain; version=0.0.4")
+    lines = resp.text.splitlines()
+    assert any(l.startswith('dmw_http_request_duration_seconds_count{method="GET",route="/jobs/{job_id}",status="200"}')
+               for l in lines)   # by route template, not by job id
+    assert any(l.startswith('dmw_job_duration_seconds_count{status="done"}') for l in lines)
+    assert 'dmw_job_queue_depth{lane="main"} 0' in lines
+    assert any(l.startswith('dmw_upload_bytes_total{stored="new"}') for l in lines)
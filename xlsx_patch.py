@@ -0,0 +1,518 @@
+# ----------------------------------------------------
+# In-place XLSX annotation: patch one sheet's XML, add new sheet parts,
+# copy every other zip member byte-for-byte (no recompression).
+# Parallel deflate of large parts for workbook saves.
+# ----------------------------------------------------
+import codecs, copy, datetime, os, posixpath, re, shutil, struct, tempfile, time, zipfile, zlib
+import xml.etree.ElementTree as ET
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from openpyxl.utils import get_column_letter
+
+NS_MAIN = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+NS_REL = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+NS_PKG_REL = "http://schemas.openxmlformats.org/package/2006/relationships"
+REL_OFFICE_DOC = NS_REL + "/officeDocument"
+REL_WORKSHEET = NS_REL + "/worksheet"
+CT_WORKSHEET = "application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"
+
+Cells = List[Tuple[int, object]]   # [(0-based column, value)]
+
+_ROW_RE = re.compile(r"<(?P<p>[A-Za-z_][\w.-]*:)?row(?=[\s/>])")
+_SHEETDATA_RE = re.compile(r"<(?P<p>[A-Za-z_][\w.-]*:)?sheetData(?=[\s/>])")
+_DIM_RE = re.compile(r'(<(?:[\w.-]+:)?dimension\b[^>]*?\bref=")([^"]*)(")')
+_ROW_NUM_RE = re.compile(r'\sr="(\d+)"')
+_SPANS_RE = re.compile(r'\sspans="(\d+):(\d+)"')
+_CELL_COL_RE = re.compile(r'<(?:[\w.-]+:)?c\s[^>]*?\br="([A-Z]+)\d+"')
+_REF_RE = re.compile(r"([A-Z]+)(\d+)")
+_ILLEGAL_XML_RE = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+def _col_index(letters: str) -> int:
+    n = 0
+    for ch in letters:
+        n = n * 26 + ord(ch) - 64
+    return n - 1
+
+def _esc(v: str) -> str:
+    v = _ILLEGAL_XML_RE.sub("", v)
+    return v.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+
+def _cells_xml(r: int, cells: Cells, p: str = "") -> str:
+    """Inline-string / numeric cells (no shared strings or styles to update). Empty values are skipped."""
+    out = []
+    for col, v in cells:
+        if v is None or v == "":
+            continue
+        ref = f"{get_column_letter(col + 1)}{r}"
+        if isinstance(v, (int, float)) and not isinstance(v, bool):
+            out.append(f'<{p}c r="{ref}"><{p}v>{v}</{p}v></{p}c>')
+        else:
+            out.append(f'<{p}c r="{ref}" t="inlineStr"><{p}is><{p}t xml:space="preserve">{_esc(str(v))}</{p}t></{p}is></{p}c>')
+    return "".join(out)
+
+def _row_xml(r: int, cells: Cells, p: str = "") -> str:
+    return f'<{p}row r="{r}">{_cells_xml(r, cells, p)}</{p}row>'
+
+# ----------------------------------------------------
+# New sheet parts
+# ----------------------------------------------------
+class InlineSheetPart:
+    """
+    Worksheet stand-in with an append(row) API; rows are serialised straight to
+    a temp file as inline-string XML and become a new part in annotate_workbook().
+    """
+
+    def __init__(self, title: str):
+        self.title = title
+        self.nrows = 0
+        self.ncols = 0
+        self._f = tempfile.TemporaryFile(prefix="dmw-sheet-")
+
+    def append(self, row: List) -> None:
+        self.nrows += 1
+        self.ncols = max(self.ncols, len(row))
+        self._f.write(_row_xml(self.nrows, list(enumerate(row))).encode("utf-8"))
+
+    def write_to(self, dst) -> None:
+        ref = f"A1:{get_column_letter(max(1, self.ncols))}{max(1, self.nrows)}"
+        dst.write((f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                   f'<worksheet xmlns="{NS_MAIN}"><dimension ref="{ref}"/><sheetData>').encode("utf-8"))
+        self._f.seek(0)
+        while True:
+            b = self._f.read(1 << 20)
+            if not b:
+                break
+            dst.write(b)
+        dst.write(b"</sheetData></worksheet>")
+
+    def close(self) -> None:
+        self._f.close()
+
+# ----------------------------------------------------
+# Streaming sheet XML rewrite
+# ----------------------------------------------------
+def _iter_text(fp, size: int = 1 << 16) -> Iterator[str]:
+    dec = codecs.getincrementaldecoder("utf-8")()
+    while True:
+        b = fp.read(size)
+        if not b:
+            tail = dec.decode(b"", final=True)
+            if tail:
+                yield tail
+            return
+        yield dec.decode(b)
+
+def patch_sheet_xml(src, dst, patches: Iterable[Tuple[int, Cells]], appended: List[Cells], width: int) -> None:
+    """
+    Copy worksheet XML from src to dst (binary streams), appending `patches`
+    cells to the matching <row> elements and `appended` as new rows after the
+    last row. patches must be in ascending row order; their cells must lie to
+    the right of every existing cell in the row. Rows that have no <row>
+    element yet are inserted in order. Everything else passes through as-is
+    (only <dimension> and the patched rows' spans hints are updated).
+    """
+    chunks = _iter_text(src)
+    buf = ""
+
+    def more() -> bool:
+        nonlocal buf
+        for piece in chunks:
+            buf += piece
+            return True
+        return False
+
+    def out(text: str) -> None:
+        if text:
+            dst.write(text.encode("utf-8"))
+
+    # ---- head (up to and including <sheetData ...>) ----
+    while True:
+        m = _SHEETDATA_RE.search(buf)
+        gt = buf.find(">", m.end()) if m else -1
+        if gt != -1:
+            break
+        if not more():
+            raise ValueError("Worksheet XML has no <sheetData>")
+    p = m.group("p") or ""
+    dim_row = 0
+    dm = _DIM_RE.search(buf, 0, m.start())
+    head = buf[:gt + 1]
+    if dm:
+        refs = dm.group(2).split(":")
+        end = _REF_RE.fullmatch(refs[-1])
+        if end:
+            dim_row = int(end.group(2))
+            start = refs[0] if len(refs) > 1 else "A1"
+            end_col = max(_col_index(end.group(1)) + 1, width)
+            new_ref = f"{start}:{get_column_letter(end_col)}{dim_row + len(appended)}"
+            head = head[:dm.start(2)] + new_ref + head[dm.end(2):]
+    buf = buf[gt + 1:]
+
+    pending_iter = iter(patches)
+    pending = next(pending_iter, None)
+    last_r = 0
+
+    def tail_rows() -> str:
+        nonlocal pending
+        parts = []
+        while pending is not None:
+            parts.append(_row_xml(pending[0], pending[1], p))
+            pending = next(pending_iter, None)
+        r0 = max(last_r, dim_row)
+        for n, cells in enumerate(appended, start=1):
+            parts.append(_row_xml(r0 + n, cells, p))
+        return "".join(parts)
+
+    if head.endswith("/>"):  # <sheetData/>: nothing to patch, only rows to add
+        rows = tail_rows()
+        out(head[:-2] + ">" + rows + f"</{p}sheetData>" if rows else head)
+        out(buf)
+        for piece in chunks:
+            out(piece)
+        return
+    out(head)
+
+    # ---- rows ----
+    close_data = f"</{p}sheetData>"
+    close_row = f"</{p}row>"
+    keep = len(close_data) + 16
+    while True:
+        m = _ROW_RE.search(buf)
+        end_data = buf.find(close_data)
+        if end_data != -1 and (m is None or end_data < m.start()):
+            out(buf[:end_data])
+            out(tail_rows())
+            out(buf[end_data:])
+            break
+        if m is None:
+            if len(buf) > keep:
+                out(buf[:-keep])
+                buf = buf[-keep:]
+            if not more():
+                raise ValueError("Worksheet XML ends inside <sheetData>")
+            continue
+
+        out(buf[:m.start()])
+        buf = buf[m.start():]
+        gt = buf.find(">")
+        while gt == -1:
+            if not more():
+                raise ValueError("Truncated <row> tag")
+            gt = buf.find(">")
+        if buf[gt - 1] == "/":
+            row_end = gt + 1
+        else:
+            ce = buf.find(close_row, gt)
+            while ce == -1:
+                if not more():
+                    raise ValueError("Unclosed <row> element")
+                ce = buf.find(close_row, gt)
+            row_end = ce + len(close_row)
+        row_text, buf = buf[:row_end], buf[row_end:]
+
+        rn = _ROW_NUM_RE.search(row_text, 0, gt)
+        r = int(rn.group(1)) if rn else last_r + 1
+        while pending is not None and pending[0] < r:
+            out(_row_xml(pending[0], pending[1], p))
+            pending = next(pending_iter, None)
+        if pending is not None and pending[0] == r:
+            row_text = _patch_row(row_text, gt, r, pending[1], p)
+            pending = next(pending_iter, None)
+        out(row_text)
+        last_r = r
+
+    for piece in chunks:
+        out(piece)
+
+def _patch_row(row_text: str, gt: int, r: int, cells: Cells, p: str) -> str:
+    added = [c for c, v in cells if v is not None and v != ""]
+    if not added:
+        return row_text
+    first_new = min(added)
+    existing = _CELL_COL_RE.findall(row_text)
+    if existing and max(_col_index(c) for c in existing) >= first_new:
+        raise ValueError(f"Row {r} already has cells at or beyond column {get_column_letter(first_new + 1)}")
+
+    start_tag = row_text[:gt + 1]
+    sp = _SPANS_RE.search(start_tag)
+    if sp:
+        hi = max(int(sp.group(2)), max(added) + 1)
+        start_tag = f'{start_tag[:sp.start()]} spans="{sp.group(1)}:{hi}"{start_tag[sp.end():]}'
+    new_cells = _cells_xml(r, cells, p)
+    if row_text.endswith("/>") and len(row_text) == gt + 1:
+        return start_tag[:-2] + ">" + new_cells + f"</{p}row>"
+    close_row = f"</{p}row>"
+    return start_tag + row_text[gt + 1:-len(close_row)] + new_cells + close_row
+
+# ----------------------------------------------------
+# Package plumbing
+# ----------------------------------------------------
+def _part_target(base_part: str, target: str) -> str:
+    if target.startswith("/"):
+        return target[1:]
+    return posixpath.normpath(posixpath.join(posixpath.dirname(base_part), target))
+
+def _rels_path(part: str) -> str:
+    d, f = posixpath.split(part)
+    return posixpath.join(d, "_rels", f + ".rels")
+
+def _insert_before_close(xml: str, tag: str, fragment: str) -> str:
+    m = None
+    for m in re.finditer(rf"</(?:[\w.-]+:)?{tag}>", xml):
+        pass
+    if m is None:
+        raise ValueError(f"Missing </{tag}>")
+    return xml[:m.start()] + fragment + xml[m.start():]
+
+def _copy_member_raw(zin: zipfile.ZipFile, zout: zipfile.ZipFile, info: zipfile.ZipInfo) -> None:
+    """Copy one member's compressed bytes unchanged (no inflate / deflate round trip)."""
+    fp = zin.fp
+    fp.seek(info.header_offset)
+    head = fp.read(zipfile.sizeFileHeader)
+    if head[:4] != zipfile.stringFileHeader:
+        raise zipfile.BadZipFile(f"Bad local header for {info.filename}")
+    name_len, extra_len = struct.unpack("<HH", head[26:30])
+    fp.seek(info.header_offset + zipfile.sizeFileHeader + name_len + extra_len)
+
+    out = copy.copy(info)
+    out.flag_bits &= ~0x08   # CRC / sizes are known: local header carries them, no data descriptor
+    _write_raw_member(zout, out, fp)
+
+def _write_raw_member(zout: zipfile.ZipFile, info: zipfile.ZipInfo, fp) -> None:
+    """Append a member whose compressed bytes (info.compress_size of them) are read from fp."""
+    info.header_offset = zout.fp.tell()
+    zout.fp.write(info.FileHeader())
+    remaining = info.compress_size
+    while remaining:
+        b = fp.read(min(remaining, 1 << 20))
+        if not b:
+            raise zipfile.BadZipFile(f"Truncated member {info.filename}")
+        zout.fp.write(b)
+        remaining -= len(b)
+    zout.filelist.append(info)
+    zout.NameToInfo[info.filename] = info
+    zout.start_dir = zout.fp.tell()
+
+def _new_info(name: str, like: Optional[zipfile.ZipInfo] = None) -> zipfile.ZipInfo:
+    zi = zipfile.ZipInfo(name, date_time=like.date_time if like else time.localtime()[:6])
+    zi.compress_type = zipfile.ZIP_DEFLATED
+    return zi
+
+def active_sheet_part(zin: zipfile.ZipFile) -> Tuple[str, str]:
+    """(workbook part, worksheet part of the active sheet) — the sheet openpyxl's wb.active returns."""
+    root_rels = ET.fromstring(zin.read("_rels/.rels"))
+    wb_part = "xl/workbook.xml"
+    for rel in root_rels.iter(f"{{{NS_PKG_REL}}}Relationship"):
+        if rel.get("Type") == REL_OFFICE_DOC:
+            wb_part = _part_target("", rel.get("Target"))
+    wb = ET.fromstring(zin.read(wb_part))
+    sheets = list(wb.iter(f"{{{NS_MAIN}}}sheet"))
+    view = next(wb.iter(f"{{{NS_MAIN}}}workbookView"), None)
+    active = int(view.get("activeTab", "0")) if view is not None else 0
+    rid = sheets[min(active, len(sheets) - 1)].get(f"{{{NS_REL}}}id")
+    rels = ET.fromstring(zin.read(_rels_path(wb_part)))
+    for rel in rels.iter(f"{{{NS_PKG_REL}}}Relationship"):
+        if rel.get("Id") == rid:
+            return wb_part, _part_target(wb_part, rel.get("Target"))
+    raise ValueError(f"Active sheet relationship {rid} not found")
+
+def sheet_width(xlsx: str) -> int:
+    """
+    Columns used by the active sheet: one past its rightmost cell, from the
+    cell references in the XML (its <dimension> may be missing or stale).
+    """
+    width, tail = 0, ""
+    with zipfile.ZipFile(xlsx) as zin:
+        _, sheet_part = active_sheet_part(zin)
+        with zin.open(sheet_part) as fp:
+            for chunk in _iter_text(fp):
+                text = tail + chunk
+                for letters in set(_CELL_COL_RE.findall(text)):
+                    width = max(width, _col_index(letters) + 1)
+                tail = text[-512:]   # a cell tag split across chunks is matched next time
+    return width
+
+def annotate_workbook(src_xlsx: str, out_xlsx: str, *,
+                      patches: Iterable[Tuple[int, Cells]],
+                      appended: List[Cells],
+                      width: int,
+                      new_sheets: List[InlineSheetPart],
+                      workers: int = 1) -> None:
+    """
+    Write out_xlsx as a copy of src_xlsx where the active sheet gets the
+    `patches` / `appended` cells (see patch_sheet_xml) and `new_sheets` are
+    added after the existing sheets. Every other member is copied raw; the
+    rewritten sheet parts are deflated on `workers` threads.
+    """
+    with zipfile.ZipFile(src_xlsx) as zin:
+        wb_part, sheet_part = active_sheet_part(zin)
+        wb_rels_part = _rels_path(wb_part)
+        names = set(zin.namelist())
+
+        wb_xml = zin.read(wb_part).decode("utf-8")
+        wb = ET.fromstring(wb_xml)
+        taken = {(sh.get("name") or "").lower() for sh in wb.iter(f"{{{NS_MAIN}}}sheet")}
+        for part in new_sheets:
+            if part.title.lower() in taken:
+                raise ValueError(f"Workbook already has a sheet named {part.title!r}")
+        next_id = max([int(sh.get("sheetId", "0")) for sh in wb.iter(f"{{{NS_MAIN}}}sheet")] + [0]) + 1
+        sheets_m = re.search(r"<(?P<p>[\w.-]+:)?sheets[\s>]", wb_xml)
+        p = (sheets_m.group("p") or "") if sheets_m else ""
+
+        rels_xml = zin.read(wb_rels_part).decode("utf-8")
+        ct_xml = zin.read("[Content_Types].xml").decode("utf-8")
+
+        n = 1
+        added: List[Tuple[str, InlineSheetPart]] = []
+        sheet_frag, rel_frag, ct_frag = [], [], []
+        for k, part in enumerate(new_sheets, start=1):
+            while f"xl/worksheets/sheet{n}.xml" in names:
+                n += 1
+            name = f"xl/worksheets/sheet{n}.xml"
+            names.add(name)
+            rid = f"rIdDmv{k}"
+            added.append((name, part))
+            sheet_frag.append(f'<{p}sheet xmlns:r="{NS_REL}" name="{_esc(part.title)}" '
+                              f'sheetId="{next_id + k - 1}" r:id="{rid}"/>')
+            rel_frag.append(f'<Relationship Id="{rid}" Type="{REL_WORKSHEET}" '
+                            f'Target="{posixpath.relpath(name, posixpath.dirname(wb_part))}"/>')
+            ct_frag.append(f'<Override PartName="/{name}" ContentType="{CT_WORKSHEET}"/>')
+
+        replaced: Dict[str, str] = {
+            wb_part: _insert_before_close(wb_xml, "sheets", "".join(sheet_frag)),
+            wb_rels_part: _insert_before_close(rels_xml, "Relationships", "".join(rel_frag)),
+            "[Content_Types].xml": _insert_before_close(ct_xml, "Types", "".join(ct_frag)),
+        }
+
+        with ParallelDeflateZip(out_xlsx, workers) as zout:
+            for info in zin.infolist():
+                if info.filename in replaced:
+                    zout.writestr(_new_info(info.filename, info), replaced[info.filename].encode("utf-8"))
+                elif info.filename == sheet_part:
+                    with zin.open(info) as src, zout.open_member(_new_info(info.filename, info)) as dst:
+                        patch_sheet_xml(src, dst, patches, appended, width)
+                else:
+                    _copy_member_raw(zin, zout, info)
+            for name, part in added:
+                with zout.open_member(_new_info(name)) as dst:
+                    part.write_to(dst)
+
+# ----------------------------------------------------
+# Parallel deflate: a large part is cut into DEFLATE_CHUNK pieces, each
+# compressed by its own compressor on a thread pool (zlib releases the GIL),
+# and the pieces are concatenated as sync-flushed raw deflate blocks (as pigz
+# does). The zip member is written from the precompressed bytes.
+# ----------------------------------------------------
+DEFLATE_CHUNK = 1 << 22          # 4 MiB of XML per piece
+DEFLATE_MIN_BYTES = 2 * DEFLATE_CHUNK  # smaller files go through zipfile as usual
+
+def _deflate_piece(data: bytes) -> bytes:
+    co = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15)
+    return co.compress(data) + co.flush(zlib.Z_SYNC_FLUSH)
+
+_FINAL_BLOCK = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15).flush(zlib.Z_FINISH)
+
+class _ParallelMember:
+    """Writable member: bytes are cut into pieces, deflated on the pool, CRC'd in order on the caller's thread."""
+
+    def __init__(self, zout: "ParallelDeflateZip", info: zipfile.ZipInfo):
+        self.zout = zout
+        self.info = info
+        self._buf = bytearray()
+        self._window: deque = deque()
+        self._tmp = tempfile.TemporaryFile(prefix="dmw-deflate-")
+        self._crc = 0
+        self._size = 0
+
+    def write(self, b) -> int:
+        self._buf += b
+        while len(self._buf) >= DEFLATE_CHUNK:
+            self._submit(bytes(self._buf[:DEFLATE_CHUNK]))
+            del self._buf[:DEFLATE_CHUNK]
+        return len(b)
+
+    def _submit(self, piece: bytes) -> None:
+        self._crc = zlib.crc32(piece, self._crc)
+        self._size += len(piece)
+        self._window.append(self.zout._pool.submit(_deflate_piece, piece))
+        while len(self._window) > 2 * self.zout.workers:  # bound the pieces held in memory
+            self._tmp.write(self._window.popleft().result())
+
+    def close(self) -> None:
+        try:
+            if self._buf:
+                self._submit(bytes(self._buf))
+                self._buf = bytearray()
+            while self._window:
+                self._tmp.write(self._window.popleft().result())
+            self._tmp.write(_FINAL_BLOCK)
+            info = self.info
+            info.compress_type = zipfile.ZIP_DEFLATED
+            info.flag_bits &= ~0x08
+            info.CRC, info.file_size, info.compress_size = self._crc, self._size, self._tmp.tell()
+            self._tmp.seek(0)
+            _write_raw_member(self.zout, info, self._tmp)
+        finally:
+            self._tmp.close()
+
+    def __enter__(self) -> "_ParallelMember":
+        return self
+
+    def __exit__(self, exc_type, *exc) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self._tmp.close()
+
+class ParallelDeflateZip(zipfile.ZipFile):
+    """
+    Write-mode ZipFile whose large members are deflated on `workers` threads.
+    write() (what openpyxl uses for worksheet parts) takes this path for files
+    of DEFLATE_MIN_BYTES or more; open_member() always does. With workers <= 1
+    it is a plain ZIP_DEFLATED ZipFile.
+    """
+
+    def __init__(self, file, workers: int = 1):
+        super().__init__(file, "w", zipfile.ZIP_DEFLATED, allowZip64=True)
+        self.workers = workers
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="dmw-deflate") if workers > 1 else None
+
+    def open_member(self, info: zipfile.ZipInfo):
+        if self._pool is None:
+            return self.open(info, "w")
+        return _ParallelMember(self, info)
+
+    def write(self, filename, arcname=None, compress_type=None, compresslevel=None):
+        if (self._pool is None or compress_type not in (None, zipfile.ZIP_DEFLATED) or compresslevel is not None
+                or os.path.isdir(filename) or os.path.getsize(filename) < DEFLATE_MIN_BYTES):
+            return super().write(filename, arcname, compress_type, compresslevel)
+        info = zipfile.ZipInfo.from_file(filename, arcname)
+        with open(filename, "rb") as src, _ParallelMember(self, info) as dst:
+            shutil.copyfileobj(src, dst, DEFLATE_CHUNK)
+
+    def close(self) -> None:
+        try:
+            super().close()
+        finally:
+            if self._pool is not None:
+                self._pool.shutdown(wait=True)
+                self._pool = None
+
+def save_workbook(wb, path: str, workers: int = 1) -> None:
+    """wb.save(path), with worksheet parts deflated on `workers` threads (see ParallelDeflateZip)."""
+    if workers <= 1:
+        wb.save(path)
+        return
+    from openpyxl.writer.excel import ExcelWriter
+    if wb.read_only:
+        raise TypeError("Workbook is read-only")
+    if wb.write_only and not wb.worksheets:
+        wb.create_sheet()
+    wb.properties.modified = datetime.datetime.now(tz=datetime.timezone.utc).replace(tzinfo=None)
+    archive = ParallelDeflateZip(path, workers)
+    try:
+        ExcelWriter(wb, archive).save()   # closes the archive
+    finally:
+        archive.close()